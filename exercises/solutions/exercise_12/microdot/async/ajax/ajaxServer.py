@@ -12,6 +12,8 @@ from wifi_connect import connect, getIPAddress, dateString, cetTime
 
 # import the SHT3X class
 from sht3x import SHT3X,SHT3XError
+from sht3xPeriodic import SHT3XPeriodic
+import uasyncio as asyncio
 import sys
 
 # create a SHT3X object
@@ -23,6 +25,8 @@ except SHT3XError as exception:
         sys.exit(-1)
     else:
          raise exception
+# measure once per second in the background
+sht30Periodic = SHT3XPeriodic(sht30,mps=1.0,repeatability=SHT3X.REP_P_HIGH)
        
 print ("Connecting to the network")
 connect()
@@ -64,10 +68,11 @@ def index(req):
     #     yield from resp.awrite(line)
       
 @app.route("/measurement")
-def index(req):
+async def index(req):
     print(req)
 
-    tempC, humi = sht30.getTempAndHumi(clockStretching=SHT3X.CLOCK_STRETCH,repeatability=SHT3X.REP_S_HIGH)
+    # the latest periodic measurement, no waiting for a conversion on the bus
+    ticks, tempC, humi = await sht30Periodic.get()
     timeStamp=dateString(cetTime())
     measurement="temperature={:2.1f},humidity={:2.1f},timeStamp={:s}".format(tempC,humi,timeStamp)
     print(measurement)
@@ -81,4 +86,8 @@ def index(req):
     print(measurement)
     return measurement
 print("Running the ajax server on http://" + getIPAddress())  
-app.run(debug=2, host = getIPAddress(), port=80)
+async def main():
+    sht30Periodic.start()
+    await app.start_server(debug=2, host = getIPAddress(), port=80)
+
+asyncio.run(main())
@@ -10,6 +10,7 @@ from microdot.microdot_asyncio_websocket import with_websocket
 
 # import the SHT3X class
 from sht3x import SHT3X,SHT3XError
+from sht3xPeriodic import SHT3XPeriodic
 from machine import Pin
 import os,sys
 import uasyncio as asyncio 
@@ -35,6 +36,8 @@ except SHT3XError as exception:
         sys.exit(-1)
     else:
          raise exception
+# measure once per second in the background
+sht30Periodic = SHT3XPeriodic(sht30,mps=1.0,repeatability=SHT3X.REP_P_HIGH)
      
 print ("Connecting to the network")
 connect()
@@ -55,13 +58,12 @@ def static(request, path):
 @with_websocket
 async def meas(request, ws):
     while True:
-        tempC, humi = sht30.getTempAndHumi(clockStretching=SHT3X.CLOCK_STRETCH,
-                                           repeatability=SHT3X.REP_S_HIGH)
+        ticks, tempC, humi = await sht30Periodic.get()
         timeStamp=dateString(cetTime())
         measurement="temperature={:2.1f},humidity={:2.1f},timeStamp={:s}".format(tempC,humi,timeStamp)
         print(measurement)
         await ws.send(measurement)
-        yield from asyncio.sleep(3)
+        await asyncio.sleep(3)
 
 @app.route('led')
 @with_websocket
@@ -78,4 +80,8 @@ async def led_control(request,ws):
         await ws.send(cmd)
         
 print("Please connect to http://" + getIPAddress())
-app.run(debug=True, host=getIPAddress(), port=80)
+async def main():
+    sht30Periodic.start()
+    await app.start_server(debug=True, host=getIPAddress(), port=80)
+
+asyncio.run(main())
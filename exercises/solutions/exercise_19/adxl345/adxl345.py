@@ -4,8 +4,18 @@
 from machine import Pin,I2C
 from micropython import const
 from utime import sleep_ms
+from array import array
+from struct import unpack_from
 
 from adxl345_const import *
+from registerMap import RegisterMap
+from irqAcquire import ScheduledIrq
+
+# configuration registers shadowed by the register map, the tap/activity
+# status, interrupt source, data and FIFO status registers are volatile
+ADXL345_CONFIG_REGISTERS = (tuple(range(ADXL345_THESH_TAP,ADXL345_TAP_AXIS + 1)) +
+                            (ADXL345_BW_RATE,ADXL345_POWER_CTL,ADXL345_INT_ENABLE,
+                             ADXL345_INT_MAP,ADXL345_DATA_FORMAT,ADXL345_FIFO_CTL))
 
 class ADXL345(object):
     
@@ -13,6 +23,9 @@ class ADXL345(object):
         self.debug = debug
         
         self.i2c = I2C(1,scl=Pin(scl),sda=Pin(sda),freq=400000)
+        self.sample = bytearray(6)          # preallocated buffer for the data registers
+        self.ring = None                    # sample ring of the streaming mode
+        self.irq = None                     # watermark interrupt while streaming
         i2c_slaves = self.i2c.scan()
         if ADXL345_ADDRESS in i2c_slaves:
             if self.debug:
@@ -22,6 +35,7 @@ class ADXL345(object):
             print("Please check your connections")
             return
         self.adxl345_addr = ADXL345_ADDRESS      
+        self.regs = RegisterMap(self.i2c,self.adxl345_addr,ADXL345_CONFIG_REGISTERS,debug)
         devID = self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_DEVID,1)
         if self.debug:
             print("Device ID: 0x{:02x}".format(int(devID[0])))
@@ -33,6 +47,7 @@ class ADXL345(object):
 
     def setDebug(self,enable):
         self.debug = enable
+        self.regs.debug = enable
         
     def bytesToInt(self,bytes):
         # the adxl345 return accelerometer data as signed 16 bit values
@@ -51,81 +66,34 @@ class ADXL345(object):
                 print("negative value: {:d} ".format(val)) 
             return val
 
+    # bit field access goes through the register map, which serves the
+    # configuration registers from its shadow copy
+
     def setBit(self,register,bit_pos,value):
-        mask = 1 << bit_pos
-        tmp = bytearray(1)
-        tmp[0] = self.i2c.readfrom_mem(self.adxl345_addr,register,1)[0]
-        if self.debug :
-            print("Mask: 0x{:02x}, shift: {:d}".format(mask,bit_pos))
-            print("Previous state of register 0x{:02x}: 0x{:02x}".format(register,tmp[0]))
-        mask = ~mask # get rid of the previous state of the bit
-        tmp[0] &= mask
-        tmp[0] |= value << bit_pos
-        if self.debug :
-            print("New state of register 0x{:02x}: 0x{:02x}".format(register,tmp[0]))
-        self.i2c.writeto_mem(self.adxl345_addr,register,tmp)
+        self.regs.writeBit(register,bit_pos,value)
         
     def getBit(self,register,bit_pos):
-        tmp = self.i2c.readfrom_mem(self.adxl345_addr,register,1)[0]
-        if self.debug :
-            print("read from register 0x{:02x}: 0x{:02x}".format(register,tmp))
-        return (tmp >> bit_pos) & 1 
+        return self.regs.readBit(register,bit_pos)
 
     def setBits(self,register,bitfield_pos,bitfield_size,value):
-        tmp = bytearray(1)
-        mask = 1
-        for i in range(bitfield_size-1) :
-            mask <<=1
-            mask |=1
-        shift = bitfield_pos - bitfield_size +1  
-        mask <<= shift
-        if self.debug:
-            print("Mask: 0x{:02x}, shift: {:d}".format(mask,shift))
-        tmp[0] = self.i2c.readfrom_mem(self.adxl345_addr,register,1)[0]
-        if self.debug :
-            print("Previous state of register 0x{:02x}: 0x{:02x}".format(register,tmp[0]))
-             
-        mask = ~mask # get rid of the previous state of the bit
-        tmp[0] &= mask
-        mask = ~mask
-        tmp[0] |= value << shift & mask
-        
-        if self.debug :
-            print("New state of register 0x{:02x}: 0x{:02x}".format(register,tmp[0]))
-        
-        self.i2c.writeto_mem(self.adxl345_addr,register,tmp)
-
-    def getBits(self,register,bitfield_pos,bitfield_size):
-        mask = 1
-        for i in range(bitfield_size-1) :
-            mask <<=1
-            mask |=1
-        shift = bitfield_pos -bitfield_size +1
-        mask <<=shift
-        if self.debug :
-            print("mask = 0x{:02x}, shift = {:d}".format(mask,shift))
-        tmp = self.i2c.readfrom_mem(self.adxl345_addr,register,1)[0]
-        if self.debug :
-            print("Value in register 0x{:02x}: 0x{:02x}".format(register,tmp))
-        return (tmp & mask) >> shift
+        self.regs.writeBits(register,bitfield_pos,bitfield_size,value)
+
+    def getBits(self,register,bitfield_pos,bitfield_size=1):
+        return self.regs.readBits(register,bitfield_pos,bitfield_size)
     
     def setTapThreshold(self,threshold) :
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_THESH_TAP,tmp)
+        self.regs.writeReg(ADXL345_THESH_TAP,threshold)
 
     def getTapThreshold(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_THESH_TAP,1)[0]
+        return self.regs.readReg(ADXL345_THESH_TAP)
     
     def setXOffset(self,offset):
-        tmp = bytearray(1)
-        tmp[0] = offset
         if self.debug :
-            print("Setting offset: 0x{:02x}".format(tmp[0]))
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_OFSX,tmp)
+            print("Setting offset: 0x{:02x}".format(offset))
+        self.regs.writeReg(ADXL345_OFSX,offset)
 
     def getXOffset(self):
-        tmp =  self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_OFSX,1)[0]
+        tmp =  self.regs.readReg(ADXL345_OFSX)
         if tmp & 0x80 : # negative 8 bit number
             offset = int((~tmp+1) & 0xff)
             offset = -offset
@@ -136,14 +104,12 @@ class ADXL345(object):
         return offset
         
     def setYOffset(self,offset):
-        tmp = bytearray(1)
-        tmp[0] = offset
         if self.debug :
-            print("Setting offset: 0x{:02x}".format(tmp[0]))
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_OFSY,tmp)
+            print("Setting offset: 0x{:02x}".format(offset))
+        self.regs.writeReg(ADXL345_OFSY,offset)
 
     def getYOffset(self):
-        tmp =  self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_OFSY,1)[0]
+        tmp =  self.regs.readReg(ADXL345_OFSY)
         if tmp & 0x80 : # negative 8 bit number
             offset = int((~tmp+1) & 0xff)
             offset = -offset
@@ -154,14 +120,12 @@ class ADXL345(object):
         return offset
         
     def setZOffset(self,offset):
-        tmp = bytearray(1)
-        tmp[0] = offset
         if self.debug :
-            print("Setting offset: 0x{:02x}".format(tmp[0]))
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_OFSZ,tmp)
+            print("Setting offset: 0x{:02x}".format(offset))
+        self.regs.writeReg(ADXL345_OFSZ,offset)
 
     def getZOffset(self):
-        tmp =  self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_OFSZ,1)[0]
+        tmp =  self.regs.readReg(ADXL345_OFSZ)
         if tmp & 0x80 : # negative 8 bit number
             offset = int((~tmp+1) & 0xff)
             offset = -offset
@@ -172,61 +136,47 @@ class ADXL345(object):
         return offset
         
     def setTapDuration(self,duration):
-        tmp = bytearray(1)
-        tmp[0] = duration
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_DUR,tmp)
+        self.regs.writeReg(ADXL345_DUR,duration)
 
     def getTapDuration(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_DUR,1)[0]
+        return self.regs.readReg(ADXL345_DUR)
 
     def setTapLatency(self,latency):
-        tmp = bytearray(1)
-        tmp[0] = latency
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_LATENT,tmp)
+        self.regs.writeReg(ADXL345_LATENT,latency)
 
     def getTapLatency(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_LATENT,1)[0]
+        return self.regs.readReg(ADXL345_LATENT)
         
     def setTapWindow(self,timeWindow):
-        tmp = bytearray(1)
-        tmp[0] = timeWindow
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_WINDOW,tmp)
+        self.regs.writeReg(ADXL345_WINDOW,timeWindow)
 
     def getTapWindow(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_WINDOW,1)[0]
+        return self.regs.readReg(ADXL345_WINDOW)
 
     def setActivityThreshold(self,threshold):
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_THRESH_ACT,tmp)
+        self.regs.writeReg(ADXL345_THRESH_ACT,threshold)
 
     def getActivityThreshold(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_THRESH_ACT,1)[0]
+        return self.regs.readReg(ADXL345_THRESH_ACT)
 
     def setInactivityThreshold(self,threshold):
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_THRESH_INACT,tmp)
+        self.regs.writeReg(ADXL345_THRESH_INACT,threshold)
 
     def getActivityThreshold(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_THRESH_INACT,1)[0]
+        return self.regs.readReg(ADXL345_THRESH_INACT)
 
     def setInactivityTime(self,inactivityTime):
-        tmp = bytearray(1)
-        tmp[0] = inactivityTime
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_TIME_INACT,tmp)
+        self.regs.writeReg(ADXL345_TIME_INACT,inactivityTime)
 
     def getInactivityTime(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_TIME_INACT,1)[0]
+        return self.regs.readReg(ADXL345_TIME_INACT)
 
     # ACT_INACT_CTL register
     def setAct_InactControl(self,act_inactControl):
-        tmp = bytearray(1)
-        tmp[0] = act_inactControl
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_ACT_INACT_CTL,tmp)
+        self.regs.writeReg(ADXL345_ACT_INACT_CTL,act_inactControl)
 
     def getAct_InactControl(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_ACT_INACT_CTL,1)[0]
+        return self.regs.readReg(ADXL345_ACT_INACT_CTL)
 
     def setInactXEnable(self,en) :
         self.setBit(ADXL345_ACT_INACT_CTL,INACT_X_EN,en)
@@ -277,58 +227,52 @@ class ADXL345(object):
         return self.getBit(ADXL345_ACT_INACT_CTL,ACT_AC_DC)
       
     def setFreeFallThreshold(self,threshold):
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_THRESH_FF,tmp)
+        self.regs.writeReg(ADXL345_THRESH_FF,threshold)
 
     def getFreeFallThreshold(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_THRESH_FF,1)[0]
+        return self.regs.readReg(ADXL345_THRESH_FF)
 
     def setFreeFallTime(self,freeFallTime):
-        tmp = bytearray(1)
-        tmp[0] = freeFallTime
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_THRESH_FF,tmp)
+        self.regs.writeReg(ADXL345_THRESH_FF,freeFallTime)
 
     def getFreeFallTime(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_THRESH_FF,1)[0]
+        return self.regs.readReg(ADXL345_THRESH_FF)
 
     # TAP_AXES register
     
     def setTapAxes(self,axis_enable):
-        tmp = bytearray(1)
-        tmp[0] = axis_enable
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_TAP_AXES,tmp)
+        self.regs.writeReg(ADXL345_TAP_AXIS,axis_enable)
 
     def getFreeFallTime(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_TAP_AXES,1)[0]
+        return self.regs.readReg(ADXL345_TAP_AXIS)
 
     def setTapXEnable(self,en) :
-        self.setBit(ADXL345_TAP_AXES,TAP_X_EN,en)
+        self.setBit(ADXL345_TAP_AXIS,TAP_X_EN,en)
 
     def getTapXEnable(self):
-        return self.getBit(ADXL345_TAP_AXES,TAP_X_EN)
+        return self.getBit(ADXL345_TAP_AXIS,TAP_X_EN)
       
     def setTapYEnable(self,en) :
-        self.setBit(ADXL345_TAP_AXES,TAP_Y_EN,en)
+        self.setBit(ADXL345_TAP_AXIS,TAP_Y_EN,en)
 
     def getTapYEnable(self):
-        return self.getBit(ADXL345_TAP_AXES,TAP_Y_EN)
+        return self.getBit(ADXL345_TAP_AXIS,TAP_Y_EN)
       
     def setTapZEnable(self,en) :
-        self.setBit(ADXL345_TAP_AXES,TAP_Z_EN,en)
+        self.setBit(ADXL345_TAP_AXIS,TAP_Z_EN,en)
 
     def getTapZEnable(self):
-        return self.getBit(ADXL345_TAP_AXES,TAP_Z_EN)
+        return self.getBit(ADXL345_TAP_AXIS,TAP_Z_EN)
 
     def setTapSuppress(self,en) :
-        self.setBit(ADXL345_TAP_AXES,SUPPRESS,en)
+        self.setBit(ADXL345_TAP_AXIS,SUPPRESS,en)
 
     def getTapSuppress(self):
-        return self.getBit(ADXL345_TAP_AXES,SUPPRESS)
+        return self.getBit(ADXL345_TAP_AXIS,SUPPRESS)
       
     # ACT_TAP_STATUS
     def getTapStatus(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_ACT_TAP_STATUS,1)[0]
+        return self.regs.readReg(ADXL345_ACT_TAP_STATUS)
 
     def getTapXSource(self):
         return self.getBit(ADXL345_ACT_TAP_STATUS,TAP_X_SOURCE)
@@ -353,12 +297,10 @@ class ADXL345(object):
     
     # BW_RATE register
     def setDataRateAndPowerCtl(self,dataRateAndPowerCtl):
-        tmp = bytearray(1)
-        tmp[0] = dataRateAndPowerCtl
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_BW_RATE,tmp)
+        self.regs.writeReg(ADXL345_BW_RATE,dataRateAndPowerCtl)
 
     def getDataRateAndPowerCtl(self) :
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_BW_RATE,1)[0]
+        return self.regs.readReg(ADXL345_BW_RATE)
 
     def setDataRate(self,dataRate):
         self.setBits(ADXL345_BW_RATE,RATE,RATE_SIZE,dataRate)
@@ -374,12 +316,10 @@ class ADXL345(object):
 
     # POWER_CTL register
     def setPowerCtl(self,powerCtl):
-        tmp = bytearray(1)
-        tmp[0] = powerCtl
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_POWER_CTL,tmp)
+        self.regs.writeReg(ADXL345_POWER_CTL,powerCtl)
 
     def getPowerCtl(self) :
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_POWER_CTL,1)[0]
+        return self.regs.readReg(ADXL345_POWER_CTL)
 
     def setWakeUp(self,wakeup) :
         self.setBits(ADXL345_POWER_CTL,WAKEUP,WAKEUP_SIZE,wakeup)
@@ -415,12 +355,10 @@ class ADXL345(object):
     # INT_ENABLE register
 
     def setInterruptEnable(self,enable):
-        tmp = bytearray(1)
-        tmp[0] = enable
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_INT_ENABLE,tmp)
+        self.regs.writeReg(ADXL345_INT_ENABLE,enable)
 
     def getInterruptEnable(self) :
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_INT_ENABLE,1)[0]
+        return self.regs.readReg(ADXL345_INT_ENABLE)
 
     def setOverrunIntEnable(self,enable) :
         self.setBit(ADXL345_INT_ENABLE,OVERRUN,enable)
@@ -473,12 +411,10 @@ class ADXL345(object):
     # INT_MAP register
 
     def setInterruptMapping(self,enable):
-        tmp = bytearray(1)
-        tmp[0] = enable
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_INT_MAP,tmp)
+        self.regs.writeReg(ADXL345_INT_MAP,enable)
 
     def getInterruptMapping(self) :
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_INT_MAP,1)[0]
+        return self.regs.readReg(ADXL345_INT_MAP)
 
     def setOverrunMapping(self,enable) :
         self.setBit(ADXL345_INT_MAP,OVERRUN,enable)
@@ -531,7 +467,7 @@ class ADXL345(object):
     # INT_SOURCE register
 
     def getInterruptSource(self) :
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_INT_SOURCE,1)[0]
+        return self.regs.readReg(ADXL345_INT_SOURCE)
 
     def getOverrunSource(self) :
         return self.getBit(ADXL345_INT_SOURCE,OVERRUN)
@@ -559,12 +495,10 @@ class ADXL345(object):
 
     # DATA_FORMAT register
     def setDataFormat(self,format):
-        tmp = bytearray(1)
-        tmp[0] = format
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_DATA_FORMAT,tmp)
+        self.regs.writeReg(ADXL345_DATA_FORMAT,format)
 
     def getDataFormat(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_DATA_FORMAT,1)[0]
+        return self.regs.readReg(ADXL345_DATA_FORMAT)
 
     def setRange(self,range) :
         self.setBits(ADXL345_DATA_FORMAT,RANGE,RANGE_SIZE,range)
@@ -605,18 +539,16 @@ class ADXL345(object):
 
     # FIFO_CTL register
     def setFIFO_Ctl(self,fifoControl):
-        tmp = bytearray(1)
-        tmp[0] = fifoControl
-        self.i2c.writeto_mem(self.adxl345_addr,ADXL345_FIFO_CTL,tmp)
+        self.regs.writeReg(ADXL345_FIFO_CTL,fifoControl)
 
     def getFIFO_Ctl(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_FIFO_CTL,1)[0]
+        return self.regs.readReg(ADXL345_FIFO_CTL)
 
     def setSamples(self,samples) :
         self.setBits(ADXL345_FIFO_CTL,SAMPLES,SAMPLES_SIZE,samples)
 
     def getSamples(self) :
-        return self.getBits(ADXL345_FOF_CTL,SAMPLES,SAMPLES_SIZE)
+        return self.getBits(ADXL345_FIFO_CTL,SAMPLES,SAMPLES_SIZE)
 
     def setTrigger(self,trigger) :
         self.setBit(ADXL345_FIFO_CTL,TRIGGER,trigger)
@@ -628,29 +560,126 @@ class ADXL345(object):
         self.setBits(ADXL345_FIFO_CTL,FIFO_TYPE,FIFO_TYPE_SIZE,fifoMode)
 
     def getFiFoMode(self) :
-        return self.getBits(ADXL345_FOF_CTL,FIFO_TYPE,FIFO_TYPE_SIZE)
+        return self.getBits(ADXL345_FIFO_CTL,FIFO_TYPE,FIFO_TYPE_SIZE)
 
     # FIFO_STATUS
     def getFIFO_Status(self):
-        return self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_FIFO_STATUS,1)[0]
+        return self.regs.readReg(ADXL345_FIFO_STATUS)
 
     def getFIFO_Entries(self):
         return self.getBits(ADXL345_FIFO_STATUS,FIFO_ENTRIES,FIFO_ENTRIES_SIZE)
 
-    def getFIFO_Trigger():
+    def getFIFO_Trigger(self):
         return self.getBit(ADXL345_FIFO_STATUS,FIFO_TRIG)
     
     # Accelerometer data registers
     def getAccelerometerData(self) :
-        tmp = self.i2c.readfrom_mem(self.adxl345_addr,ADXL345_DATAAX0,6)
-        raw = bytearray(2)
-        raw[0] = tmp[1]
-        raw[1] = tmp[0]
-        ax = self.bytesToInt(raw)
-        raw[0] = tmp[3]
-        raw[1] = tmp[2]
-        ay = self.bytesToInt(raw)
-        raw[0] = tmp[5]
-        raw[1] = tmp[4]
-        az = self.bytesToInt(raw)
-        return(ax,ay,az)
+        # the 3 axes are read in a single burst, low byte first
+        self.regs.readBlock(ADXL345_DATAAX0,self.sample)
+        return unpack_from('<3h',self.sample)
+
+    # Streaming acquisition
+    # The FIFO runs in stream mode and raises the watermark interrupt on INT1
+    # when it holds "watermark" samples. The interrupt schedules drain(), which
+    # empties the FIFO into a ring of samples. Consumers take the samples out
+    # in batches with readBatch(), or get them passed to a callback.
+    # drain() only advances the write position and readBatch() only the read
+    # position, so a drain scheduled while a batch is copied does no harm.
+    # INT1 stays high until the FIFO is read below the watermark: a drain lost
+    # because the schedule queue was full produces no further edge. available()
+    # and readBatch() therefore drain the FIFO themselves in this case.
+
+    def startStream(self,dataRate=RATE_800,watermark=16,intPin=None,ringSize=256,callback=None) :
+        # dataRate: one of the RATE_xxx constants
+        # watermark: number of samples in the FIFO (1..31) raising the interrupt
+        # intPin: GPIO number connected to INT1, if None, drain() must be called
+        #         by the application, at least every watermark samples
+        # ringSize: number of (x,y,z) samples kept in the ring
+        # callback: called with the ring, the index of the first and the number of
+        #           new samples after every drain
+        if watermark < 1 or watermark > 31:
+            raise ValueError("watermark must be between 1 and 31")
+        self.stopStream()
+        self.ring = array('h',[0] * (3 * ringSize))
+        self.ringSize = ringSize
+        self.wrap = 1024 * ringSize     # positions run modulo wrap to stay small ints
+        self.writePos = 0
+        self.readPos = 0
+        self.lost = 0                   # samples overwritten before they were read
+        self.overruns = 0               # FIFO overruns seen
+        self.callback = callback
+
+        self.setMeasure(0)
+        self.setDataRate(dataRate)
+        self.regs.writeReg(ADXL345_FIFO_CTL,STREAM_MODE << 6 | watermark)  # trigger bit to INT1
+        self.regs.writeReg(ADXL345_INT_MAP,0)                             # all interrupts to INT1
+        self.regs.writeReg(ADXL345_INT_ENABLE,1 << WATERMARK | 1 << OVERRUN)
+        if intPin is not None:
+            active = 0 if self.getInterruptInvert() else 1
+            trigger = Pin.IRQ_RISING if active else Pin.IRQ_FALLING
+            self.irq = ScheduledIrq(Pin(intPin,Pin.IN),self.drain,trigger,active)
+        self.setMeasure(1)
+
+    def stopStream(self) :
+        if self.irq is not None:
+            self.irq.deinit()
+            self.irq = None
+        self.regs.writeReg(ADXL345_INT_ENABLE,0)
+        self.regs.writeReg(ADXL345_FIFO_CTL,0)     # bypass mode
+
+    def drain(self,arg=None) :
+        # read all entries of the FIFO into the ring, returns the number of samples read
+        # At high data rates new samples arrive while the FIFO is read: drain again
+        # as long as the watermark interrupt is still asserted, it produces no new edge.
+        ring = self.ring
+        sample = self.sample
+        size = self.ringSize
+        total = 0
+        status = self.regs.readReg(ADXL345_INT_SOURCE)
+        while True:
+            if status & (1 << OVERRUN):
+                self.overruns += 1
+            entries = self.regs.readReg(ADXL345_FIFO_STATUS) & 0x3f
+            first = self.writePos % size
+            index = 3 * first
+            for i in range(entries):
+                self.regs.readBlock(ADXL345_DATAAX0,sample)
+                ring[index],ring[index+1],ring[index+2] = unpack_from('<3h',sample)
+                index += 3
+                if index == 3 * size:
+                    index = 0
+            self.writePos = (self.writePos + entries) % self.wrap
+            if self.callback and entries:
+                self.callback(ring,first,entries)
+            total += entries
+            status = self.regs.readReg(ADXL345_INT_SOURCE)
+            if not entries or not status & (1 << WATERMARK):
+                return total
+
+    def available(self) :
+        # number of samples waiting in the ring
+        if self.irq is not None:
+            self.irq.poll()
+        return min((self.writePos - self.readPos) % self.wrap,self.ringSize)
+
+    def readBatch(self,samples) :
+        # move up to len(samples)//3 samples from the ring into samples
+        # (an array('h')), returns the number of (x,y,z) samples copied
+        if self.irq is not None:
+            self.irq.poll()
+        size = self.ringSize
+        waiting = (self.writePos - self.readPos) % self.wrap
+        if waiting > size:              # the oldest samples were overwritten
+            self.lost += waiting - size
+            self.readPos = (self.readPos + waiting - size) % self.wrap
+            waiting = size
+        n = min(len(samples) // 3,waiting)
+        ring = self.ring
+        index = 3 * (self.readPos % size)
+        for i in range(3 * n):
+            samples[i] = ring[index]
+            index += 1
+            if index == 3 * size:
+                index = 0
+        self.readPos = (self.readPos + n) % self.wrap
+        return n
@@ -0,0 +1,26 @@
+# MPU6050_calibrate: fast offset calibration from FIFO averages
+# Put the MPU6050 flat on a horizontal surface (z axis up) and let it warm up.
+# All 6 offsets are determined together in a few seconds, compare with
+# IMU_Zero.py which takes minutes
+#
+
+import sys
+from utime import ticks_ms, ticks_diff
+from MPU6050_const import *
+from MPU6050 import MPU6050
+
+accelgyro = MPU6050()
+if not accelgyro.testConnection():
+    print("MPU6050 connection failed")
+    sys.exit()
+
+print("Offsets before calibration:",end="")
+accelgyro.PrintActiveOffsets()
+
+start = ticks_ms()
+offsets = accelgyro.calibrateOffsets(gravity=(0,0,1))
+print("Calibration took {:d} ms".format(ticks_diff(ticks_ms(),start)))
+
+print("Offsets after calibration:",end="")
+accelgyro.PrintActiveOffsets()
+print("Motion after calibration: ",accelgyro.getMotion6())
@@ -0,0 +1,30 @@
+# MPU6050_fifo: streams accel and gyro samples through the MPU6050 FIFO
+# at 1 kHz and prints the mean of each batch together with the achieved
+# sample rate
+#
+
+import sys
+from utime import ticks_ms, ticks_diff
+from MPU6050_const import *
+from MPU6050 import MPU6050
+
+BATCH = 100
+
+accelgyro = MPU6050()
+if not accelgyro.testConnection():
+    print("MPU6050 connection failed")
+    sys.exit()
+
+values = accelgyro.startFIFOStream(rate=1000)
+sums = [0] * values
+start = ticks_ms()
+for samples in accelgyro.fifoStream(BATCH):
+    for i in range(values):
+        sums[i] = 0
+    for i in range(len(samples)):
+        sums[i % values] += samples[i]
+    now = ticks_ms()
+    print("a/g:\t{:d}\t{:d}\t{:d}\t{:d}\t{:d}\t{:d}\t{:d} Hz, {:d} overflows".format(
+        *[s // BATCH for s in sums],
+        BATCH * 1000 // max(ticks_diff(now, start), 1), accelgyro.fifoOverflows))
+    start = now
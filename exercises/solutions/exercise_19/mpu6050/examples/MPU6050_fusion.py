@@ -0,0 +1,40 @@
+# MPU6050_fusion: attitude estimation at 200 Hz
+# Accel and gyro frames are drained from the MPU6050 FIFO in batches and fed
+# to the Madgwick filter of fusion.py. If a HMC5883 magnetometer is found
+# (e.g. on a GY-87 board in bypass mode) its readings correct the yaw drift.
+# Yaw, pitch and roll are printed 10 times per second
+#
+
+import sys
+from MPU6050_const import *
+from MPU6050 import MPU6050
+from fusion import Fusion,MADGWICK
+
+RATE  = 200
+BATCH = 20          # frames per batch, 100 ms at 200 Hz
+
+accelgyro = MPU6050()
+if not accelgyro.testConnection():
+    print("MPU6050 connection failed")
+    sys.exit()
+
+try:
+    from HMC5883 import HMC5883
+    from HMC5883_const import *
+    magnetometer = HMC5883()
+    magnetometer.setSmoothing(1)
+    magnetometer.startContinuous(HMC5883_RATE_75)
+except Exception as e:
+    print("No magnetometer, yaw is from the gyroscope only:",e)
+    magnetometer = None
+
+gyroLSB = 131.0 / (1 << accelgyro.getFullScaleGyroRange())
+fusion = Fusion(rate=RATE,outputRate=10,mode=MADGWICK,beta=0.1,gyroLSB=gyroLSB)
+
+accelgyro.startFIFOStream(rate=RATE)
+for samples in accelgyro.fifoStream(BATCH):
+    if magnetometer:
+        fusion.setMag(*magnetometer.getMagRaw())
+    if fusion.update(samples,BATCH):
+        yaw,pitch,roll = fusion.getYawPitchRoll()
+        print("yaw: {:7.2f}°, pitch: {:7.2f}°, roll: {:7.2f}°".format(yaw,pitch,roll))
@@ -41,10 +41,21 @@ THE SOFTWARE.
 '''
 
 from machine import Pin,I2C,SoftI2C
-from struct import pack
+from struct import pack, unpack_from
+from array import array
 from MPU6050_const import *
+from registerMap import RegisterMap
 from time import sleep_ms, sleep_us, time
 
+# configuration registers shadowed by the register map. Registers with self
+# clearing bits (SIGNAL_PATH_RESET, USER_CTRL, PWR_MGMT_1) are not shadowed
+MPU6050_CONFIG_REGISTERS = (tuple(range(MPU6050_RA_SMPLRT_DIV, MPU6050_RA_I2C_SLV4_DO + 2)) +
+                            (MPU6050_RA_INT_PIN_CFG, MPU6050_RA_INT_ENABLE,
+                             MPU6050_RA_I2C_SLV0_DO, MPU6050_RA_I2C_SLV1_DO,
+                             MPU6050_RA_I2C_SLV2_DO, MPU6050_RA_I2C_SLV3_DO,
+                             MPU6050_RA_I2C_MST_DELAY_CTRL, MPU6050_RA_MOT_DETECT_CTRL,
+                             MPU6050_RA_PWR_MGMT_2))
+
 class MPU6050:
     
     def __init__(self,address=MPU6050_ADDRESS_AD0_LOW,bus=1,scl=22,sda=21,debug=False):
@@ -81,10 +92,17 @@ class MPU6050:
             raise Exception("MPU6050: Cannot access the I2C bus")
         
         self.fifoTimeout = 0
+        # preallocated buffers for burst reads of the sensor registers and the FIFO
+        self.motionBuf = bytearray(14)
+        self.motionView = memoryview(self.motionBuf)
+        self.fifoBuf = None
+        self.fifoFrameSize = 0
+        self.fifoOverflows = 0
         
         # Check if there is an MPU6050 on the I2C bus
         if self.mpu6050_address not in i2c_slaves:
             raise Exception("No MPU6050 found on I2C bus. Please connect the module first.")
+        self.regs = RegisterMap(self.i2c,self.mpu6050_address,MPU6050_CONFIG_REGISTERS,debug)
         self.setClockSource(MPU6050_CLOCK_PLL_XGYRO)
         self.setFullScaleGyroRange(MPU6050_GYRO_FS_250)
         self.setFullScaleAccelRange(MPU6050_ACCEL_FS_2)
@@ -96,23 +114,16 @@ class MPU6050:
         @param onOff: sets the debug flag
         '''
         self.debug = onOff
+        self.regs.debug = onOff
         
     def readBits(self, register, bit_position, no_of_bits):
         '''!
         Reads a number of bits from the register
+        Configuration registers are read from the shadow copy in the register map
         @param bit_position: the left most position of the bit field
         @param no_of_bits: the number of bits in the bit field
         '''
-        tmp = self.i2c.readfrom_mem(self.mpu6050_address,register,1)[0]
-        # print("Who am I register unshifted raw: 0x{:02x}".format(tmp))
-        mask = 1
-        for i in range(1,no_of_bits):
-            mask = mask << 1 | 1
-        shift = bit_position - no_of_bits + 1
-        mask <<= shift        
-        # print("mask: 0x{:02x}".format(mask))
-        tmp &= mask
-        return tmp >> shift
+        return self.regs.readBits(register,bit_position,no_of_bits)
 
     def readBit(self,register,bit_position) :
         '''!
@@ -120,34 +131,17 @@ class MPU6050:
         @param register: reguster address from which the bit is read
         @param bit_position: the left most position of the bit field
         '''
-        tmp = self.i2c.readfrom_mem(self.mpu6050_address,register,1)[0]
-        if tmp & (1 << bit_position) :
-            return True
-        else:
-            return False
+        return self.regs.readBit(register,bit_position) == 1
         
     def writeBits(self, register, bit_position, no_of_bits, value):
         '''!
         Writes a number of bits to the register
+        The register map only accesses the bus if the register contents changes
         @param bit_position: the left most position of the bit field
         @param no_of_bits: the number of bits in the bit field
         @param value: the value to be written
         '''        
-        tmp = bytearray(self.i2c.readfrom_mem(self.mpu6050_address,register,1))
-        if self.debug:
-            print("Register 0x{:02x} raw: 0x{:02x}".format(register,tmp[0]))
-        mask = 1
-        for i in range(1,no_of_bits):
-            mask = mask << 1 | 1
-        shift = bit_position - no_of_bits + 1
-        mask <<= shift        
-        # print("mask: 0x{:02x}".format(mask))
-        mask = ~ mask
-        tmp[0] &= mask
-        tmp[0] |= value <<shift
-        if self.debug:
-            print("Writing 0x{:02x} to register 0x{:02x}".format(tmp[0],register))
-        self.i2c.writeto_mem(self.mpu6050_address,register,tmp)
+        self.regs.writeBits(register,bit_position,no_of_bits,value)
 
     def writeBit(self,register,bit_position,value):
         '''!
@@ -156,16 +150,7 @@ class MPU6050:
         @param no_of_bits: the number of bits in the bit field
         @param value: the value to be written
         '''               
-        tmp = bytearray(self.i2c.readfrom_mem(self.mpu6050_address,register,1))
-        if self.debug:
-            print("writeBit: Original content of register 0x{:02x} : 0x{:02x}".format(register,tmp[0]))
-        if value:
-            tmp[0] |= (1 << bit_position)
-        else:
-            tmp[0] &= ~(1 << bit_position)
-        if self.debug:
-            print("writeBit: New content of register 0x{:02x} : 0x{:02x}".format(register,tmp[0]))
-        self.i2c.writeto_mem(self.mpu6050_address,register,tmp)
+        self.regs.writeBit(register,bit_position,value)
         
     # WHO_AM_I register
     def getDeviceID(self) :
@@ -276,16 +261,14 @@ class MPU6050:
         @return contents of the accel config register
         @see MPU6050_RA_ACCEL_CONFIG
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_CONFIG,1)[0]
+        return self.regs.readReg(MPU6050_RA_ACCEL_CONFIG)
                                      
     def setAccelConfig(self,config):
         '''!
         Write the accelerometer configuration register
         @see MPU6050_RA_ACCEL_CONFIG
         '''
-        tmp = bytearray(1)
-        tmp[0] = config
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_ACCEL_CONFIG,tmp)
+        self.regs.writeReg(MPU6050_RA_ACCEL_CONFIG,config)
                                                                           
     def getAccelXSelfTest(self) :
         '''!
@@ -471,7 +454,7 @@ class MPU6050:
         @return Current sample rate
         @see MPU6050_RA_SMPLRT_DIV
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_SMPLRT_DIV,1)[0]
+        return self.regs.readReg(MPU6050_RA_SMPLRT_DIV)
 
     def setRate(self,rate) :
         '''!
@@ -480,9 +463,7 @@ class MPU6050:
         @see getRate()
         @see MPU6050_RA_SMPLRT_DIV
         '''
-        tmp = bytearray(1)
-        tmp[0] = rate
-        self.i2c.writeto_mem(self.mpu6050_address,register,tmp)
+        self.regs.writeReg(MPU6050_RA_SMPLRT_DIV,rate)
 
     # CONFIG register
     
@@ -569,7 +550,7 @@ class MPU6050:
         @see MPU6050_CFG_DLPF_CFG_BIT
         @see MPU6050_CFG_DLPF_CFG_LENGTH
         '''
-        writeBits(MPU6050_RA_CONFIG, MPU6050_CFG_DLPF_CFG_BIT, MPU6050_CFG_DLPF_CFG_LENGTH)
+        self.writeBits(MPU6050_RA_CONFIG, MPU6050_CFG_DLPF_CFG_BIT, MPU6050_CFG_DLPF_CFG_LENGTH, mode)
 
 
     # SELF TEST FACTORY TRIM VALUES
@@ -646,7 +627,7 @@ class MPU6050:
         @return Current free-fall acceleration threshold value (LSB = 2mg)
         @see MPU6050_RA_FF_THR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_FF_THR,1)[0]
+        return self.regs.readReg(MPU6050_RA_FF_THR)
 
     def setFreefallDetectionThreshold(self,threshold) :
         '''
@@ -655,7 +636,7 @@ class MPU6050:
         @see getFreefallDetectionThreshold()
         @see MPU6050_RA_FF_THR
         '''
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_FF_THR, threshold)
+        self.regs.writeReg(MPU6050_RA_FF_THR,threshold)
 
     # FF_DUR register
 
@@ -678,7 +659,7 @@ class MPU6050:
         @return Current free-fall duration threshold value (LSB = 1ms)
         @see MPU6050_RA_FF_DUR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_FF_DUR,1)[0]
+        return self.regs.readReg(MPU6050_RA_FF_DUR)
 
     def setFreefallDetectionDuration(self,duration) :
         '''
@@ -687,9 +668,7 @@ class MPU6050:
         @see getFreefallDetectionDuration()
         @see MPU6050_RA_FF_DUR
         '''
-        tmp = bytearray(1)
-        tmp[0] = duration
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_FF_DUR, tmp)
+        self.regs.writeReg(MPU6050_RA_FF_DUR,duration)
 
     # MOT_THR register
     def getMotionDetectionThreshold(self) :
@@ -713,7 +692,7 @@ class MPU6050:
         @return Current motion detection acceleration threshold value (LSB = 2mg)
         @see MPU6050_RA_MOT_THR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_MOT_THR,1)[0]
+        return self.regs.readReg(MPU6050_RA_MOT_THR)
 
     def setMotionDetectionThreshold(self,threshold) :
         '''!
@@ -722,9 +701,7 @@ class MPU6050:
         @see getMotionDetectionThreshold()
         @see MPU6050_RA_MOT_THR
         '''
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_MOT_THR, tmp)
+        self.regs.writeReg(MPU6050_RA_MOT_THR,threshold)
 
     #  MOT_DUR register
 
@@ -745,7 +722,7 @@ class MPU6050:
         @return Current motion detection duration threshold value (LSB = 1ms)
         @see MPU6050_RA_MOT_DUR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_MOT_DUR,1)[0]
+        return self.regs.readReg(MPU6050_RA_MOT_DUR)
         
     def setMotionDetectionDuration(self,duration) :
         '''!
@@ -754,9 +731,7 @@ class MPU6050:
         @see getMotionDetectionDuration()
         @see MPU6050_RA_MOT_DUR
         '''
-        tmp = bytearray(1)
-        tmp[0] = duration
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_MOT_DUR, tmp)
+        self.regs.writeReg(MPU6050_RA_MOT_DUR,duration)
 
         
     # ZRMOT_THR register
@@ -787,7 +762,7 @@ class MPU6050:
         @return Current zero motion detection acceleration threshold value (LSB = 2mg)
         @see MPU6050_RA_ZRMOT_THR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ZRMOT_THR,1)[0]
+        return self.regs.readReg(MPU6050_RA_ZRMOT_THR)
 
     def setZeroMotionDetectionThreshold(self,threshold) :
         '''!
@@ -796,9 +771,7 @@ class MPU6050:
         @see getZeroMotionDetectionThreshold()
         @see MPU6050_RA_ZRMOT_THR
         '''
-        tmp = bytearray(1)
-        tmp[0] = threshold
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_ZRMOT_THR, tmp)
+        self.regs.writeReg(MPU6050_RA_ZRMOT_THR,threshold)
         
     # ZRMOT_DUR register
     def getZeroMotionDetectionDuration(self) :
@@ -819,7 +792,7 @@ class MPU6050:
         @return Current zero motion detection duration threshold value (LSB = 64ms)
         @see MPU6050_RA_ZRMOT_DUR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ZRMOT_DUR,1)[0]
+        return self.regs.readReg(MPU6050_RA_ZRMOT_DUR)
 
     def setZeroMotionDetectionDuration(self,duration) :
         '''!
@@ -828,9 +801,7 @@ class MPU6050:
         @see getZeroMotionDetectionDuration()
         @see MPU6050_RA_ZRMOT_DUR
         '''
-        tmp = bytearray(1)
-        tmp[0] = duration
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_ZRMOT_DUR, tmp)
+        self.regs.writeReg(MPU6050_RA_ZRMOT_DUR,duration)
 
     # FIFO_EN register
     
@@ -1173,7 +1144,7 @@ class MPU6050:
         '''
         if num > 3:
             return 0
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_I2C_SLV0_ADDR + num*3,1)[0]
+        return self.regs.readReg(MPU6050_RA_I2C_SLV0_ADDR + num*3)
 
     def setSlaveAddress(self,num, address) :
         '''!
@@ -1185,9 +1156,7 @@ class MPU6050:
         '''
         if (num > 3) :
             return
-        tmp = bytearray[1]
-        tmp[0] = address
-        self.i2c.writeto_mem(self.mpu6050_,MPU6050_RA_I2C_SLV0_ADDR + num*3,tmp)
+        self.regs.writeReg(MPU6050_RA_I2C_SLV0_ADDR + num*3,address)
 
     def getSlaveRegister(self,num) :
         '''
@@ -1204,7 +1173,7 @@ class MPU6050:
         '''
         if (num > 3) :
             return 0
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_I2C_SLV0_REG + num*3,1)[0]
+        return self.regs.readReg(MPU6050_RA_I2C_SLV0_REG + num*3)
 
     def setSlaveRegister(self,num,reg) :
         '''!
@@ -1216,9 +1185,7 @@ class MPU6050:
         '''
         if (num > 3) :
             return
-        tmp = bytearray(1)
-        tmp[0] = address
-        self.i2c.writeto_mem(self.mpu6050_,MPU6050_RA_I2C_SLV0_REG + num*3,tmp)
+        self.regs.writeReg(MPU6050_RA_I2C_SLV0_REG + num*3,reg)
 
     def getSlaveEnabled(self,num) :
         '''
@@ -1371,7 +1338,7 @@ class MPU6050:
         @see getSlaveAddress()
         @see MPU6050_RA_I2C_SLV4_ADDR
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_I2C_SLV4_ADDR, 1)[0]
+        return self.regs.readReg(MPU6050_RA_I2C_SLV4_ADDR)
 
     def setSlave4Address(self,address) :
         '''!
@@ -1380,9 +1347,7 @@ class MPU6050:
         @see getSlave4Address()
         @see MPU6050_RA_I2C_SLV4_ADDR
         '''
-        tmp = bytearray(1)
-        tmp[0] = address
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_I2C_SLV4_ADDR, tmp)
+        self.regs.writeReg(MPU6050_RA_I2C_SLV4_ADDR,address)
 
     def getSlave4Register(self) :
         '''!
@@ -1393,7 +1358,7 @@ class MPU6050:
         @return Current active register for Slave 4
         @see MPU6050_RA_I2C_SLV4_REG
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_I2C_SLV4_REG, 1)[0]
+        return self.regs.readReg(MPU6050_RA_I2C_SLV4_REG)
 
     def setSlave4Register(self,reg) :
         '''!
@@ -1402,9 +1367,7 @@ class MPU6050:
         @see getSlave4Register()
         @see MPU6050_RA_I2C_SLV4_REG
         '''
-        tmp = bytearray(1)
-        tmp[0] = reg
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_I2C_SLV4_REG, tmp)
+        self.regs.writeReg(MPU6050_RA_I2C_SLV4_REG,reg)
 
     def setSlave4OutputByte(self,data) :
         '''!
@@ -1414,9 +1377,7 @@ class MPU6050:
         @param data New byte to write to Slave 4
         @see MPU6050_RA_I2C_SLV4_DO
         '''
-        tmp = bytearray(1)
-        tmp[0] = data
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_I2C_SLV4_DO, tmp)
+        self.regs.writeReg(MPU6050_RA_I2C_SLV4_DO,data)
 
     def getSlave4Enabled(self) :
         '''!
@@ -1622,7 +1583,7 @@ class MPU6050:
         @return Current state of the interrupt config register
         @see MPU6050_RA_INT_PIN_CFG
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_INT_PIN_CFG, 1)[0]
+        return self.regs.readReg(MPU6050_RA_INT_PIN_CFG)
     
     def getInterruptMode(self) :
         '''!
@@ -1811,7 +1772,7 @@ class MPU6050:
         @see MPU6050_RA_INT_ENABLE
         @see MPU6050_INTERRUPT_FF_BIT
         '''
-        return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_INT_ENABLE, 1)[0]
+        return self.regs.readReg(MPU6050_RA_INT_ENABLE)
 
     def setIntEnabled(self,enabled) :
         '''!
@@ -1823,9 +1784,7 @@ class MPU6050:
         @see MPU6050_RA_INT_ENABLE
         @see MPU6050_INTERRUPT_FF_BIT
         '''
-        tmp = bytearray(1)
-        tmp[0] = enabled
-        self.i2c.writeto_mem(self.mpu6050_,MPU6050_RA_INT_ENABLE,tmp)
+        self.regs.writeReg(MPU6050_RA_INT_ENABLE,enabled)
 
     def getIntFreefallEnabled(self) :
         '''!
@@ -2077,33 +2036,24 @@ class MPU6050:
             return val
         
     # ACCEL_*OUT_* registers
-    def getMotion9(self) :
+    def getMotion9(self,magnetometer=None) :
         '''!
         Get raw 9-axis motion sensor readings (accel/gyro/compass).
-        FUNCTION NOT FULLY IMPLEMENTED YET.
-        @param ax 16-bit signed integer container for accelerometer X-axis value
-        @param ay 16-bit signed integer container for accelerometer Y-axis value
-        @param az 16-bit signed integer container for accelerometer Z-axis value
-        @param gx 16-bit signed integer container for gyroscope X-axis value
-        @param gy 16-bit signed integer container for gyroscope Y-axis value
-        @param gz 16-bit signed integer container for gyroscope Z-axis value
-        @param mx 16-bit signed integer container for magnetometer X-axis value
-        @param my 16-bit signed integer container for magnetometer Y-axis value
-        @param mz 16-bit signed integer container for magnetometer Z-axis value
+        The MPU6050 has no magnetometer of its own. The compass values are taken from
+        an external magnetometer driver, e.g. HMC5883 or QMC5883, accessed in bypass mode.
+        @param magnetometer: magnetometer driver object providing getMagRaw(),
+        if None the compass values are returned as None
+        @return (ax,ay,az,gx,gy,gz,mx,my,mz)
         @see getMotion6()
         @see getAcceleration()
         @see getRotation()
         @see MPU6050_RA_ACCEL_XOUT_H
         '''
-        mx = None # unused parameter
-        my = None # unused parameter
-        mz = None # unused parameter
-    
-        motion6 = getMotion6(ax, ay, az, gx, gy, gz)
-        tmp = list(motion6)
-        tmp += [mx,my,mz]
-        # TODO: magnetometer integration
-        return tuple(tmp)
+        ax,ay,az,gx,gy,gz = self.getMotion6()
+        if magnetometer is None:
+            return (ax,ay,az,gx,gy,gz,None,None,None)
+        mx,my,mz = magnetometer.getMagRaw()
+        return (ax,ay,az,gx,gy,gz,mx,my,mz)
 
     def getMotion6(self) :
         '''!
@@ -2119,15 +2069,22 @@ class MPU6050:
         @see getRotation()
         @see MPU6050_RA_ACCEL_XOUT_H
         '''
-        ax = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_XOUT_H,2))
-        ay = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_YOUT_H,2))
-        az = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_ZOUT_H,2))
-
-        gx = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_XOUT_H,2))
-        gy = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_YOUT_H,2))
-        gz = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_ZOUT_H,2))
-
+        ax,ay,az,temp,gx,gy,gz = self.getMotion7()
         return(ax,ay,az,gx,gy,gz)
+
+    def getMotion7(self) :
+        '''!
+        Get raw accel, temperature and gyro readings.
+        All 14 bytes are read in a single burst, which guarantees that the values
+        belong to the same sampling instant, and decoded in one go into the
+        preallocated buffer.
+        @return tuple (ax,ay,az,temp,gx,gy,gz). The raw temperature is converted to
+        degrees Celsius with temp/340 + 36.53
+        @see getMotion6()
+        @see MPU6050_RA_ACCEL_XOUT_H
+        '''
+        self.regs.readBlock(MPU6050_RA_ACCEL_XOUT_H,self.motionBuf)
+        return unpack_from('>7h',self.motionBuf)
     
     def getAcceleration(self) :
         '''!
@@ -2168,11 +2125,8 @@ class MPU6050:
         @return tuple (ax,ay,az)
         @see MPU6050_RA_GYRO_XOUT_H
         '''
-        ax = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_XOUT_H,2))
-        ay = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_YOUT_H,2))
-        az = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_ACCEL_ZOUT_H,2))
-
-        return (ax,ay,az)
+        self.regs.readBlock(MPU6050_RA_ACCEL_XOUT_H,self.motionView[:6])
+        return unpack_from('>3h',self.motionBuf)
 
     def getAccelerationX(self) :
         '''!
@@ -2260,11 +2214,8 @@ class MPU6050:
         @see getMotion6()
         @see MPU6050_RA_GYRO_XOUT_H
         '''
-        gx = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_XOUT_H,2))
-        gy = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_YOUT_H,2))
-        gz = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address,MPU6050_RA_GYRO_ZOUT_H,2))
-
-        return(gx,gy,gz)
+        self.regs.readBlock(MPU6050_RA_GYRO_XOUT_H,self.motionView[:6])
+        return unpack_from('>3h',self.motionBuf)
 
     def getRotationX(self) :
         '''!
@@ -2486,9 +2437,7 @@ class MPU6050:
 
         if (num > 3) :
             return
-        tmp = bytearray(1)
-        tmp[0] = data
-        self.i2c.writeto_mem(self.mpu6050_address,MPU6050_RA_I2C_SLV0_DO + num, tmp)       
+        self.regs.writeReg(MPU6050_RA_I2C_SLV0_DO + num,data)       
 
     # I2C_MST_DELAY_CTRL register
 
@@ -2872,6 +2821,7 @@ class MPU6050:
         @see MPU6050_PWR1_DEVICE_RESET_BIT
         '''
         self.writeBit(MPU6050_RA_PWR_MGMT_1, MPU6050_PWR1_DEVICE_RESET_BIT, True)
+        self.regs.invalidate()      # all registers return to their reset values
 
     def getSleepEnabled(self) :
         '''!
@@ -3199,11 +3149,119 @@ class MPU6050:
         return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_FIFO_COUNTH,1)[0]
 
     
-    def getFIFOBytes(length) :
+    def getFIFOBytes(self,length) :
+        '''!
+        Read length bytes from the FIFO buffer in a single block read
+        @param length: the number of bytes to read
+        @return the bytes read or None if length is 0
+        '''
         if length > 0:
             return self.i2c.readfrom_mem(self.mpu6050_address, MPU6050_RA_FIFO_R_W,length)
         else :
-    	    return None
+            return None
+
+    # FIFO streaming
+
+    def startFIFOStream(self,rate=1000,temperature=False,dlpf=MPU6050_DLPF_BW_188) :
+        '''!
+        Configure the sample rate and stream accel, gyro and optionally temperature
+        samples into the FIFO.
+        Each sample is stored in the FIFO as a frame of 6 (or 7 with temperature)
+        big endian 16 bit values in the register order: ax,ay,az,(temp),gx,gy,gz.
+        The FIFO holds 1024 bytes, at 1 kHz it must be drained at least every
+        85 ms (73 ms with temperature), otherwise samples are lost.
+        @param rate: sample rate in Hz, 4 .. 1000. The DLPF is enabled, which sets
+        the gyroscope output rate to 1 kHz
+        @param temperature: also put the temperature into the FIFO
+        @param dlpf: the DLPF bandwidth setting, MPU6050_DLPF_BW_188 .. MPU6050_DLPF_BW_5
+        @return the number of 16 bit values per frame
+        @see readFIFOFrames()
+        @see fifoStream()
+        '''
+        if rate < 4 or rate > 1000:
+            raise ValueError("MPU6050: FIFO sample rate must be between 4 and 1000 Hz")
+        if dlpf == MPU6050_DLPF_BW_256:
+            raise ValueError("MPU6050: the DLPF must be enabled for FIFO streaming")
+        self.setDLPFMode(dlpf)
+        self.setRate(1000 // rate - 1)
+        self.setFIFOEnabled(False)
+        fifoEnable = (1 << MPU6050_ACCEL_FIFO_EN_BIT | 1 << MPU6050_XG_FIFO_EN_BIT |
+                      1 << MPU6050_YG_FIFO_EN_BIT | 1 << MPU6050_ZG_FIFO_EN_BIT)
+        if temperature:
+            fifoEnable |= 1 << MPU6050_TEMP_FIFO_EN_BIT
+        self.regs.writeReg(MPU6050_RA_FIFO_EN,fifoEnable)
+        if self.fifoBuf is None:
+            self.fifoBuf = memoryview(bytearray(MPU6050_FIFO_SIZE))
+        self.fifoFrameSize = 14 if temperature else 12
+        self.fifoOverflows = 0
+        self.resetFIFO()
+        self.setFIFOEnabled(True)
+        return self.fifoFrameSize // 2
+
+    def stopFIFOStream(self) :
+        '''!
+        Stop streaming samples into the FIFO and clear it
+        '''
+        self.setFIFOEnabled(False)
+        self.regs.writeReg(MPU6050_RA_FIFO_EN,0)
+        self.resetFIFO()
+        self.fifoFrameSize = 0
+
+    def readFIFOFrames(self,samples,start=0) :
+        '''!
+        Drain all complete frames from the FIFO that fit into samples.
+        The frames are read in a single block read into the preallocated FIFO buffer
+        and decoded into samples, starting at frame number start. If the FIFO has
+        overflowed, its contents is no longer frame aligned: it is cleared,
+        fifoOverflows is incremented and no frames are returned.
+        @param samples: array('h') receiving the values, a multiple of the frame length
+        @param start: the first frame in samples to be filled
+        @return the number of frames read
+        @see startFIFOStream()
+        '''
+        frameSize = self.fifoFrameSize
+        count = self.getFIFOCount()
+        if count >= MPU6050_FIFO_SIZE:
+            self.fifoOverflows += 1
+            self.resetFIFO()
+            return 0
+        frames = min(count // frameSize, len(samples) * 2 // frameSize - start)
+        if frames <= 0:
+            return 0
+        length = frames * frameSize
+        buf = self.fifoBuf
+        self.regs.readBlock(MPU6050_RA_FIFO_R_W,buf[:length])
+        # the FIFO holds big endian words. They are decoded in place into the
+        # caller's array: unpack_from would allocate a tuple on every drain
+        index = start * frameSize // 2
+        for i in range(0,length,2):
+            value = buf[i] << 8 | buf[i+1]
+            if value & 0x8000:
+                value -= 0x10000
+            samples[index] = value
+            index += 1
+        return frames
+
+    def fifoStream(self,batch=32) :
+        '''!
+        Generator yielding batches of samples from the FIFO.
+        Each batch is an array('h') of batch frames, see startFIFOStream() for the
+        frame layout. The same array is reused for every batch, copy it if it must
+        be kept.
+        @param batch: number of frames per batch
+        @see startFIFOStream()
+        '''
+        if not self.fifoFrameSize:
+            raise Exception("MPU6050: FIFO streaming not started")
+        samples = array('h',[0] * (batch * self.fifoFrameSize // 2))
+        frames = 0
+        while True:
+            frames += self.readFIFOFrames(samples,frames)
+            if frames == batch:
+                yield samples
+                frames = 0
+            else:
+                sleep_ms(1)
 
     def getFIFOTimeout(self) :
         '''!
@@ -3211,7 +3269,7 @@ class MPU6050:
         @return Current timeout to get a packet from FIFO buffer
         @see MPU6050_FIFO_DEFAULT_TIMEOUT
         '''
-	return self.fifoTimeout;
+        return self.fifoTimeout
 
     def setFIFOTimeout(self,fifoTimeout) :
         '''!
@@ -3219,7 +3277,7 @@ class MPU6050:
         @param New timeout to get a packet from FIFO buffer
         @see MPU6050_FIFO_DEFAULT_TIMEOUT
         '''
-	self.fifoTimeout = fifoTimeout
+        self.fifoTimeout = fifoTimeout
 
     def GetCurrentFIFOPacket(self, data, length)  : # overflow proof
         '''!
@@ -3684,9 +3742,7 @@ class MPU6050:
                 self.setIntZeroMotionEnabled(True)
                 self.setIntFIFOBufferOverflowEnabled(True)
                 # setIntDMPEnabled(true);
-                tmp = bytearray(1)
-                tmp[0] = 0x32
-                self.i2c.writeto_mem(self.mpu6050_address,  MPU6050_RA_INT_ENABLE, tmp, 1)
+                self.regs.writeReg(MPU6050_RA_INT_ENABLE,0x32)
                 success = True;
             else :
                 # unknown special command
@@ -3748,12 +3804,12 @@ class MPU6050:
     '''
     def CalibrateAccel(self,Loops) :
 
-	kP = 0.3
-	kI = 20
-	x = (100 - self.map(Loops, 1, 5, 20, 0)) * .01
-	kP *= x
-	kI *= x
-	self.PID( 0x3B, kP, kI,  Loops) 
+        kP = 0.3
+        kI = 20
+        x = (100 - self.map(Loops, 1, 5, 20, 0)) * .01
+        kP *= x
+        kI *= x
+        self.PID( 0x3B, kP, kI,  Loops) 
 
     def PID(self,ReadAddress, kP, kI, Loops):
         ITerm = [None]*3
@@ -3772,44 +3828,44 @@ class MPU6050:
         else:
             shift = 2
 
-	gravity = 8192 # prevent uninitialized compiler warning
-	if ReadAddress == 0x3B :
+        gravity = 8192 # prevent uninitialized compiler warning
+        if ReadAddress == 0x3B :
             gravity = 16384 >> self.getFullScaleAccelRange()
-	print('>',end='')
+        print('>',end='')
         for i in range(3):
             Data = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, SaveAddress + (i * shift) ,2)) # reads a 16 bit integers (Word)
-	    Reading = Data
-	    if SaveAddress != 0x13:
-	        BitZero[i] = Data & 1									      # Capture Bit Zero to properly handle Accelerometer calibration
-		ITerm[i] = Reading * 8.0
-	    else :
-		ITerm[i] = Reading * 4.0
-	for int in range(Loops):
-	    eSample = 0
+            Reading = Data
+            if SaveAddress != 0x13:
+                BitZero[i] = Data & 1									      # Capture Bit Zero to properly handle Accelerometer calibration
+                ITerm[i] = Reading * 8.0
+            else :
+                ITerm[i] = Reading * 4.0
+        for int in range(Loops):
+            eSample = 0
             for c in range(100): # 100 pi Calculations
-	        eSum = 0
+                eSum = 0
                 for i in range(3) :
                     Data = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, ReadAddress + (i * 2), 2)) # reads a 16 bit integers (Word)
-		    Reading = Data
-		    # if ReadAddress == 0x3B and i == 2:
+                    Reading = Data
+                    # if ReadAddress == 0x3B and i == 2:
                     if ReadAddress == 0x3B and i == 0:  # my mpu6050 is mounted vertically
                         Reading -= gravity	        # remove Gravity
-		    Error = -Reading
-		    eSum += abs(Reading)
-		    PTerm = kP * Error
-		    ITerm[i] += (Error * 0.001) * kI				# Integral term 1000 Calculations a second = 0.001
-		    if SaveAddress != 0x13 :
-			Data = round((PTerm + ITerm[i] ) / 8)		        # Compute PID Output
-			Data = (Data & 0xFFFE) | BitZero[i]			        # Insert Bit0 Saved at beginning
-		    else :
+                    Error = -Reading
+                    eSum += abs(Reading)
+                    PTerm = kP * Error
+                    ITerm[i] += (Error * 0.001) * kI				# Integral term 1000 Calculations a second = 0.001
+                    if SaveAddress != 0x13 :
+                        Data = round((PTerm + ITerm[i] ) / 8)		        # Compute PID Output
+                        Data = (Data & 0xFFFE) | BitZero[i]			        # Insert Bit0 Saved at beginning
+                    else :
                         Data = round((PTerm + ITerm[i] ) / 4)	                # Compute PID Output
                         
                     tmp = self.intToBytes(Data)
                     self.i2c.writeto_mem(self.mpu6050_address, SaveAddress + (i * shift), tmp)
 
-		    if c == 99 and eSum > 1000 :				# Error is still to great to continue 
-			c = 0
-			print('*',end='')
+                    if c == 99 and eSum > 1000 :				# Error is still to great to continue 
+                        c = 0
+                        print('*',end='')
 
                     if ReadAddress == 0x3B:
                         tmp = 0.5
@@ -3817,60 +3873,163 @@ class MPU6050:
                         tmp = 1
                     if eSum * tmp < 5:
                         eSample += 1
-		    # if((eSum * ((ReadAddress == 0x3B)?.05: 1)) < 5):
+                    # if((eSum * ((ReadAddress == 0x3B)?.05: 1)) < 5):
                     #     eSample++;	// Successfully found offsets prepare to  advance
 
-		    if eSum < 100 and c > 10 and eSample >= 10 :
+                    if eSum < 100 and c > 10 and eSample >= 10 :
                         break		#Advance to next Loop
-		    sleep_ms(1)
+                    sleep_ms(1)
 
-	    print('.',end='')
-	    kP *= .75
-	    kI *= .75
+            print('.',end='')
+            kP *= .75
+            kI *= .75
             for i in range(3):
-		if SaveAddress != 0x13 :
-		    Data = round((ITerm[i] ) / 8)		# Compute PID Output
-		    Data = (Data & 0xFFFE) |BitZero[i]	# Insert Bit0 Saved at beginning
-		else :
+                if SaveAddress != 0x13 :
+                    Data = round((ITerm[i] ) / 8)		# Compute PID Output
+                    Data = (Data & 0xFFFE) |BitZero[i]	# Insert Bit0 Saved at beginning
+                else :
                     Data = round((ITerm[i]) / 4)
                     tmp = self.intToBytes(Data)
                     self.i2c.writeto_mem(self.mpu6050_address, SaveAddress + (i * shift), tmp)
 
-	self.resetFIFO()
-	self.resetDMP()
+        self.resetFIFO()
+        self.resetDMP()
 
     def PrintActiveOffsets(self) :
         if self.getDeviceID() < 0x38 :    
-	    AOffsetRegister = MPU6050_RA_XA_OFFS_H
+            AOffsetRegister = MPU6050_RA_XA_OFFS_H
         else :
             AOffsetRegister = 0x77
-	Data = [None]*3
-	# print("Offset Register 0x{:04x}".format(AOffsetRegister>>4))
-	# print(AOffsetRegister&0x0F,HEX);
-	print("\n   X Accel  Y Accel  Z Accel   X Gyro   Y Gyro   Z Gyro      OFFSETS ")
-	if AOffsetRegister == 0x06 :
+        Data = [None]*3
+        # print("Offset Register 0x{:04x}".format(AOffsetRegister>>4))
+        # print(AOffsetRegister&0x0F,HEX);
+        print("\n   X Accel  Y Accel  Z Accel   X Gyro   Y Gyro   Z Gyro      OFFSETS ")
+        if AOffsetRegister == 0x06 :
             Data[0] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister, 2)) # reads a 16 bit integers (Word)
             Data[1] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister+2, 2)) # reads a 16 bit integers (Word)
             Data[2] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister+4, 2)) # reads a 16 bit integers (Word)
 
-	    # I2Cdev::readWords(devAddr, AOffsetRegister, 3, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
-	else :
+            # I2Cdev::readWords(devAddr, AOffsetRegister, 3, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
+        else :
             Data[0] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister, 2)) # reads a 16 bit integers (Word)
             Data[1] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister+3, 2)) # reads a 16 bit integers (Word)
             Data[2] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, AOffsetRegister+6, 2)) # reads a 16 bit integers (Word)
-	    # I2Cdev::readWords(devAddr, AOffsetRegister, 1, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
-	    # I2Cdev::readWords(devAddr, AOffsetRegister+3, 1, (uint16_t *)Data+1, I2Cdev::readTimeout, wireObj);
-	    # I2Cdev::readWords(devAddr, AOffsetRegister+6, 1, (uint16_t *)Data+2, I2Cdev::readTimeout, wireObj);
+            # I2Cdev::readWords(devAddr, AOffsetRegister, 1, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
+            # I2Cdev::readWords(devAddr, AOffsetRegister+3, 1, (uint16_t *)Data+1, I2Cdev::readTimeout, wireObj);
+            # I2Cdev::readWords(devAddr, AOffsetRegister+6, 1, (uint16_t *)Data+2, I2Cdev::readTimeout, wireObj);
 
         print("    {:5d},   ".format(int(Data[0])),end='')
         print("{:5d},   ".format(int(Data[1])),end='')
         print("{:5d},   ".format(int(Data[2])),end='')
         for i in range(3):
             Data[i] = self.bytesToInt(self.i2c.readfrom_mem(self.mpu6050_address, 0x13 + 2*i, 2)) # reads a 16 bit integers (Word)
-	    # I2Cdev::readWords(devAddr, 0x13, 3, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
+            # I2Cdev::readWords(devAddr, 0x13, 3, (uint16_t *)Data, I2Cdev::readTimeout, wireObj);
             # XG_OFFSET_H_READ_OFFS_USR(Data);
         print("{:5d},   ".format(int(Data[0])),end='')
         print("{:5d},   ".format(int(Data[1])),end='')
         print("{:5d},   ".format(int(Data[2])))
 
-
+    # FIFO based offset calibration
+
+    def getFIFOMeans(self,samples,means,batch) :
+        '''!
+        Average samples frames drained in bulk from the FIFO.
+        FIFO streaming of accel and gyro (no temperature) must be running.
+        @param samples: number of frames to average
+        @param means: list receiving the 6 mean values ax,ay,az,gx,gy,gz
+        @param batch: preallocated array('h') used to drain the FIFO
+        @see startFIFOStream()
+        '''
+        sums = [0] * 6
+        frames = 0
+        while frames < samples:
+            n = min(self.readFIFOFrames(batch),samples - frames)
+            index = 0
+            for _ in range(n):
+                for axis in range(6):
+                    sums[axis] += batch[index + axis]
+                index += 6
+            frames += n
+            if not n:
+                sleep_ms(10)
+        for axis in range(6):
+            means[axis] = sums[axis] / samples
+
+    def calibrateOffsets(self,gravity=(0,0,1),samples=500,iterations=5,dlpf=MPU6050_DLPF_BW_42) :
+        '''!
+        Calibrate the offsets of the 3 accelerometer and the 3 gyroscope axes together.
+        The sensor must be at rest. For each iteration the mean of samples frames read
+        in bulk from the FIFO at 1 kHz is taken and all 6 offsets are corrected in a
+        single step from the known sensitivity of the offset registers: one accel offset
+        LSB corresponds to 8 LSB at +-2 g, one gyro offset LSB to 4 LSB at +-250 deg/s,
+        scaled to the current full scale ranges. From the second iteration on, the
+        sensitivity of each axis is replaced by the one measured from the response to the
+        previous correction (Newton step), which absorbs chip to chip differences.
+        Bit 0 of the accel offsets is reserved and is kept.
+        Each iteration takes about 0.55 s, typically 3 iterations are needed.
+        The DLPF and sample rate settings are restored and the FIFO is left disabled.
+        @param gravity: the acceleration expected on the x,y,z axes in g, (0,0,1) with the
+        sensor lying flat, (1,0,0) with the x axis pointing up
+        @param samples: number of frames averaged per iteration
+        @param iterations: maximum number of iterations
+        @param dlpf: DLPF bandwidth used during the calibration
+        @return the offsets written: ax,ay,az,gx,gy,gz
+        @see setXAccelOffset()
+        @see setXGyroOffset()
+        '''
+        setters = (self.setXAccelOffset,self.setYAccelOffset,self.setZAccelOffset,
+                   self.setXGyroOffset,self.setYGyroOffset,self.setZGyroOffset)
+        offsets = [self.getXAccelOffset(),self.getYAccelOffset(),self.getZAccelOffset(),
+                   self.getXGyroOffset(),self.getYGyroOffset(),self.getZGyroOffset()]
+        bitZero = [offsets[axis] & 1 for axis in range(3)]
+        accelLSB = 16384 >> self.getFullScaleAccelRange()
+        target = [g * accelLSB for g in gravity] + [0,0,0]
+        # measured LSBs per offset LSB, below 1 for the gyro at +-2000 deg/s
+        nominal = ([8.0 / (1 << self.getFullScaleAccelRange())] * 3 +
+                   [4.0 / (1 << self.getFullScaleGyroRange())] * 3)
+        sensitivity = list(nominal)
+        # an accel offset can only move in steps of 2 because of the reserved bit 0,
+        # the measured gyro values are not resolved better than 1 LSB
+        tolerance = [2 * nominal[axis] if axis < 3 else max(1.0,nominal[axis]) for axis in range(6)]
+
+        dlpfMode = self.getDLPFMode()
+        rate = self.getRate()
+        batch = array('h',[0] * (32 * 6))
+        means = [0.0] * 6
+        lastMeans = [0.0] * 6
+        lastOffsets = list(offsets)
+        self.startFIFOStream(1000,False,dlpf)
+        try:
+            for iteration in range(iterations):
+                sleep_ms(50)                  # let the DLPF settle on the new offsets
+                self.resetFIFO()
+                self.getFIFOMeans(samples,means,batch)
+                if self.debug:
+                    print("calibrateOffsets: iteration {:d}, offsets {}, means {}".format(iteration,offsets,means))
+                done = True
+                for axis in range(6):
+                    if iteration:
+                        step = offsets[axis] - lastOffsets[axis]
+                        if abs(step) >= 2:
+                            # Newton step: use the sensitivity measured on this chip
+                            measured = (means[axis] - lastMeans[axis]) / step
+                            if nominal[axis] / 2 < measured < nominal[axis] * 2:
+                                sensitivity[axis] = measured
+                    error = means[axis] - target[axis]
+                    lastMeans[axis] = means[axis]
+                    lastOffsets[axis] = offsets[axis]
+                    if abs(error) >= tolerance[axis] / 2:
+                        done = False
+                        offsets[axis] -= round(error / sensitivity[axis])
+                        if axis < 3:
+                            offsets[axis] = (offsets[axis] & ~1) | bitZero[axis]
+                if done:
+                    break
+                for axis in range(6):
+                    if offsets[axis] != lastOffsets[axis]:
+                        setters[axis](offsets[axis])
+        finally:
+            self.stopFIFOStream()
+            self.setDLPFMode(dlpfMode)
+            self.setRate(rate)
+        return tuple(offsets)
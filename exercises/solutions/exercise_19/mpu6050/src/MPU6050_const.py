@@ -418,3 +418,4 @@ MPU6050_DMP_MEMORY_CHUNK_SIZE   = const(16)
 
 MPU6050_FIFO_DEFAULT_TIMEOUT = const(11000)
 
+MPU6050_FIFO_SIZE            = const(1024)
@@ -0,0 +1,108 @@
+# magcal.py: device side of the magnetometer calibration
+# The raw samples of the HMC5883 or QMC5883 are either
+# - accumulated into the sufficient statistics of a least squares ellipsoid
+#   fit (MagStats). These are the sums of all monomials x^a*y^b*z^c of degree
+#   up to 4 over the samples: 35 numbers, whatever the number of samples.
+# - or streamed in compressed form to a file, a socket or the serial line
+#   (MagStream). Each sample is sent as 3 signed byte differences to the
+#   previous one, an escape byte followed by the absolute 16 bit values is
+#   used when a difference does not fit.
+# magfit.py on the host computes the offset and the correction matrix from
+# either of them. Pass MagStats.add or MagStream.add as callback to
+# startContinuous() of the driver.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+from struct import pack_into
+
+# exponents (a,b,c) of the monomials x^a*y^b*z^c of degree <= 4
+MAG_MOMENTS = tuple((a,b,d-a-b) for d in range(5)
+                    for a in range(d,-1,-1) for b in range(d-a,-1,-1))
+
+MAG_ESCAPE = 0x80                  # marks a sample sent with absolute values
+
+class MagStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # integers: the sums are exact, float would lose the small terms
+        self.moments = [0] * len(MAG_MOMENTS)
+        self.minimum = [32767] * 3
+        self.maximum = [-32768] * 3
+        self.px = [1] * 5
+        self.py = [1] * 5
+        self.pz = [1] * 5
+
+    def add(self,x,y,z):
+        px = self.px
+        py = self.py
+        pz = self.pz
+        for i in range(1,5):
+            px[i] = px[i-1] * x
+            py[i] = py[i-1] * y
+            pz[i] = pz[i-1] * z
+        moments = self.moments
+        i = 0
+        for a,b,c in MAG_MOMENTS:
+            moments[i] += px[a] * py[b] * pz[c]
+            i += 1
+        sample = (x,y,z)
+        for axis in range(3):
+            if sample[axis] < self.minimum[axis]:
+                self.minimum[axis] = sample[axis]
+            if sample[axis] > self.maximum[axis]:
+                self.maximum[axis] = sample[axis]
+
+    def getCount(self):
+        return self.moments[0]
+
+    def hardIron(self):
+        # quick estimate of the offset without the host: the centre of the
+        # bounding box, only good if the sensor was turned in all directions
+        return tuple((self.maximum[axis] + self.minimum[axis]) / 2 for axis in range(3))
+
+    def save(self,filename):
+        # one line per moment: exponents of x,y,z and the sum
+        with open(filename,"w") as f:
+            f.write("# a b c sum(x^a*y^b*z^c)\n")
+            for i in range(len(MAG_MOMENTS)):
+                a,b,c = MAG_MOMENTS[i]
+                f.write("{:d} {:d} {:d} {:d}\n".format(a,b,c,self.moments[i]))
+
+class MagStream:
+    def __init__(self,stream,bufSize=256):
+        # stream: anything with a write method: file, socket, sys.stdout.buffer
+        self.stream = stream
+        self.buf = bytearray(bufSize)
+        self.pos = 0
+        self.last = None
+        self.count = 0
+
+    def add(self,x,y,z):
+        buf = self.buf
+        if self.pos > len(buf) - 7:
+            self.flush()
+        last = self.last
+        pos = self.pos
+        if last is not None:
+            dx = x - last[0]
+            dy = y - last[1]
+            dz = z - last[2]
+        if last is None or not (-128 < dx < 128 and -128 < dy < 128 and -128 < dz < 128):
+            buf[pos] = MAG_ESCAPE
+            pack_into('<3h',buf,pos+1,x,y,z)
+            self.pos = pos + 7
+        else:
+            buf[pos] = dx & 0xff
+            buf[pos+1] = dy & 0xff
+            buf[pos+2] = dz & 0xff
+            self.pos = pos + 3
+        self.last = (x,y,z)
+        self.count += 1
+
+    def flush(self):
+        if self.pos:
+            self.stream.write(memoryview(self.buf)[:self.pos])
+            self.pos = 0
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# magfit.py: host side of the magnetometer calibration
+# Fits an ellipsoid to the raw magnetometer samples and computes the hard iron
+# offset and the soft iron correction matrix W such that
+#     corrected = W * (raw - offset)
+# lies on a sphere. The result is written as a python file to be copied to
+# the device and passed to setCalibration() of the HMC5883 or QMC5883 driver.
+# Input is one of
+#   - the moments file written by MagStats.save() on the device
+#   - a binary sample file written by MagStream
+#   - a text file with x,y,z per line (e.g. calib.csv)
+# or the binary samples are received from MagStream over TCP (--listen)
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+import argparse
+import socket
+import struct
+import sys
+import numpy as np
+
+MAG_ESCAPE = 0x80
+# the quadric A x² + B y² + C z² + D xy + E xz + F yz + G x + H y + I z = 1
+# is fitted on these monomials (exponents of x,y,z)
+QUADRIC = ((2,0,0),(0,2,0),(0,0,2),(1,1,0),(1,0,1),(0,1,1),(1,0,0),(0,1,0),(0,0,1))
+SCALE = 1000.0  # raw values are divided by SCALE to keep the normal equations well conditioned
+
+def decodeStream(data):
+    # decode the delta compressed samples of MagStream
+    samples = []
+    last = None
+    pos = 0
+    while pos < len(data):
+        if data[pos] == MAG_ESCAPE:
+            if pos + 7 > len(data):
+                break
+            last = struct.unpack_from('<3h',data,pos+1)
+            pos += 7
+        else:
+            if pos + 3 > len(data) or last is None:
+                break
+            delta = struct.unpack_from('<3b',data,pos)
+            last = (last[0]+delta[0],last[1]+delta[1],last[2]+delta[2])
+            pos += 3
+        samples.append(last)
+    return np.array(samples,dtype=float)
+
+def readMoments(filename):
+    moments = {}
+    with open(filename) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            a,b,c,value = (int(v) for v in line.split())
+            moments[(a,b,c)] = value
+    return moments
+
+def normalEquations(moments):
+    # build B^T B and B^T 1 of the design matrix B from the moments
+    def moment(e):
+        return moments[e] / SCALE**sum(e)
+    n = len(QUADRIC)
+    btb = np.empty((n,n))
+    bt1 = np.empty(n)
+    for i in range(n):
+        for j in range(n):
+            btb[i,j] = moment(tuple(p + q for p,q in zip(QUADRIC[i],QUADRIC[j])))
+        bt1[i] = moment(QUADRIC[i])
+    return btb,bt1
+
+def fitSamples(samples):
+    s = samples / SCALE
+    x,y,z = s[:,0],s[:,1],s[:,2]
+    design = np.column_stack((x*x,y*y,z*z,x*y,x*z,y*z,x,y,z))
+    v = np.linalg.lstsq(design,np.ones(len(s)),rcond=None)[0]
+    return v
+
+def fitMoments(moments):
+    btb,bt1 = normalEquations(moments)
+    return np.linalg.solve(btb,bt1)
+
+def ellipsoid(v):
+    # offset and correction matrix from the quadric coefficients
+    a,b,c,d,e,f,g,h,i = v
+    q = np.array([[a,d/2,e/2],
+                  [d/2,b,f/2],
+                  [e/2,f/2,c]])
+    centre = -np.linalg.solve(q,np.array([g,h,i])) / 2
+    k = 1 + centre @ q @ centre
+    shape = q / k
+    eigenvalues,eigenvectors = np.linalg.eigh(shape)
+    if np.any(eigenvalues <= 0):
+        raise ValueError("the samples do not describe an ellipsoid, turn the sensor in all directions")
+    # keep the mean radius, only the shape is corrected
+    radius = np.prod(eigenvalues) ** (-1/6)
+    w = eigenvectors @ np.diag(np.sqrt(eigenvalues)) @ eigenvectors.T * radius
+    return centre * SCALE, w, radius * SCALE
+
+def receive(port):
+    # receive the MagStream samples over TCP until the device closes the connection
+    server = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+    server.bind(("",port))
+    server.listen(1)
+    print("Waiting for the device on port {:d}".format(port))
+    conn,addr = server.accept()
+    print("Connection from",addr[0])
+    chunks = []
+    while True:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    conn.close()
+    server.close()
+    return b"".join(chunks)
+
+def writeCalibration(filename,offset,w):
+    with open(filename,"w") as f:
+        f.write("# magnetometer calibration written by magfit.py\n")
+        f.write("# usage: mag.setCalibration(MAG_OFFSET,MAG_MATRIX)\n")
+        f.write("MAG_OFFSET = ({:.3f}, {:.3f}, {:.3f})\n".format(*offset))
+        f.write("MAG_MATRIX = ({:.6f}, {:.6f}, {:.6f},\n".format(*w[0]))
+        f.write("              {:.6f}, {:.6f}, {:.6f},\n".format(*w[1]))
+        f.write("              {:.6f}, {:.6f}, {:.6f})\n".format(*w[2]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Ellipsoid fit of magnetometer calibration data")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--moments",help="moments file written by MagStats.save()")
+    group.add_argument("--stream",help="binary file written by MagStream")
+    group.add_argument("--text",help="text file with x,y,z per line")
+    group.add_argument("--listen",type=int,metavar="PORT",help="receive MagStream samples over TCP")
+    parser.add_argument("-o","--output",default="magcal_data.py",help="calibration file for the device")
+    parser.add_argument("--plot",action="store_true",help="plot raw and corrected samples")
+    args = parser.parse_args()
+
+    samples = None
+    if args.moments:
+        moments = readMoments(args.moments)
+        print("{:d} samples".format(moments[(0,0,0)]))
+        v = fitMoments(moments)
+    else:
+        if args.stream:
+            with open(args.stream,"rb") as f:
+                samples = decodeStream(f.read())
+        elif args.listen:
+            samples = decodeStream(receive(args.listen))
+        else:
+            samples = np.loadtxt(args.text,delimiter=",")
+        print("{:d} samples".format(len(samples)))
+        if len(samples) < len(QUADRIC):
+            sys.exit("Not enough samples for the fit")
+        v = fitSamples(samples)
+
+    offset,w,radius = ellipsoid(v)
+    print("offset: {:.3f}, {:.3f}, {:.3f}".format(*offset))
+    print("correction matrix:")
+    for row in w:
+        print("  {:9.6f} {:9.6f} {:9.6f}".format(*row))
+    print("mean field: {:.3f}".format(radius))
+    if samples is not None:
+        corrected = (samples - offset) @ w.T
+        norm = np.linalg.norm(corrected,axis=1)
+        print("corrected field: {:.3f} +- {:.3f}".format(norm.mean(),norm.std()))
+    writeCalibration(args.output,offset,w)
+    print("Calibration written to",args.output)
+
+    if args.plot and samples is not None:
+        import matplotlib.pyplot as plt
+        fig,axes = plt.subplots(1,3,figsize=(15,5))
+        for ax,(i,j,title) in zip(axes,((0,1,"XY"),(0,2,"XZ"),(1,2,"YZ"))):
+            ax.scatter(samples[:,i],samples[:,j],s=4,label="raw")
+            ax.scatter(corrected[:,i],corrected[:,j],s=4,label="corrected")
+            ax.set(title=title)
+            ax.set_aspect("equal")
+            ax.legend()
+        plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@
 
 from machine import Pin,I2C
 from HMC5883_const import *
+from registerMap import RegisterMap
+from struct import unpack_from
+from irqAcquire import ScheduledIrq,MovingAverage
 
 from time import sleep_ms
 from math import atan2,floor,pi
@@ -21,12 +24,18 @@ MPU6050_PWR_MGMT_1  = const(0x6b)
 MPU6050_USER_CTRL   = const(0x6a)
 MPU6050_INT_PIN_CFG = const(0x37)
 
+# configuration registers shadowed by the register map. The mode register is
+# volatile: the HMC5883 returns to idle after a single measurement
+HMC5883_CONFIG_REGISTERS = (HMC5883_CONF_A,HMC5883_CONF_B)
+
 class HMC5883:
     def __init__(self,bus=1,scl=22,sda=21,drdy=27,debug=False):
         self.debug = debug
         self.drdy=Pin(drdy,Pin.IN)
         self.declination = (0,0)
         self.smoothing = 1
+        self.calOffset = None   # hard and soft iron calibration, see setCalibration
+        self.calMatrix = None
         self.mag_x = self.mag_y = self.mag_z = None
         # Create an I2C object
         # Check if we can use the hardware I2C interface, if not, create a software I2C interface
@@ -38,6 +47,13 @@ class HMC5883:
             if self.debug:
                 print("Running on I2C bus ",bus, "scl = ",scl, " sda = ",sda)
             self.i2c = SoftI2C(scl,sda)
+        self.regs = RegisterMap(self.i2c,HMC5883_ADDRESS,HMC5883_CONFIG_REGISTERS,debug)
+        self.magBuf = bytearray(6)
+        # continuous acquisition driven by the DRDY interrupt
+        self.streaming = False
+        self.callback = None
+        self.irq = None
+        self.movingAverage = None
             
         addr = self.i2c.scan()
         # print(addr)
@@ -83,6 +99,7 @@ class HMC5883:
         else:
             print("Switch debug off")
         self.debug = onOff
+        self.regs.debug = onOff
 
     def readBytes(self,register,no_of_bytes,mpu6050=False):
         if mpu6050:
@@ -116,19 +133,25 @@ class HMC5883:
             print("")
         self.i2c.writeto_mem(i2c_address,register,values)
 
+    # HMC5883 registers are accessed through the register map, which serves
+    # the configuration registers from its shadow copy
+
     def readByte(self,register,mpu6050=False):
+        if not mpu6050:
+            return self.regs.readReg(register)
         return self.readBytes(register,1,mpu6050)[0]
 
     def writeByte(self,register,value,mpu6050=False):
+        if not mpu6050:
+            self.regs.writeReg(register,value)
+            return
         tmp = bytearray(1)
         tmp[0] = value
         self.writeBytes(register,tmp,mpu6050)
 
     def readBits(self, register, bit_position, no_of_bits,mpu6050=False):
-        if mpu6050:
-            i2c_address = MPU6050_ADDRESS
-        else:
-            i2c_address = HMC5883_ADDRESS
+        if not mpu6050:
+            return self.regs.readBits(register,bit_position,no_of_bits)
         tmp = self.readByte(register,mpu6050)
         mask = 1
         for i in range(1,no_of_bits):
@@ -143,17 +166,13 @@ class HMC5883:
         return self.readBits(register,bit_position,1,mpu6050)
 
     def writeBits(self,register,bit_position,no_of_bits, value, mpu6050=False):
-        if mpu6050:
-            i2c_address = MPU6050_ADDRESS
-        else:
-            i2c_address = HMC5883_ADDRESS
+        if not mpu6050:
+            self.regs.writeBits(register,bit_position,no_of_bits,value)
+            return
         # print("writeBits: value: 0x{:02x}".format(value))   
         tmp = self.readByte(register,mpu6050)
         if self.debug:
-            if mpu6050:
-                print("writeBits: read from mpu6050 register 0x{:02x}: 0x{:02x}".format(register,tmp))
-            else:
-                print("writeBits: read from hmc5883 register 0x{:02x}: 0x{:02x}".format(register,tmp))
+            print("writeBits: read from mpu6050 register 0x{:02x}: 0x{:02x}".format(register,tmp))
         mask = 1
         for i in range(1,no_of_bits):
             mask = mask << 1 | 1
@@ -164,11 +183,8 @@ class HMC5883:
         tmp &= mask
         tmp |= value <<shift
         if self.debug:
-            if mpu6050:
-                print("writeBits: Writing 0x{:02x} to register 0x{:02x} on mpu6050".format(tmp,register))
-            else:
-                print("writeBits: Writing 0x{:02x} to register 0x{:02x} on hmc5883".format(tmp,register))
-        self.writeByte(register,tmp)
+            print("writeBits: Writing 0x{:02x} to register 0x{:02x} on mpu6050".format(tmp,register))
+        self.writeByte(register,tmp,mpu6050)
         
     def getID(self):
         id = self.readBytes(HMC5883_ID_A,3).decode()
@@ -272,20 +288,33 @@ class HMC5883:
 
 
     def getMag16Bits(self):
-        data = self.readBytes(HMC5883_DATA_X_MSB,6)
-        mag_x = data[0] << 8 | data[1]
+        # burst read of the 6 data registers into the preallocated buffer
+        self.regs.readBlock(HMC5883_DATA_X_MSB,self.magBuf)
         # careful: the sequence is x,z,y !!!
-        mag_z = data[2] << 8 | data[3]
-        mag_y = data[4] << 8 | data[5]
+        mag_x,mag_z,mag_y = unpack_from('>3H',self.magBuf)
         return (mag_x,mag_y,mag_z)
 
     def getMagRaw(self):
-        magRaw = [0]*3
+        if self.streaming:
+            # continuous acquisition: return the moving average without blocking
+            self.waitSample()
+            magRaw = self.movingAverage.average()
+        else:
+            magRaw = self.averageMag()
+        if self.debug:
+            print("getMagRaw: mag raw: {:8.2f}, {:8.2f}, {:8.2f}".format(magRaw[X],magRaw[Y],magRaw[Z]))
+        self.mag_x = magRaw[X]
+        self.mag_y = magRaw[Y]
+        self.mag_z = magRaw[Z]
+        return magRaw
+
+    def averageMag(self):
+        # single shot acquisition of self.smoothing samples, polls the status register
+        sum_x = sum_y = sum_z = 0
         # dummy read to be sure we get the latest values
-        data = self.getMag16Bits()
-        # apply smoothing if smoothing value is set        
+        self.regs.readBlock(HMC5883_DATA_X_MSB,self.magBuf)
         if self.debug:
-            print("getMagRaw: Averaging over {:d} measurements".format(self.smoothing))
+            print("averageMag: Averaging over {:d} measurements".format(self.smoothing))
         for _ in range(self.smoothing):
             # check data ready
             timeout = 0
@@ -294,21 +323,15 @@ class HMC5883:
                 sleep_ms(1)
             if timeout >= 200:
                 raise Exception ("Acquisition timeout")
-            
-            tmp = list(self.getMag16Bits())
-            for axis in range(3):
-                if tmp[axis] & 0x8000:
-                    tmp[axis] -= 0x10000
-                magRaw[axis] += tmp[axis]
-        for axis in range(3):
-            magRaw[axis] /= self.smoothing
-        if self.debug:
-            print("getMagRaw: mag raw: {:8.2f}, {:8.2f}, {:8.2f}".format(magRaw[X],magRaw[Y],magRaw[Z]))
-        self.mag_x = magRaw[X]
-        self.mag_y = magRaw[Y]
-        self.mag_z = magRaw[Z]
-        return tuple(magRaw)
-    
+            self.regs.readBlock(HMC5883_DATA_X_MSB,self.magBuf)
+            # careful: the sequence is x,z,y !!!
+            mag_x,mag_z,mag_y = unpack_from('>3h',self.magBuf)
+            sum_x += mag_x
+            sum_y += mag_y
+            sum_z += mag_z
+        n = self.smoothing
+        return (sum_x/n,sum_y/n,sum_z/n)
+
     def getMagRaw_x(self):
         return self.getMagRaw()[X]
 
@@ -319,7 +342,7 @@ class HMC5883:
         return self.getMagRaw()[Z]
     
     def getMag(self):
-        data = self.getMagRaw()
+        data = self.correct(self.getMagRaw())
         # print("getMag: raw data {:f}, {:f}, {:f}".format(data[X],data[Y],data[Z]))
         coeff = HMC5883_gain[self.getGain()]
         # print("getMag: coeff: {:d}".format(coeff))
@@ -331,6 +354,36 @@ class HMC5883:
         # print("getMag: mag: {:f}, {:f}, {:f}".format(self.mag_x,self.mag_y,self.mag_z)) 
         return (self.mag_x,self.mag_y,self.mag_z)
     
+    # calibration
+    # offset and matrix are computed by calibration/magfit.py on the host from
+    # samples taken at the current gain. getMag() returns matrix*(raw - offset)
+
+    def setCalibration(self,offset,matrix=(1,0,0,0,1,0,0,0,1)):
+        # offset: (x,y,z) in raw counts, matrix: 3x3 correction matrix by rows
+        if len(offset) != 3 or len(matrix) != 9:
+            raise ValueError("offset needs 3 and matrix 9 values")
+        self.calOffset = tuple(offset)
+        self.calMatrix = tuple(matrix)
+
+    def getCalibration(self):
+        return self.calOffset,self.calMatrix
+
+    def clearCalibration(self):
+        self.calOffset = None
+        self.calMatrix = None
+
+    def correct(self,raw):
+        if self.calMatrix is None:
+            return raw
+        o = self.calOffset
+        m = self.calMatrix
+        dx = raw[X] - o[X]
+        dy = raw[Y] - o[Y]
+        dz = raw[Z] - o[Z]
+        return (m[0]*dx + m[1]*dy + m[2]*dz,
+                m[3]*dx + m[4]*dy + m[5]*dz,
+                m[6]*dx + m[7]*dy + m[8]*dz)
+
     def getMag_x(self):
         return self.getMag()[X]
 
@@ -362,21 +415,81 @@ class HMC5883:
 
     def setSmoothing(self,value):
         self.smoothing = value
+        if self.streaming:
+            # the ring is replaced, not resized under a running acquisition
+            self.resetAverage()
 
     def getSmoothing(self):
         return self.smoothing
     
     # interrupts
+    # In continuous acquisition mode each DRDY pulse schedules a burst read of
+    # the data registers into a ring of the last self.smoothing samples and
+    # the running sums over the ring are updated. getMag() and getMagRaw()
+    # then return the moving average immediately instead of blocking for
+    # self.smoothing conversions.
+
+    def startContinuous(self,rate=None,callback=None):
+        # rate: one of the HMC5883_RATE_xxx constants, None keeps the current rate
+        # callback: called with the raw (x,y,z) values of every new sample
+        self.stopContinuous()
+        if rate is not None:
+            self.setSamplingRate(rate)
+        self.callback = callback
+        self.resetAverage()
+        self.streaming = True
+        self.enbleDrdyInt()
+        self.setMode(HMC5883_MR_CONT)
+
+    def stopContinuous(self):
+        if not self.streaming:
+            return
+        self.disableDrdyInt()
+        self.setMode(HMC5883_MR_IDLE)
+        self.streaming = False
+
+    def resetAverage(self):
+        # a single assignment: acquire() adds its sample either to the old
+        # or to the new ring, never to a ring of one size with the index of another
+        self.movingAverage = MovingAverage(self.smoothing)
+
+    def waitSample(self):
+        # wait for the first sample after a start
+        timeout = 0
+        self.poll()
+        while not self.movingAverage.filled and timeout < 2000:  # 0.75 Hz is the slowest rate
+            timeout += 1
+            sleep_ms(1)
+            self.poll()
+        if timeout >= 2000:
+            raise Exception ("Acquisition timeout")
+
+    def getSampleCount(self):
+        if self.movingAverage is None:
+            return 0
+        return self.movingAverage.samples
+
+    def poll(self):
+        # run an acquisition the scheduler could not take
+        if self.irq is not None:
+            self.irq.poll()
+
+    def acquire(self,arg=None):
+        self.regs.readBlock(HMC5883_DATA_X_MSB,self.magBuf)
+        # careful: the sequence is x,z,y !!!
+        mag_x,mag_z,mag_y = unpack_from('>3h',self.magBuf)
+        self.movingAverage.add(mag_x,mag_y,mag_z)
+        if self.callback:
+            self.callback(mag_x,mag_y,mag_z)
 
-    def drdyHandler(self,src):
-        data = self.getMagRaw()
-        print("mag_x: {:d}, mag_y: {:d}, mag_z: {:d}".format(data[0],data[1],data[2]))
-        
     def enbleDrdyInt(self):
-        self.drdy.irq(trigger=Pin.IRQ_RISING,handler=drdyHandler)
+        # DRDY is pulled low for 250 us when new data are available
+        self.irq = ScheduledIrq(self.drdy,self.acquire,Pin.IRQ_FALLING)
 
     def disableDrdyInt(self):
-        self.drdy.irq(trigger=Pin.IRQ_RISING,handler=None)
+        if self.irq is not None:
+            self.irq.deinit()
+            self.irq = None
 
     # self test
 
@@ -1,6 +1,12 @@
-# hmc5883_calib.py: Calibrates the magnetometer
-# When turning the magnetometer around the x,y,z axis the measured values
-# should switch from one axis to the other.
+# hmc5883_calib.py: Collects the data for the hard and soft iron calibration
+# of the magnetometer. Turn the sensor slowly in all directions while the
+# samples are taken.
+# With MODE = "moments" only the sums needed by the ellipsoid fit are kept
+# and written to magstats.txt. With MODE = "stream" the raw samples are sent
+# compressed to HOST, where "magfit.py --listen PORT" receives them, or saved
+# to magsamples.bin if HOST is None. Then run magfit.py on the host and copy
+# the resulting magcal_data.py to the device.
+# magcal.py from the calibration directory must be on the device.
 # Copyright U. Raich, 25.8.2020
 # This program is released under he MIT license
 # It is part of the course on the Internet of Things at
@@ -8,48 +14,43 @@
 
 from HMC5883_const import *
 from HMC5883 import HMC5883
+from magcal import MagStats,MagStream
 from utime import sleep_ms
+import socket
 
-hmc5883 = HMC5883()
+MODE     = "moments"   # or "stream"
+HOST     = None        # IP address of the host running magfit.py --listen
+PORT     = 5001
+DURATION = 60          # seconds
 
+hmc5883 = HMC5883()
 hmc5883.setAvg(HMC5883_AVG_8)
 hmc5883.setBias(HMC5883_MS_NORMAL_BIAS)
-hmc5883.setGain(HMC5883_GAIN_1_3)
-hmc5883.setMode(HMC5883_MR_CONT)
-hmc5883.setSmoothing(5)
-# hmc5883.printRegValues()
-# hmc5883.setDebug(True)
-
-# print("Gain set to {:d}".format(hmc5883.getGainInt()))
-data = hmc5883.getMagRaw()
-# print("raw: {:8.2f}, {:8.2f}, {:8.2f}".format(data[X],data[Y],data[Z]))
-data = hmc5883.getMag()
-# print("{:8.2f}, {:8.2f}, {:8.2f}".format(data[X],data[Y],data[Z]))
-
-'''
-print("Setting mode to idle and changing the gain")
-hmc5883.setMode(HMC5883_MR_IDLE)
-hmc5883.setGain(HMC5883_GAIN_5_6)
-print("Gain set to {:d}".format(hmc5883.getGainInt()))
-
-hmc5883.setMode(HMC5883_MR_CONT)
-data = hmc5883.getMagRaw()
-print("raw: {:8.2f}, {:8.2f}, {:8.2f}".format(data[X],data[Y],data[Z]))
-data = hmc5883.getMag()
-print("{:8.2f}, {:8.2f}, {:8.2f}".format(data[X],data[Y],data[Z]))
-
-'''
-while True:
-    # data = hmc5883.getMagRaw()
-    # print("{:8.2f}, {:8.2f}, {:8.2f}".format(data[0],data[1],data[2]))
-    data = hmc5883.getMag()
-    # degrees,minutes = hmc5883.getHeading()
-    # print("mag_x: {:8.4f} mG, mag_y: {:8.4f} mG,mag_z: {:8.4f} mG, heading: {:d}°, {:d}'".format(
-    #     data[0],data[1],data[2],degrees,minutes))
-    print("{:8.2f}, {:8.2f}, {:8.4f}".format(data[X],data[Y],data[Z]))
-    # data = qmc5883.getMag16Bits()
-    # print("mag_x: 0x{:04x} mG, mag_y: 04{:04x} mG, mag_z: 0x{:04x} mG".format(
-        #     data[0],data[1],data[2]))
-
-    sleep_ms(500)
-
+hmc5883.setGain(HMC5883_GAIN_1_3)  # the calibration is only valid for this gain
+hmc5883.setSmoothing(1)
+
+if MODE == "moments":
+    collector = MagStats()
+else:
+    if HOST is None:
+        out = open("magsamples.bin","wb")
+    else:
+        out = socket.socket()
+        out.connect(socket.getaddrinfo(HOST,PORT)[0][-1])
+    collector = MagStream(out)
+
+print("Turn the sensor in all directions for {:d} s".format(DURATION))
+hmc5883.startContinuous(HMC5883_RATE_30,callback=collector.add)
+for second in range(DURATION):
+    sleep_ms(1000)
+    print("{:d} s".format(second+1))
+hmc5883.stopContinuous()
+
+if MODE == "moments":
+    collector.save("magstats.txt")
+    print("{:d} samples written to magstats.txt".format(collector.getCount()))
+    print("hard iron estimate: {:8.2f}, {:8.2f}, {:8.2f}".format(*collector.hardIron()))
+else:
+    collector.flush()
+    out.close()
+    print("{:d} samples sent".format(collector.count))
@@ -0,0 +1,36 @@
+# hmc5883_continuous.py: Reads the HMC5883 in continuous acquisition mode.
+# Every DRDY interrupt adds a new sample to the moving average, getMag() and
+# getHeading() return immediately and the loop is free to do other work
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+#
+
+from HMC5883 import HMC5883
+from HMC5883_const import *
+from time import sleep_ms
+
+hmc5883 = HMC5883()
+hmc5883.setAvg(HMC5883_AVG_1)
+hmc5883.setGain(HMC5883_GAIN_1_3)
+hmc5883.setMagneticDeclination(GENEVA_MAG_DECLINATION[0],
+                               GENEVA_MAG_DECLINATION[1])
+# hard and soft iron calibration produced by calibration/magfit.py
+try:
+    from magcal_data import MAG_OFFSET,MAG_MATRIX
+    hmc5883.setCalibration(MAG_OFFSET,MAG_MATRIX)
+except ImportError:
+    print("No calibration data found, heading is not corrected")
+# moving average over the last 10 samples at 75 Hz
+hmc5883.setSmoothing(10)
+hmc5883.startContinuous(HMC5883_RATE_75)
+
+try:
+    while True:
+        data = hmc5883.getMag()
+        degrees,minutes = hmc5883.getHeading()
+        print("mag_x: {:10.4f} mG, mag_y: {:10.4f} mG, mag_z: {:10.4f} mG".format(data[X],data[Y],data[Z]),end=", ")
+        print("heading: {:d}° {:d}', samples: {:d}".format(degrees,minutes,hmc5883.getSampleCount()))
+        sleep_ms(100)
+except KeyboardInterrupt:
+    hmc5883.stopContinuous()
@@ -5,6 +5,8 @@
 
 from machine import Pin,I2C
 from QMC5883_const import *
+from struct import unpack_from
+from irqAcquire import ScheduledIrq,MovingAverage
 
 from time import sleep_ms
 from math import atan2,floor,pi
@@ -16,6 +18,14 @@ class QMC5883:
         self.declination = (0,0)
         self.mag_x = self.mag_y = self.mag_z = None
         self.smoothing = 1
+        self.calOffset = None   # hard and soft iron calibration, see setCalibration
+        self.calMatrix = None
+        self.magBuf = bytearray(6)
+        # continuous acquisition driven by the DRDY interrupt
+        self.streaming = False
+        self.callback = None
+        self.irq = None
+        self.movingAverage = None
         
         # Create an I2C object
         # Check if can use the hardware I2C interface, if not, create a software I2C interface
@@ -38,6 +48,7 @@ class QMC5883:
         # soft reset the chip
         self.softReset()
         sleep_ms(50)       # max power on 
+        self.fullRange = 2.0  # range after reset, kept up to date by setRange and setCtrl_1
 
         # write the set/reset period register with 0x02 (see data sheet)
         self.setSetResetPeriod(0x01)
@@ -140,6 +151,7 @@ class QMC5883:
 
     def setCtrl_1(self,value):
         self.writeByte(QMC5883_CTRL_1,value)
+        self.setFullRange()
 
     def getOversampling(self):
         return self.readBits(QMC5883_CTRL_1,QMC5883_OSR_POS,QMC5883_OSR_SIZE)
@@ -155,6 +167,14 @@ class QMC5883:
             print("Illegal range, not set")
             return
         self.writeBits(QMC5883_CTRL_1,QMC5883_RNG_POS,QMC5883_RNG_SIZE,value)
+        self.setFullRange()
+
+    def setFullRange(self):
+        # full range in Gauss used to scale the raw values
+        if self.getRange() == QMC5883_2G:
+            self.fullRange = 2.0
+        else:
+            self.fullRange = 8.0
 
     def getOutputRate(self):
         return self.readBits(QMC5883_CTRL_1,QMC5883_ODR_POS,QMC5883_ODR_SIZE)
@@ -183,7 +203,8 @@ class QMC5883:
         return self.readBit(QMC5883_CTRL_2,QMC5883_INT_ENB)
 
     def setIntEnable(self,value):
-        self.writeBit(QMC5883_CTRL_2,QMC5883_INT_ENB)
+        # careful: the interrupt pin is enabled when INT_ENB is 0
+        self.writeBit(QMC5883_CTRL_2,QMC5883_INT_ENB,value)
 
     def softReset(self):
         self.writeBit(QMC5883_CTRL_2,QMC5883_SOFT_RESET,1)
@@ -192,7 +213,7 @@ class QMC5883:
         return self.readBit(QMC5883_CTRL_2,QMC5883_ROL_PNT)
 
     def setRollOver(self,value):
-        self.writeBit(QMC5883_CTRL_2,QMC5883_ROL_PNT)
+        self.writeBit(QMC5883_CTRL_2,QMC5883_ROL_PNT,value)
         
     # set/reset period register
     def getSetResetPeriod(self):
@@ -202,16 +223,22 @@ class QMC5883:
         self.writeByte(QMC5883_SET_PERIOD,value)
     
     def getMag16Bits(self):
-        data = self.readBytes(QMC5883_DATA_X_LSB,6)
-        mag_x = data[1] << 8 | data[0]
-        mag_y = data[3] << 8 | data[2]
-        mag_z = data[5] << 8 | data[4]
+        self.i2c.readfrom_mem_into(QMC5883_ADDRESS,QMC5883_DATA_X_LSB,self.magBuf)
+        mag_x,mag_y,mag_z = unpack_from('<3H',self.magBuf)
         return (mag_x,mag_y,mag_z)
 
     def getMagRaw(self):
-        magRaw = [0]*3
+        if self.streaming:
+            # continuous acquisition: return the moving average without blocking
+            self.waitSample()
+            return self.movingAverage.average()
+        return self.averageMag()
+
+    def averageMag(self):
+        # acquisition of self.smoothing samples, polls the status register
+        sum_x = sum_y = sum_z = 0
         if self.getDataSkip():
-            data = self.readBytes(QMC5883_DATA_X_LSB,6)
+            self.i2c.readfrom_mem_into(QMC5883_ADDRESS,QMC5883_DATA_X_LSB,self.magBuf)
         # apply smoothing if smoothing value is set
         if self.debug:
             print("Averaging over {:d} measurements".format(self.smoothing))
@@ -223,15 +250,13 @@ class QMC5883:
                 sleep_ms(1)
             if timeout >= 200:
                 raise Exception("Acquisition timeout")
-            tmp = list(self.getMag16Bits())
-            for axis in range(3):
-                if tmp[axis] & 0x8000:
-                    tmp[axis] -= 0x10000
-                magRaw[axis] += tmp[axis]
-        for axis in range(3):
-            magRaw[axis] /= self.smoothing
-            
-        return tuple(magRaw)
+            self.i2c.readfrom_mem_into(QMC5883_ADDRESS,QMC5883_DATA_X_LSB,self.magBuf)
+            mag_x,mag_y,mag_z = unpack_from('<3h',self.magBuf)
+            sum_x += mag_x
+            sum_y += mag_y
+            sum_z += mag_z
+        n = self.smoothing
+        return (sum_x/n,sum_y/n,sum_z/n)
 
     def getMagRaw_x(self):
         return self.getMagRaw()[X]
@@ -243,12 +268,9 @@ class QMC5883:
         return self.getMagRaw()[Z]
         
     def getMag(self):
-        # get the full range
-        if self.getRange() == QMC5883_2G:
-            fullRange = 2.0
-        else:
-            fullRange = 8.0
-        rawData = self.getMagRaw()
+        # the full range is cached, no need to read control register 1
+        fullRange = self.fullRange
+        rawData = self.correct(self.getMagRaw())
         self.mag_x = rawData[X]*fullRange*1000/0x7fff
         self.mag_y = rawData[Y]*fullRange*1000/0x7fff
         self.mag_z = rawData[Z]*fullRange*1000/0x7fff
@@ -257,6 +279,36 @@ class QMC5883:
                 self.mag_x,self.mag_y,self.mag_z))
         return (self.mag_x,self.mag_y,self.mag_z)
     
+    # calibration
+    # offset and matrix are computed by calibration/magfit.py on the host from
+    # samples taken at the current gain. getMag() returns matrix*(raw - offset)
+
+    def setCalibration(self,offset,matrix=(1,0,0,0,1,0,0,0,1)):
+        # offset: (x,y,z) in raw counts, matrix: 3x3 correction matrix by rows
+        if len(offset) != 3 or len(matrix) != 9:
+            raise ValueError("offset needs 3 and matrix 9 values")
+        self.calOffset = tuple(offset)
+        self.calMatrix = tuple(matrix)
+
+    def getCalibration(self):
+        return self.calOffset,self.calMatrix
+
+    def clearCalibration(self):
+        self.calOffset = None
+        self.calMatrix = None
+
+    def correct(self,raw):
+        if self.calMatrix is None:
+            return raw
+        o = self.calOffset
+        m = self.calMatrix
+        dx = raw[X] - o[X]
+        dy = raw[Y] - o[Y]
+        dz = raw[Z] - o[Z]
+        return (m[0]*dx + m[1]*dy + m[2]*dz,
+                m[3]*dx + m[4]*dy + m[5]*dz,
+                m[6]*dx + m[7]*dy + m[8]*dz)
+
     def getMag_x(self):
         return self.getMag()[X]
 
@@ -317,19 +369,84 @@ class QMC5883:
         return int(degrees), int(minutes)
 
     # interrupts
+    # In continuous acquisition mode each DRDY interrupt schedules a burst read
+    # of the data registers into a ring of the last self.smoothing samples and
+    # the running sums over the ring are updated. getMag() and getMagRaw()
+    # then return the moving average immediately instead of blocking for
+    # self.smoothing conversions.
+
+    def startContinuous(self,rate=None,callback=None):
+        # rate: one of the QMC5883_xxHz constants, None keeps the current rate
+        # callback: called with the raw (x,y,z) values of every new sample
+        self.stopContinuous()
+        if rate is not None:
+            self.setOutputRate(rate)
+        self.callback = callback
+        self.resetAverage()
+        self.streaming = True
+        self.enbleDrdyInt()
+        self.setIntEnable(0)
+        self.setMode(QMC5883_MODE_NORMAL)
+        # read the data registers once to clear DRDY, else we never see a rising edge
+        self.i2c.readfrom_mem_into(QMC5883_ADDRESS,QMC5883_DATA_X_LSB,self.magBuf)
+
+    def stopContinuous(self):
+        if not self.streaming:
+            return
+        self.disableDrdyInt()
+        self.setMode(QMC5883_MODE_STDBY)
+        self.streaming = False
+
+    def resetAverage(self):
+        # a single assignment: acquire() adds its sample either to the old
+        # or to the new ring, never to a ring of one size with the index of another
+        self.movingAverage = MovingAverage(self.smoothing)
+
+    def waitSample(self):
+        # wait for the first sample after a start
+        timeout = 0
+        self.poll()
+        while not self.movingAverage.filled and timeout < 200:   # 10 Hz is the slowest rate
+            timeout += 1
+            sleep_ms(1)
+            self.poll()
+        if timeout >= 200:
+            raise Exception("Acquisition timeout")
+
+    def getSampleCount(self):
+        if self.movingAverage is None:
+            return 0
+        return self.movingAverage.samples
+
+    def poll(self):
+        # DRDY stays high until the data are read: after an acquisition lost
+        # because the schedule queue was full it never rises again. Reads the
+        # sample if DRDY is still high, called by the getters while streaming.
+        if self.irq is not None:
+            self.irq.poll()
+
+    def acquire(self,arg=None):
+        # reading the data registers clears DRDY
+        self.i2c.readfrom_mem_into(QMC5883_ADDRESS,QMC5883_DATA_X_LSB,self.magBuf)
+        mag_x,mag_y,mag_z = unpack_from('<3h',self.magBuf)
+        self.movingAverage.add(mag_x,mag_y,mag_z)
+        if self.callback:
+            self.callback(mag_x,mag_y,mag_z)
 
-    def drdyHandler(self,src):
-        data = self.getMagRaw()
-        print("mag_x: {:d}, mag_y: {:d}, mag_z: {:d}".format(data[0],data[1],data[2]))
-        
     def enbleDrdyInt(self):
-        self.drdy.irq(trigger=Pin.IRQ_RISING,handler=drdyHandler)
+        # DRDY is held high until the data registers are read
+        self.irq = ScheduledIrq(self.drdy,self.acquire,Pin.IRQ_RISING,1)
 
     def disableDrdyInt(self):
-        self.drdy.irq(trigger=Pin.IRQ_RISING,handler=None)
+        if self.irq is not None:
+            self.irq.deinit()
+            self.irq = None
 
     def setSmoothing(self,value):
         self.smoothing = value
+        if self.streaming:
+            # the ring is replaced, not resized under a running acquisition
+            self.resetAverage()
 
     def getSmoothing(self):
         return self.smoothing
@@ -1,6 +1,12 @@
-# qmc5883_calib.py: Calibrates the magnetometer
-# When turning the magnetometer around the x,y,z axis the measured values
-# should switch from one axis to the other.
+# qmc5883_calib.py: Collects the data for the hard and soft iron calibration
+# of the magnetometer. Turn the sensor slowly in all directions while the
+# samples are taken.
+# With MODE = "moments" only the sums needed by the ellipsoid fit are kept
+# and written to magstats.txt. With MODE = "stream" the raw samples are sent
+# compressed to HOST, where "magfit.py --listen PORT" receives them, or saved
+# to magsamples.bin if HOST is None. Then run magfit.py on the host and copy
+# the resulting magcal_data.py to the device.
+# magcal.py from the calibration directory must be on the device.
 # Copyright U. Raich, 25.8.2020
 # This program is released under he MIT license
 # It is part of the course on the Internet of Things at
@@ -8,37 +14,43 @@
 
 from QMC5883_const import *
 from QMC5883 import QMC5883
+from magcal import MagStats,MagStream
 from utime import sleep_ms
+import socket
 
-qmc5883 = QMC5883()
+MODE     = "moments"   # or "stream"
+HOST     = None        # IP address of the host running magfit.py --listen
+PORT     = 5001
+DURATION = 60          # seconds
 
-# qmc5883.setRange(QMC5883_8G)
-# qmc5883.setDebug(True)
-qmc5883.setCtrl_1(0x1d)
-# print("ctrl1: 0x{:02x}".format(qmc5883.getCtrl_1()))
-# qmc5883.printRegValues()
-# qmc5883.setDebug(False)
-# qmc5883.setSmoothing(10)
-# Switch to contious mode
-qmc5883.setMode(QMC5883_MODE_NORMAL)
-# print("Mode after setting to continuous: ",QMC5883_MODE[qmc5883.getMode()])
-# print("Control register 1: 0x{:02x}".format(qmc5883.getCtrl_1()))
-# qmc5883.setDebug(True)
+qmc5883 = QMC5883()
+qmc5883.setCtrl_1(0x1d)       # the calibration is only valid for this range
+qmc5883.setSmoothing(1)
 
-# sleep_ms(5000)
-while True:
-    if qmc5883.getDataReady():
-        # data = qmc5883.getMagRaw()
-        # temp = qmc5883.getTempRaw()
-        # print("{:8.2f}, {:8.2f}, {:8.2f}".format(data[0],data[1],data[2]))
-        data = qmc5883.getMag()
-        # degrees,minutes = qmc5883.getHeading()
-        # print("mag_x: {:8.4f} mG, mag_y: {:8.4f} mG,mag_z: {:8.4f} mG, heading: {:d}°, {:d}'".format(
-        #     data[0],data[1],data[2],degrees,minutes))
-        print("{:8.2f}, {:8.2f}, {:8.4f}".format(data[X],data[Y],data[Z]))
-        # data = qmc5883.getMag16Bits()
-        # print("mag_x: 0x{:04x} mG, mag_y: 04{:04x} mG, mag_z: 0x{:04x} mG".format(
-        #     data[0],data[1],data[2]))
+if MODE == "moments":
+    collector = MagStats()
+else:
+    if HOST is None:
+        out = open("magsamples.bin","wb")
+    else:
+        out = socket.socket()
+        out.connect(socket.getaddrinfo(HOST,PORT)[0][-1])
+    collector = MagStream(out)
 
-        sleep_ms(500)
+print("Turn the sensor in all directions for {:d} s".format(DURATION))
+qmc5883.startContinuous(QMC5883_50Hz,callback=collector.add)
+for second in range(DURATION):
+    for _ in range(10):
+        sleep_ms(100)
+        qmc5883.poll()          # recovers from a sample lost by the interrupt
+    print("{:d} s".format(second+1))
+qmc5883.stopContinuous()
 
+if MODE == "moments":
+    collector.save("magstats.txt")
+    print("{:d} samples written to magstats.txt".format(collector.getCount()))
+    print("hard iron estimate: {:8.2f}, {:8.2f}, {:8.2f}".format(*collector.hardIron()))
+else:
+    collector.flush()
+    out.close()
+    print("{:d} samples sent".format(collector.count))
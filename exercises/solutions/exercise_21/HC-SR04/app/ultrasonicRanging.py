@@ -10,5 +10,8 @@ from hc_sr04 import HC_SR04
 hc_sr04 = HC_SR04()
 while True:
     echo_time = hc_sr04.measure()
+    if echo_time is None:
+        print("No echo")
+        continue
     distance = hc_sr04.distance(echo_time)
     print("Distance: {:f} [cm]".format(distance))
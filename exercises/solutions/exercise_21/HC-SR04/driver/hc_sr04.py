@@ -16,11 +16,27 @@ from micropython import const
 TRIG = const(21)
 ECHO = const(22)
 SPEED_IN_AIR = const(330)       # speed of sound in air: 330 m/s
+ECHO_TIMEOUT = const(30000)     # us, the echo of a target at ~5 m
+
+# speed of sound in m/s at temperature in °C
+def speed_of_sound(temperature):
+    return 331.3 + 0.606 * temperature
 
 class HC_SR04(object):
     def __init__(self,trig=TRIG,echo=ECHO):
         self.trig = Pin(trig,Pin.OUT)
         self.echo = Pin(echo,Pin.IN,Pin.PULL_UP)
+        self.speed = SPEED_IN_AIR
+        # echo edges time stamped by the interrupt handler
+        self._rise = 0
+        self._fall = 0
+        self._pinging = False
+        self._edge_ref = self._edge
+
+    # the speed of sound depends on the air temperature
+    
+    def set_temperature(self,temperature):
+        self.speed = speed_of_sound(temperature)
 
     # trigger a measurement
     
@@ -31,12 +47,18 @@ class HC_SR04(object):
 
     # read the length of the echo signal
     
-    def get_echo(self):
+    # returns None if there is no echo within timeout us
+    
+    def get_echo(self,timeout=ECHO_TIMEOUT):
+        start = ticks_us()
         while (self.echo.value() == 0):
-            pass                # wait until the echo signal goes high
+            # wait until the echo signal goes high
+            if ticks_diff(ticks_us(),start) > timeout:
+                return None
         start = ticks_us()
         while (self.echo.value() == 1):
-            pass
+            if ticks_diff(ticks_us(),start) > timeout:
+                return None
         stop = ticks_us()
         signal_length = ticks_diff(stop,start)
         # print("signal length [us]: ",signal_length)
@@ -45,11 +67,50 @@ class HC_SR04(object):
     # from the time it takes the echo to come back, calculate the distance
     
     def distance(self,echo_time):
-        dist = (SPEED_IN_AIR*100/2)*echo_time/1000000  # cm
+        dist = (self.speed*100/2)*echo_time/1000000  # cm
         # print("Distance: ", dist," cm")
         return dist
         
-    def measure(self):
+    def measure(self,timeout=ECHO_TIMEOUT):
         self.trigger()
-        return self.get_echo()
+        return self.get_echo(timeout)
+
+    # non blocking measurement: the edges of the echo signal are time
+    # stamped in an interrupt handler, poll echo_time() for the result
+    
+    def _edge(self,pin):
+        if pin.value():
+            self._rise = ticks_us()
+        else:
+            self._fall = ticks_us()
+            self._pinging = False
+
+    def start_ping(self):
+        self._rise = 0
+        self._fall = 0
+        self._pinging = True
+        self._ping_start = ticks_us()
+        self.echo.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING,
+                      handler=self._edge_ref,hard=True)
+        self.trigger()
+
+    def ping_done(self):
+        return not self._pinging
+
+    # the echo time in us, None while waiting or if there was no echo
+    
+    def echo_time(self,timeout=ECHO_TIMEOUT):
+        if self._pinging:
+            if ticks_diff(ticks_us(),self._ping_start) <= timeout:
+                return None
+            self.stop_ping()       # timeout: no echo
+            return None
+        self.stop_ping()
+        if not self._rise or not self._fall:
+            return None
+        return ticks_diff(self._fall,self._rise)
+
+    def stop_ping(self):
+        self.echo.irq(handler=None)
+        self._pinging = False
     
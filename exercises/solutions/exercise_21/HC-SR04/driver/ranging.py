@@ -0,0 +1,129 @@
+# ranging.py: a ranging service for one or several HC-SR04 distance meters
+# The sensors are pinged one after the other by a uasyncio task. The echo
+# edges are time stamped by an interrupt handler, a missing echo ends the
+# ping after a timeout, and a gap between the pings lets the echoes of the
+# previous ping die out before the next sensor listens (crosstalk).
+# The last echo times of each sensor are kept in a small ring. The distance
+# is calculated from their median, which rejects single outliers, with the
+# speed of sound at the current air temperature. The temperature can be
+# set or taken from a SHT3XPeriodic object measuring it.
+# The task handling is inherited from AsyncSensor (asyncSensor.py), a result
+# is published after each round over all sensors: the list of distances.
+# Copyright (c) U. Raich
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+# It is released under the MIT license
+
+import uasyncio as asyncio
+from array import array
+from utime import ticks_ms, ticks_diff
+from hc_sr04 import HC_SR04, ECHO_TIMEOUT, speed_of_sound
+from asyncSensor import AsyncSensor
+
+MIN_ECHO = 116          # us, ~2 cm, the minimum range of the HC-SR04
+MAX_ECHO = 23500        # us, ~4 m, the maximum range of the HC-SR04
+
+class Ranging(AsyncSensor):
+    def __init__(self, sensors, gap=25, timeout=ECHO_TIMEOUT, size=5, sht3x=None):
+        """
+        sensors: a list of HC_SR04 objects
+        gap: time in ms between the end of a ping and the next one
+        timeout: maximum echo time in us
+        size: number of echo times per sensor used for the median
+        sht3x: optional SHT3XPeriodic object delivering the temperature
+        """
+        super().__init__()
+        self.sensors = sensors
+        self.gap = gap
+        self.timeout = timeout
+        self.size = size
+        self.sht3x = sht3x
+        self.speed = sensors[0].speed
+        self.echoes = [array('l', [0] * size) for _ in sensors]
+        self.valid = [0] * len(sensors)         # echo times in the ring
+        self.index = [0] * len(sensors)
+        self.misses = [0] * len(sensors)        # pings without a valid echo
+        self._missed = [0] * len(sensors)       # consecutive misses
+        self._sorted = array('l', [0] * size)
+        self.ticks = [0] * len(sensors)         # time of the last valid echo
+
+    def set_temperature(self, temperature):
+        self.speed = speed_of_sound(temperature)
+        for sensor in self.sensors:
+            sensor.speed = self.speed
+
+    def _end(self):
+        # a ping cancelled in flight leaves its echo interrupt enabled
+        for sensor in self.sensors:
+            sensor.stop_ping()
+
+    async def _ping(self, i):
+        sensor = self.sensors[i]
+        sensor.start_ping()
+        # the echo takes up to timeout us, poll for its end
+        start = ticks_ms()
+        timeout = self.timeout // 1000 + 1
+        while not sensor.ping_done():
+            if ticks_diff(ticks_ms(), start) > timeout:
+                break
+            await asyncio.sleep_ms(2)
+        echo = sensor.echo_time(self.timeout)
+        if echo is None or echo < MIN_ECHO or echo > MAX_ECHO:
+            self.misses[i] += 1
+            self._missed[i] += 1
+            if self._missed[i] >= self.size:
+                # the target is gone, forget the old echoes
+                self.valid[i] = 0
+                self.index[i] = 0
+            return
+        self._missed[i] = 0
+        ring = self.echoes[i]
+        ring[self.index[i]] = echo
+        self.index[i] = (self.index[i] + 1) % self.size
+        if self.valid[i] < self.size:
+            self.valid[i] += 1
+        self.ticks[i] = ticks_ms()
+
+    async def _run(self):
+        while True:
+            if self.sht3x:
+                record = self.sht3x.latest()
+                if record:
+                    self.set_temperature(record[1])
+            for i in range(len(self.sensors)):
+                await self._ping(i)
+                await asyncio.sleep_ms(self.gap)
+            self._publish()
+
+    def echo_time(self, i=0):
+        """
+        median of the last echo times of sensor i in us, None without echo
+        """
+        n = self.valid[i]
+        if not n:
+            return None
+        ring = self.echoes[i]
+        values = self._sorted
+        # insertion sort of the few valid values
+        for k in range(n):
+            v = ring[k]
+            j = k
+            while j > 0 and values[j - 1] > v:
+                values[j] = values[j - 1]
+                j -= 1
+            values[j] = v
+        if n & 1:
+            return values[n // 2]
+        return (values[n // 2 - 1] + values[n // 2]) // 2
+
+    def distance(self, i=0):
+        """
+        distance of the target in front of sensor i in cm, None if unknown
+        """
+        echo = self.echo_time(i)
+        if echo is None:
+            return None
+        return (self.speed * 100 / 2) * echo / 1000000
+
+    def _current(self):
+        # distances of all sensors in cm, None for a sensor without echo
+        return [self.distance(i) for i in range(len(self.sensors))]
@@ -1,18 +1,21 @@
 # vw_client.py: Connects to the virtual world server (vw_server.py) on the PC
 # Periodically sends data of color and distance information
+# The distance is measured by the ranging service in the background and the
+# colour with gated frequency counting, such that neither blocks the other
 # copyright U. Raich 31.5.2022
 # This program is released under the MIT license
 
 import sys
 import usocket as socket
-from utime import sleep_ms
+import uasyncio as asyncio
 from tcs3200 import TCS3200
 from hc_sr04 import HC_SR04
+from ranging import Ranging
 from wifi_connect import *
 
 SERVER_IP = '192.168.0.13'     # please check this with ifconfig on the PC
 
-def client_program(host_ip):
+async def client_program(host_ip):
     port = 5000  # socket server port number
 
     client_socket = socket.socket()  # instantiate
@@ -26,24 +29,28 @@ def client_program(host_ip):
     data = client_socket.recv(1024).decode()  # receive response
     print(data)
 
-    while True:
-        try:
+    ranging.start()
+    rgb = [0]*4
+    try:
+        while True:
             # get the distance to the HC_SR04 sensor
-            echo_time = hc_sr04.measure()
-            distance = hc_sr04.distance(echo_time)
-            message = "distance: {:6.2f}".format(distance)
-            client_socket.send((message + '\r\n').encode())  # send message
-            if distance < 4:       # to get the correct color, the paper must be close
-                rgb = tcs3200.rgb  # read the color of the paper
-                message = "color: {:02d}, {:02d}, {:02d}".format(
-                    rgb[0],rgb[1],rgb[2])
+            distance = ranging.distance()
+            if distance is not None:
+                message = "distance: {:6.2f}".format(distance)
                 client_socket.send((message + '\r\n').encode())  # send message
+                if distance < 4:       # to get the correct color, the paper must be close
+                    await tcs3200.read_rgb(rgb)  # read the color of the paper
+                    message = "color: {:02d}, {:02d}, {:02d}".format(
+                        rgb[0],rgb[1],rgb[2])
+                    client_socket.send((message + '\r\n').encode())  # send message
             
-            sleep_ms(50)
+            await asyncio.sleep_ms(50)
             
-        except KeyboardInterrupt:
-            client_socket.close()  # close the connection
-            return
+    except KeyboardInterrupt:
+        client_socket.close()  # close the connection
+        return
+    finally:
+        ranging.stop()
             
 # connect to WiFi
 connect()
@@ -66,6 +73,7 @@ print("Calibration frequencies for black: ",black_freq)
 white_freq = tcs3200.calib(tcs3200.WHITE)
 print("Calibration frequencies for white: ",white_freq)
 
-# initialze the HC-SR04 ultrasonic distance meter
+# initialze the HC-SR04 ultrasonic distance meter and the ranging service
 hc_sr04 = HC_SR04()
-client_program(SERVER_IP)
+ranging = Ranging([hc_sr04])
+asyncio.run(client_program(SERVER_IP))
@@ -0,0 +1,34 @@
+# rgb_async.py: measures coloured targets with gated frequency counting
+# Black and white are calibrated first, then the calibrated rgb values
+# and the intensity are printed continuously
+#
+# Copyright (c) U. Raich
+# Written for the course on the Internet of Things at the
+# University of Cape Coast, Ghana
+# The program is released under the MIT licence
+
+import uasyncio as asyncio
+from tcs3200 import TCS3200
+
+tcs3200 = TCS3200(OUT=19, S2=5, S3=18, S0=17, S1=16, LED=23)
+tcs3200.led = tcs3200.ON
+tcs3200.freq_divider = tcs3200.TWENTY_PERCENT
+tcs3200.gate_time = 10      # 4 filters: a reading takes ~40 ms
+
+async def main():
+    print("Calibrating black object, press enter to start",end='')
+    tcs3200.wait_for_return()
+    black = await tcs3200.read_freqs()
+    print("Calibrating white object, press enter to start",end='')
+    tcs3200.wait_for_return()
+    white = await tcs3200.read_freqs()
+    tcs3200.set_calib(black,white)
+    print("Calibration frequencies for black: ",black)
+    print("Calibration frequencies for white: ",white)
+    argb = [0]*4
+    while True:
+        await tcs3200.read_rgb(argb)
+        print("red: {:3d} green: {:3d} blue: {:3d} intensity: {:3d}".format(
+            argb[0],argb[1],argb[2],argb[3]))
+
+asyncio.run(main())
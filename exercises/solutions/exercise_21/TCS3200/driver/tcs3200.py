@@ -7,6 +7,12 @@
 
 from machine import Pin,Timer
 import utime as time
+import uasyncio as asyncio
+try:
+    # the pulse counter unit of the ESP32
+    from machine import Counter
+except ImportError:
+    Counter = None
 
 class TCS3200(object):
     """
@@ -31,6 +37,11 @@ class TCS3200(object):
     To take a reading the colour filters are selected in turn for a
     fraction of a second and the frequency is read and converted to
     Hz.
+
+    In gated mode (read_freqs, read_rgb) the edges of OUT are counted
+    during a fixed gate time, by the pulse counter hardware if
+    machine.Counter is available, else by a minimal interrupt handler.
+    The four filters are measured by an asyncio coroutine.
     
     Default connections:
     TCS3200 WeMos GPIO
@@ -109,6 +120,13 @@ class TCS3200(object):
         self._freq_black = [None]*4
         self._freq_white = [None]*4
         self._max_comp=255
+        # normalization precomputed from the calibration
+        self._offset = [0.0]*4
+        self._scale = [0.0]*4
+        # gated frequency measurement
+        self._gate_time = 20  # gate time in ms
+        self._counter = None
+        self._edges = 0
         
     @property
     def debugging(self) :
@@ -260,6 +278,20 @@ class TCS3200(object):
         print("Calibrating white object, press enter to start",end='')
         self.wait_for_return()
         self._freq_white = self.meas_freqs
+        self._update_calib()
+
+    def set_calib(self,freq_black,freq_white):
+        # set the calibration frequencies, e.g. measured with read_freqs
+        self._freq_black = list(freq_black)
+        self._freq_white = list(freq_white)
+        self._update_calib()
+
+    def _update_calib(self):
+        if self._freq_black[0] is None or self._freq_white[0] is None:
+            return
+        for i in range(4):
+            self._offset[i] = self._freq_black[i]
+            self._scale[i] = self._max_comp / (self._freq_white[i] - self._freq_black[i])
         
     def wait_for_return(self):
         dummy = input()
@@ -290,6 +322,7 @@ class TCS3200(object):
     # sets the maximum value for a color component
     def max_comp(self,value):
         self._max_comp = value
+        self._update_calib()
         
     @property
     # Measure the rgb values as well as the intensity value (no filter)
@@ -304,7 +337,7 @@ class TCS3200(object):
                 freqs[0],freqs[1],freqs[2],freqs[3]))
         argb = [None]*4
         for i in range(4):
-            argb[i]=int(self._max_comp*self.calc_rgb_comp(i,freqs[i]))
+            argb[i]=int((freqs[i] - self._offset[i]) * self._scale[i])
             if argb[i] < 0:
                 argb[i] = 0
         if self._debug:
@@ -330,6 +363,88 @@ class TCS3200(object):
         # raise the timeour exception
         raise Exception("Measurement Timeout!")
     
+    @property
+    def gate_time(self):
+        return self._gate_time
+
+    @gate_time.setter
+    def gate_time(self,gate_ms):
+        if gate_ms < 1:
+            print("The gate time must be at least 1 ms")
+            return
+        self._gate_time = gate_ms
+
+    # gated frequency measurement: the edges of OUT are counted during the gate time
+    def _count(self,src):
+        self._edges += 1
+
+    def gate_open(self):
+        """
+        start counting the edges of OUT
+        """
+        if Counter:
+            if not self._counter:
+                self._counter = Counter(0, self._OUT, edge=Counter.RISING)
+            self._counter.value(0)
+        else:
+            self._edges = 0
+            self._OUT.irq(trigger=Pin.IRQ_RISING,handler=self._count)
+        self._gate_start = time.ticks_us()
+
+    def gate_read(self):
+        """
+        the frequency in Hz from the edges counted since gate_open, counting continues
+        """
+        if Counter:
+            edges = self._counter.value()
+        else:
+            edges = self._edges
+        duration = time.ticks_diff(time.ticks_us(),self._gate_start)
+        return 1000000 * edges / duration
+
+    def gate_close(self):
+        if Counter:
+            if self._counter:
+                self._counter.deinit()
+                self._counter = None
+        else:
+            self._OUT.irq(trigger=Pin.IRQ_RISING,handler=None)
+
+    async def read_freqs(self,freqs=None):
+        """
+        measure the frequencies for the 3 rgb colour components and for the
+        clear filter, each during the gate time
+        """
+        if freqs is None:
+            freqs = [0.0]*4
+        filter_settings = (self.RED,self.GREEN,self.BLUE,self.CLEAR)
+        for i in range(self.CLEAR_COMP+1):
+            self.filter = filter_settings[i]
+            self.gate_open()
+            await asyncio.sleep_ms(self._gate_time)
+            freqs[i] = self.gate_read()
+        if not Counter:
+            # the pulse counter keeps running without load on the CPU
+            self.gate_close()
+        if self._debug:
+            print("Measured Frequencies: red: {:f}, green: {:f}, blue: {:f}, intensity: {:f}".format(
+                freqs[0],freqs[1],freqs[2],freqs[3]))
+        return freqs
+
+    async def read_rgb(self,argb=None):
+        """
+        calibrated rgb values and intensity, limited to 0..max_comp
+        """
+        if self._freq_black[0] is None or self._freq_white[0] is None:
+            raise Exception("Missing calibration. Please calibrate the device before attempting to measure colored targets")
+        if argb is None:
+            argb = [0]*4
+        freqs = await self.read_freqs()
+        for i in range(4):
+            value = int((freqs[i] - self._offset[i]) * self._scale[i])
+            argb[i] = min(max(value,0),self._max_comp)
+        return argb
+
     # callback to stop data taking 
     def setStopFlag(self,t):
         self.stopFlag=True
@@ -0,0 +1,44 @@
+#
+# Capture the edge time stamps of many DHT11 transmissions with the
+# dht11Capture function of the dht11Raw module
+# Each transmission is written as a line of time stamps in us to
+# /data/dht11Edges.txt, to be analysed with dht11Decode.py on the PC
+#
+# Copyright (c) U. Raich
+#
+import array
+import dht11Raw
+from machine import Pin
+from time import sleep_ms
+import uerrno as errno
+import uos
+
+NO_OF_TRACES = 100
+MAX_EDGES = 100
+
+edges = array.array("H",[0]*MAX_EDGES)
+
+# check if the data directory exists, if not, create it
+try:
+    uos.stat("/data")
+except OSError as e:
+    if len(e.args) > 0 and e.args[0] == errno.ENOENT:
+        print("/data does not exist, creating it")
+        uos.mkdir("/data")
+
+f = open("/data/dht11Edges.txt","a")
+pin = Pin(16)
+
+for trace in range(NO_OF_TRACES):
+    try:
+        n = dht11Raw.dht11Capture(pin,edges)
+    except OSError:
+        print("trace {:d}: no response from the DHT11".format(trace))
+        n = 0
+    if n:
+        f.write(" ".join([str(edges[i]) for i in range(n)]))
+        f.write("\n")
+        print("trace {:d}: {:d} edges".format(trace,n))
+    # the DHT11 must not be read more than once per second
+    sleep_ms(1100)
+f.close()
@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+# Decode DHT11 transmissions captured as edge time stamps by dht11Capture.py
+# All traces are decoded together with numpy array operations: the pulse
+# widths, bits, bytes, checksums and the timing margins of the protocol
+# are calculated for the whole batch at once.
+# usage: dht11Decode.py [-t threshold] [--plot] [dht11Edges.txt ...]
+# Copyright (c) U. Raich
+# This program was written for the course on embedded systems at the
+# University of Cape Coast, Ghana
+# It is released under GPL
+#
+
+import sys
+import argparse
+import numpy as np
+
+EDGES = 84              # edges of a complete transmission
+THRESHOLD = 48          # high pulses longer than this (in us) are 1 bits
+
+def loadTraces(filenames):
+    """
+    the traces as an array of time stamps, one row per trace, padded with -1
+    """
+    rows = []
+    for filename in filenames:
+        with open(filename) as f:
+            for line in f:
+                if line.strip():
+                    rows.append(np.array(line.split(),dtype=np.int32))
+    traces = np.full((len(rows),max(EDGES,max(len(r) for r in rows))),-1,dtype=np.int32)
+    for i,row in enumerate(rows):
+        traces[i,:len(row)] = row
+    return traces
+
+def decode(traces,threshold=THRESHOLD):
+    """
+    decode all traces, returns a dictionary of per trace arrays
+    """
+    count = (traces >= 0).sum(axis=1)
+    complete = count >= EDGES
+    t = traces[:,:EDGES].astype(np.int32)
+    # response: low and high pulse of 80 us each
+    responseLow  = t[:,1] - t[:,0]
+    responseHigh = t[:,2] - t[:,1]
+    # each bit: a low pulse of 50 us followed by a high pulse of 26-28 us (0) or 70 us (1)
+    low  = t[:,3:EDGES-1:2] - t[:,2:EDGES-2:2]
+    high = t[:,4:EDGES:2] - t[:,3:EDGES-1:2]
+    bits = (high > threshold).astype(np.uint8)
+    data = np.packbits(bits,axis=1)                    # 5 bytes per trace
+    checksumOk = (data[:,:4].sum(axis=1,dtype=np.uint32) & 0xff) == data[:,4]
+    valid = complete & checksumOk
+    # distance of the bits to the decision threshold
+    zeroMax = np.where(bits == 0,high,np.iinfo(np.int32).min).max(axis=1)
+    oneMin  = np.where(bits == 1,high,np.iinfo(np.int32).max).min(axis=1)
+    return {
+        "edges": count,
+        "complete": complete,
+        "checksumOk": checksumOk,
+        "valid": valid,
+        "data": data,
+        "humidity": data[:,0] + 0.1*data[:,1],
+        "temperature": data[:,2] + 0.1*data[:,3],
+        "responseLow": responseLow,
+        "responseHigh": responseHigh,
+        "low": low,
+        "high": high,
+        "zeroMargin": threshold - zeroMax,
+        "oneMargin": oneMin - threshold,
+    }
+
+def summary(name,values,unit="us"):
+    if len(values) == 0:
+        return
+    print("{:<22s} min {:6.1f} mean {:6.1f} max {:6.1f} std {:5.1f} {:s}".format(
+        name,values.min(),values.mean(),values.max(),values.std(),unit))
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode captured DHT11 transmissions")
+    parser.add_argument("files",nargs="*",default=["dht11Edges.txt"],
+                        help="files with the edge time stamps")
+    parser.add_argument("-t","--threshold",type=int,default=THRESHOLD,
+                        help="high pulse length in us separating 0 and 1 bits")
+    parser.add_argument("--plot",action="store_true",
+                        help="histogram of the high pulse lengths")
+    args = parser.parse_args()
+
+    try:
+        traces = loadTraces(args.files)
+    except OSError as e:
+        print("Could not read the traces: ",e)
+        sys.exit(-1)
+    result = decode(traces,args.threshold)
+
+    n = len(traces)
+    complete = result["complete"]
+    valid = result["valid"]
+    print("traces: {:d}, incomplete: {:d}, checksum errors: {:d}".format(
+        n,n - complete.sum(),(complete & ~result["checksumOk"]).sum()))
+    if not valid.any():
+        print("No valid transmission found")
+        sys.exit(-1)
+    summary("temperature",result["temperature"][valid],"°C")
+    summary("humidity",result["humidity"][valid],"%")
+    summary("response low",result["responseLow"][valid])
+    summary("response high",result["responseHigh"][valid])
+    summary("bit low",result["low"][valid].ravel())
+    high = result["high"][valid]
+    bits = high > args.threshold
+    summary("0 bit high",high[~bits])
+    summary("1 bit high",high[bits])
+    summary("margin of 0 bits",result["zeroMargin"][valid])
+    summary("margin of 1 bits",result["oneMargin"][valid])
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        ax.hist(high.ravel(),bins=np.arange(0,100,2))
+        ax.axvline(args.threshold,color='r')
+        ax.set(xlabel='high pulse length [us]', ylabel='bits',
+               title='DHT11 bit timing')
+        plt.show()
+
+if __name__ == "__main__":
+    main()
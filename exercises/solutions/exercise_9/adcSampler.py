@@ -0,0 +1,125 @@
+# adcSampler.py: calibrated sampling of the ESP32 ADC
+# A hardware timer reads the ADC at a fixed rate. With oversampling each
+# tick takes N readings and stores their average. The readings are
+# linearized with a lookup table (written by fitLut.py) holding the voltage
+# in mV for each of the 4096 ADC values, which replaces the evaluation of
+# the calibration polynomial by an array index.
+# The samples are kept in a ring buffer of millivolts, read out in batches.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+from machine import Pin, ADC, Timer
+from array import array
+
+ADC_VALUES = 4096
+
+def loadLut(filename="adcLut.bin"):
+    # the table is stored as 4096 little endian unsigned shorts
+    lut = array('H', [0] * ADC_VALUES)
+    with open(filename, "rb") as f:
+        if f.readinto(lut) != 2 * ADC_VALUES:
+            raise ValueError("{:s} is not an ADC lookup table".format(filename))
+    return lut
+
+def linearLut(fullScale=3300):
+    # uncalibrated table, for tests without calibration
+    return array('H', [i * fullScale // (ADC_VALUES - 1) for i in range(ADC_VALUES)])
+
+class ADCSampler:
+    def __init__(self, pin=36, lut=None, size=1024, timer=0):
+        """
+        pin: the ADC pin, read with 11 dB attenuation (0..3.3 V)
+        lut: the lookup table or the name of its file
+        size: number of samples kept in the ring
+        timer: the hardware timer used for sampling
+        """
+        self.adc = ADC(Pin(pin), atten=ADC.ATTN_11DB)
+        if lut is None:
+            lut = "adcLut.bin"
+        if isinstance(lut, str):
+            lut = loadLut(lut)
+        self.lut = lut
+        self.ring = array('H', [0] * size)
+        self._view = memoryview(self.ring)
+        self.timer = Timer(timer)
+        self.running = False
+        self.rate = 0
+        self.oversampling = 1
+        self.count = 0          # samples written to the ring
+        self.tail = 0           # next sample to be read
+        self.lost = 0           # samples overwritten before being read
+        self._sample = self._sample1
+
+    def readMv(self, samples=1):
+        """ single measurement in mV, averaged over samples readings """
+        read = self.adc.read
+        lut = self.lut
+        sum = 0
+        for _ in range(samples):
+            sum += lut[read()]
+        return sum // samples
+
+    def _sample1(self, timer):
+        ring = self.ring
+        ring[self.count % len(ring)] = self.lut[self.adc.read()]
+        self.count += 1
+
+    def _sampleN(self, timer):
+        read = self.adc.read
+        lut = self.lut
+        n = self.oversampling
+        sum = 0
+        for _ in range(n):
+            sum += lut[read()]
+        ring = self.ring
+        ring[self.count % len(ring)] = sum // n
+        self.count += 1
+
+    def start(self, rate=1000, oversampling=1):
+        """
+        sample at rate Hz, each sample the average of oversampling readings
+        """
+        if oversampling < 1:
+            raise ValueError("oversampling must be at least 1")
+        self.stop()
+        self.rate = rate
+        self.oversampling = oversampling
+        self.count = 0
+        self.tail = 0
+        self.lost = 0
+        self._sample = self._sample1 if oversampling == 1 else self._sampleN
+        self.timer.init(freq=rate, mode=Timer.PERIODIC, callback=self._sample)
+        self.running = True
+
+    def stop(self):
+        if self.running:
+            self.timer.deinit()
+            self.running = False
+
+    def available(self):
+        """ number of unread samples in the ring """
+        return min(self.count - self.tail, len(self.ring))
+
+    def read(self, out):
+        """
+        copy the oldest unread samples in mV into out, an array('H')
+        returns the number of samples copied
+        """
+        count = self.count
+        view = self._view
+        size = len(view)
+        tail = self.tail
+        if count - tail > size:
+            # the ring was overrun, continue with the oldest sample
+            self.lost += count - size - tail
+            tail = count - size
+        n = min(count - tail, len(out))
+        start = tail % size
+        first = min(n, size - start)
+        dest = memoryview(out)
+        dest[:first] = view[start:start + first]
+        if first < n:
+            dest[first:n] = view[:n - first]
+        self.tail = tail + n
+        return n
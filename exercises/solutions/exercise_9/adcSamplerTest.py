@@ -0,0 +1,38 @@
+# samples the slider on pin 36 at 2 kHz with 4 times oversampling and
+# prints the mean, minimum and maximum voltage of each second
+# The ADC calibration table adcLut.bin, written by fitLut.py, must be
+# on the flash
+# Copyright U. Raich
+# The program is part of the IoT course at the University of Cape Coast, Ghana
+
+from adcSampler import ADCSampler
+from array import array
+from time import sleep_ms
+
+sampler = ADCSampler(36, size=4096)
+buf = array('H', [0] * 512)
+sampler.start(rate=2000, oversampling=4)
+try:
+    while True:
+        sleep_ms(1000)
+        samples = 0
+        sum = 0
+        low = 0xffff
+        high = 0
+        while True:
+            n = sampler.read(buf)
+            if not n:
+                break
+            for i in range(n):
+                v = buf[i]
+                sum += v
+                if v < low:
+                    low = v
+                if v > high:
+                    high = v
+            samples += n
+        if samples:
+            print("{:d} samples: mean {:d} mV, min {:d} mV, max {:d} mV, lost {:d}".format(
+                samples, sum // samples, low, high, sampler.lost))
+finally:
+    sampler.stop()
@@ -0,0 +1,50 @@
+# Streams the 4 single ended channels of the ADS1115 with the
+# ALERT/RDY pin connected to GPIO 4 and prints their averages
+# every second
+from machine import I2C, Pin
+from ads1x15 import ADS1115
+from array import array
+import sys,time
+
+if sys.platform == "esp8266":
+#    print("Running on ESP8266")
+    pinScl      =  5  #ESP8266 GPIO5 (D1
+    pinSda      =  4  #ESP8266 GPIO4 (D2)
+    pinRdy      = 14  #ESP8266 GPIO14 (D5)
+else:
+#    print("Running on ESP32") 
+    pinScl      =  22  # SCL on esp32 
+    pinSda      =  21  # SDA ON ESP32
+    pinRdy      =   4
+
+CHANNELS = 4
+i2c = I2C(1,scl=Pin(pinScl), sda=Pin(pinSda), freq=400000)
+ads1115 = ADS1115(i2c)
+volts = array('f', [0.0] * 256 * CHANNELS)
+sums = [0.0] * CHANNELS
+
+ads1115.stream_start(Pin(pinRdy, Pin.IN, Pin.PULL_UP), size=1024,
+                     rate=7, channels=(0, 1, 2, 3))
+try:
+    while True:
+        time.sleep(1)
+        for i in range(CHANNELS):
+            sums[i] = 0.0
+        samples = 0
+        while True:
+            n = ads1115.stream_read(volts)
+            if not n:
+                break
+            for i in range(n):
+                sums[i % CHANNELS] += volts[i]
+            samples += n
+        if not samples:
+            continue
+        scans = samples // CHANNELS
+        print("{:d} scans/s".format(scans), end="")
+        for i in range(CHANNELS):
+            print(" AIN{:d}: {:.4f} V".format(i, sums[i] / scans), end="")
+        print(" missed: {:d} lost: {:d}".format(ads1115.stream_missed,
+                                               ads1115.stream_lost))
+finally:
+    ads1115.stream_stop()
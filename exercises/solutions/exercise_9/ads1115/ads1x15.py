@@ -22,6 +22,9 @@
 # THE SOFTWARE.
 #
 import utime as time
+import micropython
+from array import array
+from machine import Pin
 
 _REGISTER_MASK = const(0x03)
 _REGISTER_CONVERT = const(0x00)
@@ -125,6 +128,9 @@ _RATES = (
     _DR_860SPS    # - /860 samples per Second
 )
 
+# ADS1115 samples per second for the _RATES codes, the ADS1015 is faster
+_RATE_SPS = (8, 16, 32, 64, 128, 250, 475, 860)
+
 
 class ADS1115:
     def __init__(self, i2c, address=0x48, gain=1):
@@ -132,6 +138,7 @@ class ADS1115:
         self.address = address
         self.gain = gain
         self.temp2 = bytearray(2)
+        self._stream_pin = None
 
     def _write_register(self, register, value):
         self.temp2[0] = value >> 8
@@ -197,6 +204,128 @@ class ADS1115:
         res = self._read_register(_REGISTER_CONVERT)
         return res if res < 32768 else res - 65536
 
+    def stream_start(self, pin, size=1024, rate=7, channels=(0,), callback=None):
+        """Stream conversions into a ring buffer, driven by the ALERT/RDY pin.
+           pin: the machine.Pin connected to ALERT/RDY
+           channels: channel numbers or (channel1, channel2) pairs.
+           A single channel is converted in continuous mode, several
+           channels are scanned round robin with single-shot conversions:
+           each RDY edge starts the next channel and reads the finished one.
+           The samples of a scan are stored interleaved in channel order.
+           callback(ads) is called after each complete scan."""
+        self.stream_stop()
+        nch = len(channels)
+        configs = []
+        for channel in channels:
+            if not isinstance(channel, tuple):
+                channel = (channel, None)
+            config = (_CQUE_1CONV | _CLAT_NONLAT | _CPOL_ACTVLOW |
+                      _CMODE_TRAD | _RATES[rate] | _GAINS[self.gain] |
+                      _CHANNELS[channel])
+            if nch > 1:
+                config |= _MODE_SINGLE | _OS_SINGLE
+            else:
+                config |= _MODE_CONTIN
+            configs.append(bytearray((config >> 8, config & 0xff)))
+        self._stream_configs = configs
+        self._stream_channels = nch
+        size = (size + nch - 1) // nch * nch
+        self._stream_ring = array('h', [0] * size)
+        self._stream_buf = bytearray(2)
+        self._stream_scale = _GAINS_V[self.gain] / 32767
+        # a conversion takes at most ~10% longer than nominal, a scan
+        # without an RDY edge for 3 periods has lost its trigger
+        self._stream_timeout = max(3, 3 * 1000 // _RATE_SPS[rate])
+        self._stream_next = 0       # channel being converted
+        self._stream_tail = 0       # next sample to be read
+        self.stream_count = 0       # samples written to the ring
+        self.stream_missed = 0      # RDY edges the scheduler could not take
+        self.stream_lost = 0        # samples overwritten before being read
+        self._stream_callback = callback
+        self._stream_ref = self._stream_sample
+        self._stream_last = time.ticks_ms()
+        # conversion ready mode of the comparator
+        self._write_register(_REGISTER_LOWTHRESH, 0)
+        self._write_register(_REGISTER_HITHRESH, 0x8000)
+        self._stream_pin = pin
+        pin.irq(trigger=Pin.IRQ_FALLING, handler=self._rdy_handler)
+        self.i2c.writeto_mem(self.address, _REGISTER_CONFIG, configs[0])
+
+    def stream_stop(self):
+        """Stop streaming and power down the converter."""
+        if self._stream_pin is None:
+            return
+        self._stream_pin.irq(handler=None)
+        self._stream_pin = None
+        self._write_register(_REGISTER_CONFIG, _CQUE_NONE | _MODE_SINGLE |
+                             _GAINS[self.gain])
+
+    def _rdy_handler(self, pin):
+        try:
+            micropython.schedule(self._stream_ref, 0)
+        except RuntimeError:
+            self.stream_missed += 1
+
+    def _stream_sample(self, _):
+        channel = self._stream_next
+        if self._stream_channels > 1:
+            # start the next channel before reading, the conversion register
+            # keeps the finished result until the new conversion completes
+            self._stream_next = (channel + 1) % self._stream_channels
+            self.i2c.writeto_mem(self.address, _REGISTER_CONFIG,
+                                 self._stream_configs[self._stream_next])
+        buf = self._stream_buf
+        self.i2c.readfrom_mem_into(self.address, _REGISTER_CONVERT, buf)
+        res = (buf[0] << 8) | buf[1]
+        ring = self._stream_ring
+        ring[self.stream_count % len(ring)] = res if res < 32768 else res - 65536
+        self.stream_count += 1
+        self._stream_last = time.ticks_ms()
+        if self._stream_callback and self._stream_next == 0:
+            self._stream_callback(self)
+
+    def _stream_check(self):
+        # a missed RDY edge stops a single-shot scan, restart the conversion
+        if (self._stream_channels > 1 and
+                time.ticks_diff(time.ticks_ms(), self._stream_last) >
+                self._stream_timeout):
+            self._stream_last = time.ticks_ms()
+            self.i2c.writeto_mem(self.address, _REGISTER_CONFIG,
+                                 self._stream_configs[self._stream_next])
+
+    def stream_available(self):
+        """Number of unread samples in the ring."""
+        return min(self.stream_count - self._stream_tail,
+                   len(self._stream_ring))
+
+    def stream_read(self, out, volts=True):
+        """Copy the oldest unread samples into out, an array('f') for volts
+           or an array('h') for raw values. Only complete scans are copied.
+           Returns the number of samples copied."""
+        self._stream_check()
+        count = self.stream_count
+        ring = self._stream_ring
+        size = len(ring)
+        nch = self._stream_channels
+        tail = self._stream_tail
+        if count - tail > size:
+            # the ring was overrun, skip to the oldest complete scan
+            start = count - size
+            start += (nch - start % nch) % nch
+            self.stream_lost += start - tail
+            tail = start
+        n = min(count - tail, len(out))
+        n -= n % nch
+        scale = self._stream_scale
+        if volts:
+            for i in range(n):
+                out[i] = ring[(tail + i) % size] * scale
+        else:
+            for i in range(n):
+                out[i] = ring[(tail + i) % size]
+        self._stream_tail = tail + n
+        return n
+
 
 class ADS1113(ADS1115):
     def __init__(self, i2c, address=0x48):
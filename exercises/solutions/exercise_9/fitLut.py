@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+# fit the adc data with a polynomial and bake the calibration into a
+# lookup table with the voltage in mV for each of the 4096 ADC values
+# The table is written as 4096 little endian unsigned shorts, copy it to
+# the flash of the ESP32 where adcSampler.py reads it into an array('H')
+# usage: fitLut.py [-d degree] [-o adcLut.bin] [--plot] [linearity.txt]
+# The measurement file is written by dacAndADC.py: the ADC values for
+# the DAC values 0..255 (and optionally back down to 0)
+# Copyright U. Raich 2020
+# The program is part of the IoT course at the University of Cape Coast, Ghana
+
+import argparse
+import numpy as np
+
+ADC_VALUES = 4096
+DAC_MV_PER_STEP = 3300/256      # the DAC output for each step in mV
+
+def dacValues(n):
+    # the DAC values sent while measuring n ADC values
+    up = np.arange(256)
+    if n == 256:
+        return up
+    if n == 511:
+        return np.concatenate((up,up[-2::-1]))
+    raise ValueError("expected 256 or 511 measurements, got {:d}".format(n))
+
+def makeLut(calib,degree=5,mvPerStep=DAC_MV_PER_STEP):
+    coeff = np.polyfit(calib,dacValues(len(calib)),degree)
+    # outside the calibrated range the polynomial is not to be trusted:
+    # hold the values at the ends
+    raw = np.clip(np.arange(ADC_VALUES),calib.min(),calib.max())
+    mv = np.polyval(coeff,raw) * mvPerStep
+    # the table must be monotonic, the fit may wiggle where the ADC saturates
+    mv = np.maximum.accumulate(np.clip(mv,0,0xffff))
+    return coeff,np.rint(mv).astype('<u2')
+
+def main():
+    parser = argparse.ArgumentParser(description="ADC calibration lookup table")
+    parser.add_argument("data",nargs="?",default="linearity.txt",
+                        help="ADC values measured with dacAndADC.py")
+    parser.add_argument("-d","--degree",type=int,default=5,
+                        help="degree of the fitted polynomial")
+    parser.add_argument("-m","--mv-per-step",type=float,default=DAC_MV_PER_STEP,
+                        help="DAC output per step in mV")
+    parser.add_argument("-o","--output",default="adcLut.bin",
+                        help="lookup table file")
+    parser.add_argument("--plot",action="store_true",
+                        help="plot the measurement and the table")
+    args = parser.parse_args()
+
+    calib = np.loadtxt(args.data)
+    coeff,lut = makeLut(calib,args.degree,args.mv_per_step)
+    for i in range(len(coeff)):
+        print(coeff[i])
+    dac = dacValues(len(calib)) * args.mv_per_step
+    residual = lut[calib.astype(int)] - dac
+    print("residuals in the calibrated range: rms {:.1f} mV, max {:.1f} mV".format(
+        np.sqrt(np.mean(residual**2)),np.abs(residual).max()))
+    lut.tofile(args.output)
+    print("lookup table written to",args.output)
+
+    if args.plot:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()  # Create a figure containing a single axes.
+        ax.set(xlabel='ADC value', ylabel='Voltage [mV]',
+               title='ADC calibration lookup table')
+        ax.plot(calib,dac,'.')
+        ax.plot(np.arange(ADC_VALUES),lut)
+        plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# waveGen.py: signal generator playing precomputed wave tables
+# One period (or a few periods) of the wave form is calculated once into a
+# bytearray of DAC values. The table is played continuously at a fixed
+# sample rate, either on the built-in 8 bit DAC from a hardware timer
+# callback or on an external I2S DAC. The frequency is given by the table
+# length: f = rate * cycles / length.
+# Changing frequency, amplitude or wave form calculates a new table, which
+# replaces the one playing only at the end of its period: there are no
+# glitches in the output.
+# Copyright U. Raich
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+# It is released under the Gnu Public License
+
+import math
+from machine import Pin, DAC, Timer
+
+SINE     = "sin"
+SQUARE   = "rect"
+SAWTOOTH = "sawtooth"
+TRIANGLE = "triangular"
+
+DAC_MAX_VALUE = 255
+MAX_TABLE_LENGTH = 1024
+
+def makeTable(waveform, length, cycles=1, amplitude=DAC_MAX_VALUE, offset=None, duty=0.5):
+    """
+    cycles periods of waveform in length DAC values
+    amplitude: peak to peak amplitude in DAC steps
+    offset: DAC value of the center line, default: the middle of the range
+    duty: high fraction of the period for the square wave
+    """
+    if offset is None:
+        offset = (DAC_MAX_VALUE + 1) / 2
+    low = offset - amplitude / 2
+    table = bytearray(length)
+    for i in range(length):
+        phase = (i * cycles / length) % 1.0      # 0 .. 1 within the period
+        if waveform == SINE:
+            v = (math.sin(2 * math.pi * phase) + 1) / 2
+        elif waveform == SQUARE:
+            v = 1.0 if phase < duty else 0.0
+        elif waveform == SAWTOOTH:
+            v = phase
+        elif waveform == TRIANGLE:
+            v = 2 * phase if phase < 0.5 else 2 * (1 - phase)
+        else:
+            raise ValueError("Known wave types are 'sin', 'rect','sawtooth' or 'triangular'")
+        table[i] = min(max(int(low + v * amplitude + 0.5), 0), DAC_MAX_VALUE)
+    return table
+
+def fromSamples(samples, amplitude=DAC_MAX_VALUE, offset=None):
+    """
+    table from arbitrary samples, scaled to amplitude peak to peak
+    """
+    if offset is None:
+        offset = (DAC_MAX_VALUE + 1) / 2
+    low = min(samples)
+    span = max(samples) - low or 1
+    base = offset - amplitude / 2
+    table = bytearray(len(samples))
+    for i in range(len(samples)):
+        v = base + (samples[i] - low) * amplitude / span
+        table[i] = min(max(int(v + 0.5), 0), DAC_MAX_VALUE)
+    return table
+
+def tableLength(frequency, rate, maxLength=MAX_TABLE_LENGTH):
+    """
+    length and number of periods of the table best approximating frequency
+    at the sample rate. Several periods in the table give a finer frequency
+    resolution than a single one.
+    """
+    if frequency > rate / 2:
+        raise ValueError("frequency must not exceed rate/2")
+    # one period must fit into the table
+    if frequency < rate / maxLength:
+        raise ValueError("frequency must be at least {:.2f} Hz at {} samples/s, "
+                         "lower the sample rate".format(rate / maxLength, rate))
+    cycles = max(1, int(maxLength * frequency / rate))
+    length = max(2, min(maxLength, int(rate * cycles / frequency + 0.5)))
+    return length, cycles
+
+class WaveGen:
+    def __init__(self, pin=26, rate=10000, timer=0):
+        """
+        pin: DAC pin, 25 or 26
+        rate: samples per second written to the DAC
+        timer: the hardware timer used
+        """
+        self.dac = DAC(Pin(pin))
+        self.rate = rate
+        self.timer = Timer(timer)
+        self.table = bytearray(1)
+        self.pending = None
+        self.index = 0
+        self.frequency = 0
+        self.running = False
+
+    def setWave(self, waveform, frequency, amplitude=DAC_MAX_VALUE, offset=None, duty=0.5):
+        """
+        play waveform at frequency, returns the frequency actually generated
+        """
+        length, cycles = tableLength(frequency, self.rate)
+        self.setTable(makeTable(waveform, length, cycles, amplitude, offset, duty), cycles)
+        return self.frequency
+
+    def setTable(self, table, cycles=1):
+        """
+        play an arbitrary table holding cycles periods
+        """
+        self.frequency = self.rate * cycles / len(table)
+        if self.running:
+            # swapped by the timer callback at the end of the current table
+            self.pending = table
+        else:
+            self.table = table
+            self.index = 0
+
+    def _tick(self, timer):
+        table = self.table
+        i = self.index
+        self.dac.write(table[i])
+        i += 1
+        if i >= len(table):
+            i = 0
+            if self.pending is not None:
+                self.table = self.pending
+                self.pending = None
+        self.index = i
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.timer.init(freq=self.rate, mode=Timer.PERIODIC, callback=self._tick)
+
+    def stop(self):
+        if not self.running:
+            return
+        self.timer.deinit()
+        self.running = False
+        if self.pending is not None:
+            self.table = self.pending
+            self.pending = None
+        self.index = 0
+        self.dac.write(0)
+
+class I2SWaveGen:
+    def __init__(self, sck, ws, sd, rate=44100, i2sId=0, bufferLength=2048):
+        """
+        plays the tables on an external I2S DAC (e.g. PCM5102)
+        sck, ws, sd: the I2S pins
+        rate: samples per second
+        bufferLength: minimum size in bytes of the buffer handed to I2S,
+        the table is repeated to fill it
+        """
+        from machine import I2S
+        self.rate = rate
+        self.bufferLength = bufferLength
+        self.i2s = I2S(i2sId, sck=Pin(sck), ws=Pin(ws), sd=Pin(sd),
+                       mode=I2S.TX, bits=16, format=I2S.MONO,
+                       rate=rate, ibuf=4 * bufferLength)
+        self.buf = None
+        self.pending = None
+        self.frequency = 0
+        self.running = False
+
+    def _samples(self, table):
+        # 16 bit signed samples, the table repeated to fill the buffer
+        n = len(table)
+        repeat = max(1, (self.bufferLength // 2 + n - 1) // n)
+        buf = bytearray(2 * n * repeat)
+        for i in range(n):
+            v = (table[i] - 128) << 8
+            buf[2 * i] = v & 0xff
+            buf[2 * i + 1] = (v >> 8) & 0xff
+        for r in range(1, repeat):
+            buf[2 * n * r:2 * n * (r + 1)] = buf[:2 * n]
+        return buf
+
+    def setWave(self, waveform, frequency, amplitude=DAC_MAX_VALUE, offset=None, duty=0.5):
+        length, cycles = tableLength(frequency, self.rate)
+        self.setTable(makeTable(waveform, length, cycles, amplitude, offset, duty), cycles)
+        return self.frequency
+
+    def setTable(self, table, cycles=1):
+        self.frequency = self.rate * cycles / len(table)
+        buf = self._samples(table)
+        if self.running:
+            # handed to I2S when the current buffer has been sent
+            self.pending = buf
+        else:
+            self.buf = buf
+
+    def _written(self, i2s):
+        if self.pending is not None:
+            self.buf = self.pending
+            self.pending = None
+        if self.running:
+            i2s.write(self.buf)
+
+    def start(self):
+        if self.running or self.buf is None:
+            return
+        self.running = True
+        self.i2s.irq(self._written)     # non blocking writes
+        self.i2s.write(self.buf)
+
+    def stop(self):
+        # the buffer being sent is completed
+        self.running = False
+
+    def deinit(self):
+        self.stop()
+        self.i2s.deinit()
@@ -0,0 +1,22 @@
+# Plays the different wave forms on the DAC on pin 26, each for 5 s,
+# and then sweeps the frequency of a sine wave
+# copyright U. Raich
+# This program is released under the Gnu Public License
+
+from waveGen import WaveGen, SINE, SQUARE, SAWTOOTH, TRIANGLE
+from time import sleep
+
+gen = WaveGen(pin=26, rate=10000)
+gen.setWave(SINE, 100)
+gen.start()
+try:
+    for waveform in (SINE, SQUARE, SAWTOOTH, TRIANGLE):
+        f = gen.setWave(waveform, 500)
+        print("{:s} wave at {:.1f} Hz".format(waveform, f))
+        sleep(5)
+    for frequency in (50, 100, 200, 500, 1000, 2000):
+        f = gen.setWave(SINE, frequency, amplitude=200)
+        print("sine wave at {:.1f} Hz".format(f))
+        sleep(2)
+finally:
+    gen.stop()
@@ -0,0 +1,81 @@
+# asyncSensor.py: base class of the sensor services running in a uasyncio task
+# (SHT3XPeriodic, BH1750Async, Ranging)
+# The acquisition runs in its own task, started by start() and cancelled by
+# stop(). Each new result is published by the task: consumers waiting in
+# next() are woken up, latest() returns it without waiting and get() waits
+# only for the very first result.
+# A sensor service implements _run(), the acquisition task, and _current(),
+# the result handed to the consumers. _begin() and _end() prepare the sensor
+# before the task is started and put it to rest after it was stopped.
+# Copy this file to the device together with the sensor service using it.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+import uasyncio as asyncio
+
+class AsyncSensor:
+    def __init__(self):
+        self.count = 0              # number of results published
+        self.event = asyncio.Event()
+        self.task = None
+
+    def start(self):
+        """
+        Start the acquisition task.
+        Must be called with a running event loop or before asyncio.run
+        """
+        if self.task:
+            return
+        self._begin()
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        self.task = None
+        self._end()
+
+    def _begin(self):
+        pass
+
+    def _end(self):
+        pass
+
+    async def _run(self):
+        raise NotImplementedError
+
+    def _current(self):
+        raise NotImplementedError
+
+    def _publish(self):
+        # called by the task for each new result
+        self.count += 1
+        # an Event stays set: set and clear it at once, such that each
+        # next() waits for a result published after the call
+        self.event.set()
+        self.event.clear()
+
+    def latest(self):
+        """
+        the latest result, None before the first one
+        """
+        if not self.count:
+            return None
+        return self._current()
+
+    async def next(self):
+        """
+        wait for the next result and return it
+        """
+        await self.event.wait()
+        return self._current()
+
+    async def get(self):
+        """
+        the latest result, waits only for the first one
+        """
+        if not self.count:
+            return await self.next()
+        return self._current()
@@ -50,13 +50,25 @@ class BH1750():
     # Device is automatically set to Power Down after measurement.
     ONE_TIME_LOW_RES_MODE = b'\x23'
 
-    def __init__(self, scl_pin=pinScl, sda_pin=pinSda, delta_temp = 0, delta_hum = 0,i2c_address=DEFAULT_I2C_ADDRESS):
+    # max. conversion times in ms at MTreg = 69
+    LOW_RES_MAX_WAIT  = 24
+    HIGH_RES_MAX_WAIT = 180
+
+    def __init__(self, scl_pin=pinScl, sda_pin=pinSda, delta_temp = 0, delta_hum = 0,i2c_address=DEFAULT_I2C_ADDRESS,i2c=None):
 #        print("sda: ",pinSda," scl: ",pinScl)
-        if sys.platform == "esp8266":
+        # pass i2c to share one bus between several sensors
+        if i2c is not None:
+            self.i2c = i2c
+        elif sys.platform == "esp8266":
             self.i2c = I2C(scl=Pin(scl_pin), sda=Pin(sda_pin))
         else:
             self.i2c = I2C(1,scl=Pin(scl_pin), sda=Pin(sda_pin))
         self.i2c_addr = i2c_address
+        self._buf = bytearray(2)
+        self._cmd = bytearray(1)
+        self.mtreg = 69
+        self.coeff = 1/1.2           # lx per count, depends on mode and MTreg
+        self.waitMs = self.HIGH_RES_MAX_WAIT
         self.powerDown()
         self.setSensitivity()
         
@@ -83,6 +95,20 @@ class BH1750():
     def _setMode(self, mode):
         self.mode = mode
         self._sendCmd(self.mode)
+        if mode[0] & 0xf0 in (0x10, 0x20):
+            self._updateCoeff()
+
+    def _updateCoeff(self):
+        # conversion coefficient and conversion time for the current
+        # measurement mode and MTreg, only recalculated when they change
+        mode = self.mode[0]
+        mode2coeff = 2 if (mode & 0x03) == 0x01 else 1
+        self.coeff = 1/(1.2 * (self.mtreg/69.0) * mode2coeff)
+        if mode & self.HIGH_RES_CODE == 3:
+            basetime = self.LOW_RES_MAX_WAIT
+        else:
+            basetime = self.HIGH_RES_MAX_WAIT
+        self.waitMs = int(basetime * (self.mtreg/69.0)) + 1
 
     def powerDown(self):
         self._setMode(self.POWER_DOWN)
@@ -123,34 +149,51 @@ class BH1750():
         else:
             self.mtreg = sensitivity
         self.powerUp()
-
-        self._setMode((0x40 | (self.mtreg >> 5)).to_bytes(1,'big'))
-        self._setMode((0x60 | (self.mtreg & 0x1f)).to_bytes(1,'big'))
+        self._sendMtreg()
         self.powerDown()
 
+    def _sendMtreg(self):
+        cmd = self._cmd
+        cmd[0] = 0x40 | (self.mtreg >> 5)
+        self._sendCmd(cmd)
+        cmd[0] = 0x60 | (self.mtreg & 0x1f)
+        self._sendCmd(cmd)
+
+    def setMeasurementTime(self, mtreg):
+        """
+        Change MTreg without leaving the current measurement mode.
+        In continuous mode the conversion is restarted with the new
+        sensitivity, the next result is available after waitMs
+        """
+        self.mtreg = min(max(mtreg, 31), 254)
+        self._sendMtreg()
+        self._setMode(self.mode)
+
+    def setRange(self, mode, mtreg):
+        """
+        Set MTreg and start measuring in mode, the sensor must be powered up
+        """
+        self.mtreg = min(max(mtreg, 31), 254)
+        self._sendMtreg()
+        self._setMode(mode)
+
+    def readRaw(self):
+        """ Read the data register, no new conversion is started """
+        buf = self._buf
+        self.i2c.readfrom_into(self.i2c_addr, buf)
+        return buf[0] << 8 | buf[1]
+
+    def read(self):
+        """ Latest result in lx, use in continuous mode """
+        return self.readRaw() * self.coeff
+
     def getResult(self):
         """ Return current measurement result in lx. """
-        self.i2c.writeto(self.i2c_addr, self.mode)
-        data = int.from_bytes(self.i2c.readfrom(self.i2c_addr, 2),'big')            
-
-        # print("data read out: ",hex(data)," ",data)
-        mode2coeff =  2 if (int.from_bytes(self.mode,1,'big') & 0x03) == 0x01 else 1
-        # print("mode2coeff : ",mode2coeff, " mtreg: ",self.mtreg)
-        ratio = 1/(1.2 * (self.mtreg/69.0) * mode2coeff)
-        # print("ratio: ",ratio)
-        return ratio*data
+        return self.readRaw() * self.coeff
 
     def waitForResult(self, additional=0):
-        if int.from_bytes(self.mode,'big') & self.HIGH_RES_CODE == 3:
-            # max values according to data sheet
-            basetime = 24
-        else:
-            basetime = 180
-#        print("basetime: ",basetime)
-#        print("mtreg: ",self.mtreg)
-#        print("additional time: ",additional)
-#        print("Wait: ",int(basetime * (self.mtreg/69.0) + additional))
-        time.sleep_ms(int(basetime * (self.mtreg/69.0) + additional))
+        # max values according to data sheet
+        time.sleep_ms(self.waitMs + additional)
 
     def doMeasurement(self, mode, additional_delay=0):
         """ 
@@ -0,0 +1,108 @@
+# bh1750Async.py: non blocking, auto-ranging measurements with the BH1750
+# The sensor runs in one of its continuous modes and a uasyncio task reads
+# the data register after each integration period. The control loop never
+# waits for a conversion: it reads the latest value or awaits the next one.
+# After each reading the range (measurement mode and MTreg) is adapted:
+# close to saturation the sensitivity is lowered, in the dark it is raised,
+# such that bright light does not saturate and the long integration times
+# of the high sensitivity ranges are only used when needed.
+# Each sensor has its own task, several BH1750 on different addresses
+# (or buses) are therefore sampled concurrently. The task handling is
+# inherited from AsyncSensor (asyncSensor.py), the results are in lx.
+# Copyright (c) U. Raich
+# The program was written for the course on the Internet of Things
+# at the University of Cape Coast, Ghana
+# It is released under GPL
+
+import uasyncio as asyncio
+from time import ticks_ms
+from bh1750 import BH1750,BH1750Error
+from asyncSensor import AsyncSensor
+
+# ranges from the most to the least sensitive: (mode, MTreg)
+# full scale:    ~7400 lx, ~27300 lx, ~54600 lx, ~121500 lx
+# integration: ~660 ms,    ~180 ms,    ~180 ms,    ~80 ms
+RANGES = ((BH1750.CONTINUOUS_HIGH_RES_MODE_2, 254),
+          (BH1750.CONTINUOUS_HIGH_RES_MODE_2, 69),
+          (BH1750.CONTINUOUS_HIGH_RES_MODE_1, 69),
+          (BH1750.CONTINUOUS_HIGH_RES_MODE_1, 31))
+
+HIGH_COUNTS = 0xc000    # switch to a less sensitive range above
+LOW_COUNTS  = 0x1000    # try a more sensitive range below
+
+class BH1750Async(AsyncSensor):
+    def __init__(self, bh1750, autoRange=True, ranges=RANGES, startRange=2):
+        """
+        bh1750: the BH1750 sensor object
+        autoRange: adapt the range to the light level
+        ranges: (mode, MTreg) tuples, ordered from the most sensitive
+        startRange: index of the range used at start
+        """
+        if startRange < 0 or startRange >= len(ranges):
+            raise ValueError("startRange must be an index into ranges")
+        super().__init__()
+        self.sensor = bh1750
+        self.autoRange = autoRange
+        self.ranges = ranges
+        self.range = startRange
+        # ratio of the sensitivities of neighbouring ranges
+        self._gain = [self._sensitivity(i + 1) / self._sensitivity(i)
+                      for i in range(len(ranges) - 1)]
+        self.lux = 0.0
+        self.raw = 0
+        self.ticks = 0
+        self.errors = 0
+
+    def _sensitivity(self, index):
+        mode, mtreg = self.ranges[index]
+        return mtreg * (2 if mode[0] & 0x03 == 0x01 else 1)
+
+    def _applyRange(self):
+        mode, mtreg = self.ranges[self.range]
+        self.sensor.setRange(mode, mtreg)
+
+    def _begin(self):
+        # continuous mode in the start range
+        self.sensor.powerUp()
+        self._applyRange()
+
+    def _end(self):
+        self.sensor.powerDown()
+
+    def _nextRange(self, raw):
+        # index of the range to be used for the next reading
+        index = self.range
+        if raw >= HIGH_COUNTS:
+            if index < len(self.ranges) - 1:
+                return index + 1
+        elif raw < LOW_COUNTS and index > 0:
+            # only if the reading fits well into the more sensitive range
+            if raw / self._gain[index - 1] < HIGH_COUNTS // 2:
+                return index - 1
+        return index
+
+    async def _run(self):
+        sensor = self.sensor
+        while True:
+            await asyncio.sleep_ms(sensor.waitMs)
+            try:
+                raw = sensor.readRaw()
+            except (OSError, BH1750Error):
+                self.errors += 1
+                continue
+            index = self._nextRange(raw) if self.autoRange else self.range
+            # a saturated reading is dropped if a less sensitive range exists
+            if raw < HIGH_COUNTS or index == self.range:
+                self._record(raw)
+            if index != self.range:
+                self.range = index
+                self._applyRange()
+
+    def _record(self, raw):
+        self.raw = raw
+        self.lux = raw * self.sensor.coeff
+        self.ticks = ticks_ms()
+        self._publish()
+
+    def _current(self):
+        return self.lux
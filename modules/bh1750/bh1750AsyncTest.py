@@ -0,0 +1,33 @@
+#
+# Reads two BH1750 ambient light sensors concurrently with auto-ranging
+# while the main loop keeps running
+# Written for the course on the Internet of Things at the
+# University of Cape Coast, Ghana
+# This program is released under GPL
+
+import uasyncio as asyncio
+from machine import Pin,I2C
+from bh1750 import BH1750,DEFAULT_I2C_ADDRESS,pinScl,pinSda
+from bh1750Async import BH1750Async
+
+i2c = I2C(1,scl=Pin(pinScl), sda=Pin(pinSda))
+# the second sensor has its ADDR pin connected to VDD
+sensors = [BH1750Async(BH1750(i2c=i2c,i2c_address=address))
+           for address in (DEFAULT_I2C_ADDRESS,0x5c)]
+
+async def main():
+    for sensor in sensors:
+        sensor.start()
+    while True:
+        for i,sensor in enumerate(sensors):
+            lux = await sensor.get()
+            print("sensor {:d}: {:8.1f} lx (range {:d}, MTreg {:d})".format(
+                i,lux,sensor.range,sensor.sensor.mtreg))
+        # the control loop is never blocked by a conversion
+        await asyncio.sleep_ms(500)
+
+try:
+    asyncio.run(main())
+finally:
+    for sensor in sensors:
+        sensor.stop()
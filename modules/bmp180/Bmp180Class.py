@@ -27,6 +27,7 @@
 from machine import I2C,Pin
 from ustruct import unpack
 import sys,time
+from time import sleep_ms,ticks_ms,ticks_add,ticks_diff
 
 BMP180_ADDRESS         = 0x77
 
@@ -64,6 +65,9 @@ BMP180_CHIP_ID_REG     =0xd0
 BMP180_CHIP_ID         =0x55
 BMP180_MEAS_TEMP       =0x2e
 BMP180_MEAS_PRESS      =0x34
+BMP180_TEMP_WAIT       =5          # ms for a temperature conversion
+
+SEA_LEVEL_PRESSURE     =1013.25    # hPa, standard atmosphere
 
 I2C_BUS                =   1
 SCL                    =  22
@@ -87,6 +91,7 @@ class Bmp180:
 
     uncompensatedTemperature = -1
     uncompensatedPressure    = -1
+    b5                       = None   # temperature term used in the pressure calculation
     
     chip_id                 = -1
     temperature             = -1
@@ -122,26 +127,21 @@ class Bmp180:
 #
 # read calibration data
 #
-        self.AC1 = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC1_REG, 2))[0]
-        self.AC2 = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC2_REG, 2))[0]
-        self.AC3 = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC3_REG, 2))[0]
-#
-# A4, A5, A6 are unsigned shorts
-#
+# all 11 values are read in a single 22 byte burst starting at AC1
+# AC4, AC5, AC6 are unsigned shorts
 # all the other calibration values are signed shorts
 #         
-        self.AC4 = unpack('>H',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC4_REG, 2))[0]
-        self.AC5 = unpack('>H',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC5_REG, 2))[0]
-        self.AC6 = unpack('>H',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC6_REG, 2))[0]
-        self.B1  = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_B1_REG, 2))[0]
-        self.B2  = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_B2_REG, 2))[0]
-        self.MB  = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_MB_REG, 2))[0]
-        self.MC  = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_MC_REG, 2))[0]
-        self.MD  = unpack('>h',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_MD_REG, 2))[0]
+        (self.AC1,self.AC2,self.AC3,self.AC4,self.AC5,self.AC6,
+         self.B1,self.B2,self.MB,self.MC,self.MD) = unpack('>hhhHHHhhhhh',
+            self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_AC1_REG, 22))
         
-        self.oversampling       = ULTRA_HIGH_RESOLUTION
         self._samplingWaitTable = [5,8,14,26]        # waits in ms 
-        self._samplingWait = self._samplingWaitTable[self.oversampling]
+        # preallocated buffers for the burst reads
+        self._tempBuf  = bytearray(2)
+        self._pressBuf = bytearray(3)
+        self._tempCmd  = bytearray([BMP180_MEAS_TEMP])
+        self._pressCmd = bytearray(1)
+        self.setResolution(ULTRA_HIGH_RESOLUTION)
         return
         
 #
@@ -163,7 +163,7 @@ class Bmp180:
         self.MD  =   2868
         self.uncompensatedTemperature = 27898
         self.uncompensatedPressure    = 23843
-        self.oversampling = ULTRA_LOW_POWER
+        self.setResolution(ULTRA_LOW_POWER)
 
 #
 # set oversampling
@@ -171,10 +171,11 @@ class Bmp180:
     def setResolution(self,oss):
 
         if oss < 0 or oss > 3:
-            printf("in setResolution: invalid oversampling code. Skipping...")
+            print("in setResolution: invalid oversampling code. Skipping...")
             return
         self.oversampling = oss
         self._samplingWait = self._samplingWaitTable[oss]
+        self._pressCmd[0] = BMP180_MEAS_PRESS + (oss << 6)
 #
 # read back oversampling code
 #
@@ -187,6 +188,26 @@ class Bmp180:
         chip_id = unpack('B',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_CHIP_ID_REG, 1))[0]
         return chip_id       
 
+#
+# raw readouts, the registers are read in a single burst
+#
+    def readRawTemperature(self):
+        self.i2c.writeto_mem(BMP180_ADDRESS, BMP180_CTRL_MEAS_REG, self._tempCmd)
+        sleep_ms(BMP180_TEMP_WAIT)
+        buf = self._tempBuf
+        self.i2c.readfrom_mem_into(BMP180_ADDRESS, BMP180_OUT_MSB_REG, buf)
+        self.uncompensatedTemperature = buf[0] << 8 | buf[1]
+        return self.uncompensatedTemperature
+
+    def startPressure(self):
+        self.i2c.writeto_mem(BMP180_ADDRESS, BMP180_CTRL_MEAS_REG, self._pressCmd)
+
+    def readRawPressure(self):
+        # MSB, LSB and XLSB in one transfer
+        buf = self._pressBuf
+        self.i2c.readfrom_mem_into(BMP180_ADDRESS, BMP180_OUT_MSB_REG, buf)
+        return (buf[0] << 16 | buf[1] << 8 | buf[2]) >> (8-self.oversampling)
+
 #
 # make a measurement
 #
@@ -195,116 +216,160 @@ class Bmp180:
 #
 # start a temperature reading
 #
-        self.i2c.writeto_mem(BMP180_ADDRESS, BMP180_CTRL_MEAS_REG, bytearray([BMP180_MEAS_TEMP]))
-        time.sleep_ms(5)      # wait 5 ms
-        self.uncompensatedTemperature = unpack('>H',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_OUT_MSB_REG, 2))[0]
-
+        self.readRawTemperature()
         if self.debug:
             print("in measure: uncompensated temperature: ",
                   self.uncompensatedTemperature)
 #
 # start a pressure reading
 #
-        cmd = BMP180_MEAS_PRESS + (self.oversampling << 6)
-        if self.debug:
-            print("Cmd to measure pressure: %x"%cmd)
-            print("bytearray(cmd): ",bytearray([cmd]))
-
-        self.i2c.writeto_mem(BMP180_ADDRESS, BMP180_CTRL_MEAS_REG, bytearray([cmd]))
-        time.sleep_ms(self._samplingWait)
-        
-        self.MSB_raw  = unpack('B',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_OUT_MSB_REG, 1))[0]
-        self.LSB_raw  = unpack('B',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_OUT_LSB_REG, 1))[0]
-        self.XLSB_raw = unpack('B',self.i2c.readfrom_mem(BMP180_ADDRESS, BMP180_OUT_XLSB_REG, 1))[0]
-        
-        self.uncompensatedPressure = self.MSB_raw << 16 | self.LSB_raw << 8 | self.XLSB_raw
-        self.uncompensatedPressure >>= (8-self.oversampling)
+        self.startPressure()
+        sleep_ms(self._samplingWait)
+        self.uncompensatedPressure = self.readRawPressure()
 #        
         if self.debug:
-            print("in measure: raw Pressure: %x %x %x"%(self.MSB_raw,self.LSB_raw,self.XLSB_raw))
-            print("in measure: raw Pressure (combined): %x"%self.uncompensatedPressure)
+            print("in measure: raw Pressure: %x %x %x"%(self._pressBuf[0],self._pressBuf[1],self._pressBuf[2]))
             print("in measure: shift: %d"%(8-self.oversampling))
             print("in measure: uncompensated pressure: ", self.uncompensatedPressure)
         self.convert()
-        
+
+#
+# high rate pressure measurements
+# The temperature term b5 is measured once and reused for tempInterval
+# pressure samples. The conversions are pipelined: the next conversion is
+# started as soon as the previous result is read out and the pressure is
+# calculated while the sensor converts.
+#
+    def measurePressures(self, pressures, count=None, tempInterval=None):
+        """
+        fill pressures (a list or array('f')) with count pressure values in hPa
+        tempInterval: number of pressure samples after which the temperature
+        is measured again, default: only once at the start
+        """
+        if count is None:
+            count = len(pressures)
+        if count < 1:
+            return 0
+        if tempInterval is None:
+            tempInterval = count
+        wait = self._samplingWait
+        sinceTemp = tempInterval
+        running = False
+        for i in range(count):
+            if sinceTemp >= tempInterval:
+                self.b5 = self.computeB5(self.readRawTemperature())
+                sinceTemp = 0
+                running = False
+            if not running:
+                self.startPressure()
+                deadline = ticks_add(ticks_ms(), wait)
+            remaining = ticks_diff(deadline, ticks_ms())
+            if remaining > 0:
+                sleep_ms(remaining)
+            up = self.readRawPressure()
+            sinceTemp += 1
+            # start the next conversion before calculating this one
+            running = i + 1 < count and sinceTemp < tempInterval
+            if running:
+                self.startPressure()
+                deadline = ticks_add(ticks_ms(), wait)
+            pressures[i] = self.computePressure(up, self.b5) / 100
+        self.uncompensatedPressure = up
+        self.temperature = ((self.b5 + 8) >> 4) / 10
+        self.pressure = pressures[count-1]
+        return count
+
+    def measureAverage(self, samples=8):
+        """
+        average of samples pipelined pressure measurements, in hPa
+        Combine with ULTRA_HIGH_RESOLUTION for altimetry
+        """
+        if samples < 1:
+            raise ValueError("samples must be at least 1")
+        sum = 0
+        self.b5 = self.computeB5(self.readRawTemperature())
+        wait = self._samplingWait
+        self.startPressure()
+        deadline = ticks_add(ticks_ms(), wait)
+        for i in range(samples):
+            remaining = ticks_diff(deadline, ticks_ms())
+            if remaining > 0:
+                sleep_ms(remaining)
+            up = self.readRawPressure()
+            if i + 1 < samples:
+                self.startPressure()
+                deadline = ticks_add(ticks_ms(), wait)
+            sum += self.computePressure(up, self.b5)
+        self.temperature = ((self.b5 + 8) >> 4) / 10
+        self.pressure = sum / samples / 100
+        return self.pressure
+
 #
-# calculate real temperature
+# altitude in m from the pressure, using the barometric formula
 #
-    def convert(self):
-        if self.debug:
-            print("in convert: -------------- calibration values-- ------------")
-            print("AC1: %d"%self.AC1)
-            print("AC2: %d"%self.AC2)
-            print("AC3: %d"%self.AC3)
-            print("AC4: %d"%self.AC4)
-            print("AC5: %d"%self.AC5)
-            print("AC6: %d"%self.AC6)
-            print("B1 : %d"%self.B1)
-            print("B2 : %d"%self.B2)
-            print("MB : %d"%self.MB)
-            print("MC : %d"%self.MC)
-            print("MD : %d"%self.MD)
-            
-        if self.debug:
-            print("in convert: ------------ calculating temperature ------------")
-        ut = self.uncompensatedTemperature
-        if self.debug:        
-            print("in convert: uncompensated temperature: ",ut)
-            print("in convert: AC6: ",self.AC6," AC5: ",self.AC5)
+    def getAltitude(self, seaLevelPressure=SEA_LEVEL_PRESSURE):
+        return 44330.0 * (1.0 - (self.pressure / seaLevelPressure) ** (1/5.255))
+
+#
+# temperature term b5 from the uncompensated temperature (see data sheet)
+#
+    def computeB5(self, ut):
         x1 = (ut - self.AC6) * self.AC5 >> 15
-        if self.debug:
-            print("in convert: x1:",x1)
         x2 = self.MC * 2048 // (x1+self.MD)
-        if self.debug:
-            print("in convert: x2:",x2)        
-        b5 = x1 + x2
-        if self.debug:
-            print("in convert: b5:",b5)         
-        t = (b5 + 8) >> 4
-        if self.debug:
-            print("in convert: calculated temperature: ",t)
-        self.temperature = t/10       # in °C
+        return x1 + x2
+
 #
-# calculate pressure
+# pressure in Pa from the uncompensated pressure and b5 (see data sheet)
 #
-        if self.debug:
-            print("in convert: ------------ calculating pressure ------------")
-        up = self.uncompensatedPressure
+    def computePressure(self, up, b5):
+        oss = self.oversampling
         b6 = b5 - 4000
-        if self.debug:
-            print("in convert: b6 =",b6)
-        x1 = (self.B2 * (b6 * b6) >> 12) >> 11
+        b6b6 = (b6 * b6) >> 12
+        x1 = (self.B2 * b6b6) >> 11
         x2 = (self.AC2 * b6) >> 11
-        x3 = x1 + x2    
-        b3 = (((self.AC1 * 4 + x3) << self.oversampling) + 2) >> 2
-        if self.debug:
-            print("in convert: x1=" ,x1, " x2=",x2," x3=",x3," b3=" ,b3)
+        b3 = (((self.AC1 * 4 + x1 + x2) << oss) + 2) >> 2
         x1 = self.AC3 * b6 >> 13
-        x2 = (self.B1 * (b6 * b6) >> 12) >> 16
+        x2 = (self.B1 * b6b6) >> 16
         x3 = ((x1 + x2) + 2) >> 2
-        if self.debug:
-            print("in convert: x1=" ,x1, " x2=",x2," x3=",x3)        
         b4 = self.AC4 * (x3 + 32768) >> 15
-        if self.debug:
-            print("in convert: b4=",b4)
-        b7 = (up - b3) * (50000 >> self.oversampling)
-        if self.debug:
-            print("in convert: b7=",b7)
+        b7 = (up - b3) * (50000 >> oss)
         if b7 < 0x80000000:
             p = (b7 * 2) // b4
         else:
             p = (b7//b4)*2
-        if self.debug:
-            print ("in convert: p=",p)
         x1 = (p>>8)*(p>>8)
         x1 = (x1*3038) >> 16
         x2 = (-7357 * p) >> 16
+        return p + ((x1 + x2 + 3791) >> 4)
+
+#
+# calculate real temperature and pressure
+#
+    def convert(self):
         if self.debug:
-            print("in convert: x1=",x1," x2=",x2)
-        p = p + ((x1 + x2 + 3791) >> 4)
+            print("in convert: -------------- calibration values-- ------------")
+            print("AC1: %d"%self.AC1)
+            print("AC2: %d"%self.AC2)
+            print("AC3: %d"%self.AC3)
+            print("AC4: %d"%self.AC4)
+            print("AC5: %d"%self.AC5)
+            print("AC6: %d"%self.AC6)
+            print("B1 : %d"%self.B1)
+            print("B2 : %d"%self.B2)
+            print("MB : %d"%self.MB)
+            print("MC : %d"%self.MC)
+            print("MD : %d"%self.MD)
+        self.b5 = self.computeB5(self.uncompensatedTemperature)
+        t = (self.b5 + 8) >> 4
+        self.temperature = t/10       # in °C
+        p = self.computePressure(self.uncompensatedPressure, self.b5)
+        self.pressure = p/100    # in hPa
         if self.debug:
+            print("in convert: uncompensated temperature: ",self.uncompensatedTemperature)
+            print("in convert: b5:",self.b5)
+            print("in convert: calculated temperature: ",t)
+            print("in convert: uncompensated pressure: ",self.uncompensatedPressure)
             print("in convert: pressure:",p)
-        self.pressure = p/100    # in hPa
 
 #
 # get temperature
@@ -11,12 +11,22 @@
 #define mp_hal_pin_od_high_dht mp_hal_pin_od_high
 #endif
 
-STATIC mp_obj_t dht11Raw_dht11ReadRaw(mp_obj_t pin_in, mp_obj_t buf_in) {
+/* idle time in us after which the transmission is considered finished
+   the longest pulse of the protocol is the 80 us response */
+#define DHT11_IDLE_TIMEOUT 200
 
+/* dht11ReadRaw(pin, buf[, debug]): debug printing is off by default */
+STATIC mp_obj_t dht11Raw_dht11ReadRaw(size_t n_args, const mp_obj_t *args) {
+
+    mp_obj_t pin_in = args[0];
+    mp_obj_t buf_in = args[1];
+    bool debug = n_args > 2 && mp_obj_is_true(args[2]);
     mp_buffer_info_t bufinfo;
     mp_get_buffer_raise(buf_in, &bufinfo, MP_BUFFER_WRITE);
-    mp_printf(&mp_plat_print, "buffer length: %d\n",bufinfo.len);
-    mp_printf(&mp_plat_print, "buffer type: \'%c\'\n",bufinfo.typecode);
+    if (debug) {
+      mp_printf(&mp_plat_print, "buffer length: %d\n",bufinfo.len);
+      mp_printf(&mp_plat_print, "buffer type: \'%c\'\n",bufinfo.typecode);
+    }
     if (bufinfo.typecode != 'I')
       mp_raise_ValueError(MP_ERROR_TEXT("Expecting unsigned integer array"));
     if (bufinfo.len != 32*4)
@@ -26,7 +36,8 @@ STATIC mp_obj_t dht11Raw_dht11ReadRaw(mp_obj_t pin_in, mp_obj_t buf_in) {
 
     /* define gpio pin */
     mp_hal_pin_obj_t pin = mp_hal_get_pin_obj(pin_in);
-    mp_printf(&mp_plat_print, "dht11 pin number: %d\n",pin);
+    if (debug)
+      mp_printf(&mp_plat_print, "dht11 pin number: %d\n",pin);
 
     mp_hal_pin_open_drain(pin);
     
@@ -81,7 +92,69 @@ timeout:
 
 }
 
-MP_DEFINE_CONST_FUN_OBJ_2(dht11Raw_dht11ReadRaw_obj, dht11Raw_dht11ReadRaw);
+MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(dht11Raw_dht11ReadRaw_obj, 2, 3, dht11Raw_dht11ReadRaw);
+
+/* dht11Capture(pin, buf[, debug]):
+   records only the time stamps of the edges on the data line, in us after
+   the start signal is released, into an unsigned short array.
+   A complete transmission has 84 edges: the falling and rising edge of the
+   response, the falling edge starting the first bit, a rising and falling
+   edge for each of the 40 bits and the rising edge at the end.
+   Returns the number of edges recorded. */
+STATIC mp_obj_t dht11Raw_dht11Capture(size_t n_args, const mp_obj_t *args) {
+
+    mp_obj_t pin_in = args[0];
+    mp_obj_t buf_in = args[1];
+    bool debug = n_args > 2 && mp_obj_is_true(args[2]);
+    mp_buffer_info_t bufinfo;
+    mp_get_buffer_raise(buf_in, &bufinfo, MP_BUFFER_WRITE);
+    if (bufinfo.typecode != 'H')
+      mp_raise_ValueError(MP_ERROR_TEXT("Expecting unsigned short array"));
+    uint16_t *buf = bufinfo.buf;
+    size_t max_edges = bufinfo.len / sizeof(uint16_t);
+
+    mp_hal_pin_obj_t pin = mp_hal_get_pin_obj(pin_in);
+    if (debug)
+      mp_printf(&mp_plat_print, "dht11 pin number: %d, space for %d edges\n",pin,(int)max_edges);
+
+    mp_hal_pin_open_drain(pin);
+
+    /* issue start command */
+    mp_hal_pin_od_high_dht(pin);
+    mp_hal_delay_ms(250);
+    mp_hal_pin_od_low(pin);
+    mp_hal_delay_ms(18);
+
+    /* enter time critical section */
+    mp_uint_t irq_state = mp_hal_quiet_timing_enter();
+
+    /* release the line and time stamp every change of its level */
+    mp_hal_pin_od_high_dht(pin);
+    mp_uint_t start = mp_hal_ticks_us();
+    mp_uint_t last = start;
+    int level = 1;
+    size_t n = 0;
+    while (n < max_edges) {
+      mp_uint_t now = mp_hal_ticks_us();
+      int value = mp_hal_pin_read(pin);
+      if (value != level) {
+        level = value;
+        buf[n++] = (uint16_t)(now - start);
+        last = now;
+      } else if ((mp_uint_t)(now - last) > DHT11_IDLE_TIMEOUT) {
+        break;
+      }
+    }
+
+    mp_hal_quiet_timing_exit(irq_state);
+    if (debug)
+      mp_printf(&mp_plat_print, "%d edges captured\n",(int)n);
+    if (n == 0)
+      mp_raise_OSError(MP_ETIMEDOUT);
+    return mp_obj_new_int(n);
+}
+
+MP_DEFINE_CONST_FUN_OBJ_VAR_BETWEEN(dht11Raw_dht11Capture_obj, 2, 3, dht11Raw_dht11Capture);
   
 // Define all properties of the dht11Raw module.
 // Table entries are key/value pairs of the attribute name (a string)
@@ -91,6 +164,7 @@ MP_DEFINE_CONST_FUN_OBJ_2(dht11Raw_dht11ReadRaw_obj, dht11Raw_dht11ReadRaw);
 STATIC const mp_rom_map_elem_t dht11Raw_module_globals_table[] = {
     { MP_ROM_QSTR(MP_QSTR___name__), MP_ROM_QSTR(MP_QSTR_dht11Raw) },
     { MP_ROM_QSTR(MP_QSTR_dht11ReadRaw), MP_ROM_PTR(&dht11Raw_dht11ReadRaw_obj) },
+    { MP_ROM_QSTR(MP_QSTR_dht11Capture), MP_ROM_PTR(&dht11Raw_dht11Capture_obj) },
 };
 STATIC MP_DEFINE_CONST_DICT(dht11Raw_module_globals, dht11Raw_module_globals_table);
 
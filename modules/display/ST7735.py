@@ -5,6 +5,8 @@ from math import cos, sin, pi, radians, floor
 import fonts.sysfont as sysfont
 import framebuf
 import sys
+import struct
+from collections import OrderedDict
 
 #60 = 90 right rotation
 #C0 = 180 right rotation
@@ -74,6 +76,103 @@ def color565(r, g, b):
 def clamp( aValue, aMin, aMax ) :
   return max(aMin, min(aMax, aValue))
 
+SPRITESHEET_MAGIC = b'SPSH'
+
+class SpriteSheet:
+    """Many sprite frames stored in a single file.
+
+    The file starts with a header giving direct access to each frame:
+        4 bytes   magic 'SPSH'
+        uint16    number of frames
+        uint16    reserved (0)
+        per frame uint32 file offset, uint16 width, uint16 height
+    followed by the frames in raw RGB565 format as written by img2rgb565.
+    All values are little endian. utils/img2spritesheet.py creates these files.
+    The file stays open so frames are drawn without reopening it.
+    """
+    def __init__(self, path):
+        """Open a sprite sheet and read its index.
+
+        Args:
+            path (string): Sprite sheet file path.
+        """
+        self._file = open(path, "rb")
+        header = self._file.read(8)
+        if len(header) < 8 or header[:4] != SPRITESHEET_MAGIC:
+            self._file.close()
+            raise ValueError('{0} is not a sprite sheet'.format(path))
+        self.count = struct.unpack_from('<H', header, 4)[0]
+        self._index = self._file.read(8 * self.count)
+
+    def __len__(self):
+        return self.count
+
+    def frame(self, n):
+        """Return (offset, width, height) of frame n."""
+        if not 0 <= n < self.count:
+            raise IndexError('frame {0} out of range'.format(n))
+        return struct.unpack_from('<IHH', self._index, 8 * n)
+
+    def size(self, n):
+        """Return (width, height) of frame n."""
+        _, w, h = self.frame(n)
+        return w, h
+
+    def draw(self, display, n, x, y):
+        """Stream frame n to the display at position x,y."""
+        offset, w, h = self.frame(n)
+        self._file.seek(offset)
+        display.stream(self._file, x, y, w, h)
+
+    def close(self):
+        self._file.close()
+
+class GlyphCache:
+    """Least recently used cache of rendered RGB565 glyphs.
+
+    Glyphs are kept until their total size exceeds the byte budget, then the
+    least recently used ones are dropped. hits and misses count the lookups.
+    """
+    def __init__(self, budget=8192):
+        """Initialize the cache.
+
+        Args:
+            budget (Optional int): Maximum number of glyph bytes kept (default 8192)
+        """
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._glyphs = OrderedDict()
+
+    def get(self, key):
+        """Return the glyph stored under key or None."""
+        glyph = self._glyphs.pop(key, None)
+        if glyph is None:
+            self.misses += 1
+            return None
+        self._glyphs[key] = glyph            # most recently used is kept at the end
+        self.hits += 1
+        return glyph
+
+    def put(self, key, glyph):
+        """Store a (buffer, width, height, framebuffer) glyph under key."""
+        n = len(glyph[0])
+        if n > self.budget:
+            return
+        while self.size + n > self.budget:
+            oldest = next(iter(self._glyphs))
+            self.size -= len(self._glyphs.pop(oldest)[0])
+        self._glyphs[key] = glyph
+        self.size += n
+
+    def clear(self):
+        """Drop all glyphs and reset the counters."""
+        self._glyphs = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
 class Display(framebuf.FrameBuffer):
     """Serial interface for 16-bit color (5-6-5 RGB) ST7735 OLED display.
 
@@ -109,7 +208,10 @@ class Display(framebuf.FrameBuffer):
     
     RGB = True
     BGR = False
-    def __init__(self, spi, cs, dc, rst=None, width=128, height=128):
+    MAX_DIRTY = 4                        # dirty rectangles kept before merging
+    STREAM_CHUNK = 1024                  # bytes per file read when streaming images
+    def __init__(self, spi, cs, dc, rst=None, width=128, height=128,
+                 glyph_cache=8192):
         """Initialize OLED.
 
         Args:
@@ -119,6 +221,7 @@ class Display(framebuf.FrameBuffer):
             rst (Class Pin):  Reset pin
             width (Optional int): Screen width (default 128)
             height (Optional int): Screen height (default 128)
+            glyph_cache (Optional int): Byte budget of the glyph cache (default 8192, 0 = off)
         """
         print("Display with cs: %d, dc: %d"%(cs,dc))
         self.width = width
@@ -138,11 +241,25 @@ class Display(framebuf.FrameBuffer):
         self.spi = spi
         self.colorData = bytearray(2)
         self.windowLocData = bytearray(4)
+        self.glyph_cache = GlyphCache(glyph_cache)
+        # preallocated buffers for the run rasterizer
+        self._cmd = bytearray(1)
+        self._runbuf = bytearray(2*max(width, height))
+        self._runview = memoryview(self._runbuf)
+        self._runcolor = None
+        self._batch = 0
+        # two buffers used alternately when streaming images from a file
+        self._streambufs = (memoryview(bytearray(self.STREAM_CHUNK)),
+                            memoryview(bytearray(self.STREAM_CHUNK)))
         
         self.pagesize = self.height // 8
         self.buffer = bytearray(2*self.height * self.width)
 
         super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
+        # areas of the frame buffer modified since the last show()
+        # a list of [x0,y0,x1,y1] rectangles, inclusive coordinates
+        # the first show() must transfer the whole frame buffer
+        self._dirty = [[0, 0, self.width - 1, self.height - 1]]
             
         # initialize the controller
         
@@ -382,6 +499,42 @@ class Display(framebuf.FrameBuffer):
         for x in range(0, w, 8):
             self.block(x, 0, x + 7, h - 1, line)
 
+    def stream(self, f, x, y, w, h):
+        """Stream raw RGB565 data from an open file to a display window.
+
+        The window is set up once and the data is sent in a single chip
+        select cycle. Two preallocated buffers are used alternately: the
+        next chunk is read while the previous one is written out. The image
+        is never loaded into memory as a whole, so its size is not limited.
+
+        Args:
+            f (file): File opened in binary mode, positioned at the pixel data.
+            x (int): X coordinate of image left.
+            y (int): Y coordinate of image top.
+            w (int): Width of image.
+            h (int): Height of image.
+        """
+        x2 = x + w - 1
+        y2 = y + h - 1
+        if self.is_off_grid(x, y, x2, y2):
+            return
+        remaining = w * h * 2
+        bufs = self._streambufs
+        chunk = len(bufs[0])
+        # prefetch the first chunk before talking to the display
+        n = f.readinto(bufs[0][:min(chunk, remaining)])
+        self._setwindowloc(x, y, x2, y2)
+        self.dc(1)
+        self.cs(0)
+        i = 0
+        while n:
+            remaining -= n
+            pending = bufs[i][:n]
+            i ^= 1
+            n = f.readinto(bufs[i][:min(chunk, remaining)]) if remaining > 0 else 0
+            self.spi.write(pending)
+        self.cs(1)
+
     def draw_image(self, path, x=0, y=0, w=128, h=128):
         """Draw image from flash.
 
@@ -392,27 +545,8 @@ class Display(framebuf.FrameBuffer):
             w (int): Width of image.  Default is 128.
             h (int): Height of image.  Default is 128.
         """
-        x2 = x + w - 1
-        y2 = y + h - 1
-        if self.is_off_grid(x, y, x2, y2):
-            return
         with open(path, "rb") as f:
-            chunk_height = 1024 // w
-            chunk_count, remainder = divmod(h, chunk_height)
-            chunk_size = chunk_height * w * 2
-            chunk_y = y
-            if chunk_count:
-                for c in range(0, chunk_count):
-                    buf = f.read(chunk_size)
-                    self.block(x, chunk_y,
-                               x2, chunk_y + chunk_height - 1,
-                               buf)
-                    chunk_y += chunk_height
-            if remainder:
-                buf = f.read(remainder * w * 2)
-                self.block(x, chunk_y,
-                           x2, chunk_y + remainder - 1,
-                           buf)
+            self.stream(f, x, y, w, h)
                 
     def image(self, path, x=0, y=0, w=128, h=128):
         """Draw image from flash.
@@ -430,6 +564,7 @@ class Display(framebuf.FrameBuffer):
             return
         with open(path, "rb") as f:
             self.buffer = f.read()
+        self.invalidate()
             
     def load_sprite(self, path, w, h):
         """Load sprite image.
@@ -439,7 +574,8 @@ class Display(framebuf.FrameBuffer):
             w (int): Width of image.
             h (int): Height of image.
         Notes:
-            w x h cannot exceed 2048
+            w x h cannot exceed 2048, use draw_image() or a SpriteSheet
+            to stream larger images without loading them into memory.
         """
         buf_size = w * h * 2
         with open(path, "rb") as f:
@@ -500,6 +636,140 @@ class Display(framebuf.FrameBuffer):
         self.spi.deinit()
         print('display off')
     
+    # run rasterizer
+    # Lines and outlines are split into horizontal or vertical runs of pixels.
+    # Each run costs a single window setup followed by one data burst taken
+    # from a preallocated buffer filled with the drawing color. Chip select is
+    # kept low for a whole batch of runs.
+
+    def start_batch(self, color=None):
+        '''Start a batch of runs. Drawing methods called before end_batch()
+        are sent as one command stream without releasing chip select.'''
+        if color is not None:
+            self._runfill(color)
+        self._batch += 1
+        self.cs(0)
+
+    def end_batch(self):
+        '''End a batch of runs started with start_batch().'''
+        if self._batch:
+            self._batch -= 1
+        if not self._batch:
+            self.cs(1)
+
+    def _runfill(self, color):
+        '''Fill the run buffer with the given color.'''
+        if color == self._runcolor:
+            return
+        buf = self._runbuf
+        lo = color & 0xff
+        hi = (color >> 8) & 0xff
+        for i in range(0, len(buf), 2):
+            buf[i] = lo
+            buf[i+1] = hi
+        self._runcolor = color
+
+    def _run(self, x0, y0, x1, y1):
+        '''Send a horizontal or vertical run from x0,y0 to x1,y1 in the
+        color of the run buffer. The run is clipped to the screen.'''
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        if x1 < 0 or y1 < 0 or x0 >= self.width or y0 >= self.height:
+            return
+        if x0 < 0:
+            x0 = 0
+        if y0 < 0:
+            y0 = 0
+        if x1 >= self.width:
+            x1 = self.width - 1
+        if y1 >= self.height:
+            y1 = self.height - 1
+        spi = self.spi
+        dc = self.dc
+        cmd = self._cmd
+        loc = self.windowLocData
+        self.cs(0)
+        dc(0)
+        cmd[0] = CASET                   #Column address set.
+        spi.write(cmd)
+        loc[0] = self.xoffset
+        loc[1] = self.xoffset + x0
+        loc[2] = self.xoffset
+        loc[3] = self.xoffset + x1
+        dc(1)
+        spi.write(loc)
+        dc(0)
+        cmd[0] = RASET                   #Row address set.
+        spi.write(cmd)
+        loc[0] = self.yoffset
+        loc[1] = self.yoffset + y0
+        loc[2] = self.yoffset
+        loc[3] = self.yoffset + y1
+        dc(1)
+        spi.write(loc)
+        dc(0)
+        cmd[0] = RAMWR                   #Write to RAM.
+        spi.write(cmd)
+        dc(1)
+        spi.write(self._runview[:2*(x1 - x0 + y1 - y0 + 1)])
+        if not self._batch:
+            self.cs(1)
+
+    def _line_runs(self, x1, y1, x2, y2):
+        '''Rasterize a line with Bresenham's algorithm, one run per step
+        of the minor axis. Both end points are drawn.'''
+        dx = abs(x2 - x1)
+        dy = abs(y2 - y1)
+        inx = 1 if x2 >= x1 else -1
+        iny = 1 if y2 >= y1 else -1
+        if dx >= dy:
+            e = 2*dy - dx
+            start = x1
+            for _ in range(dx):
+                if e >= 0:
+                    self._run(start, y1, x1, y1)
+                    y1 += iny
+                    e -= 2*dx
+                    start = x1 + inx
+                e += 2*dy
+                x1 += inx
+            self._run(start, y1, x1, y1)
+        else:
+            e = 2*dx - dy
+            start = y1
+            for _ in range(dy):
+                if e >= 0:
+                    self._run(x1, start, x1, y1)
+                    x1 += inx
+                    e -= 2*dy
+                    start = y1 + iny
+                e += 2*dx
+                y1 += iny
+            self._run(x1, start, x1, y1)
+
+    def _quadrant_runs(self, x0, y0, pts):
+        '''Send the runs of a symmetric outline. pts holds the x,y offsets
+        of one quadrant as a flat list in path order, the outline is mirrored
+        into the other three quadrants.'''
+        n = len(pts)
+        for sx, sy in ((1, 1), (-1, 1), (1, -1), (-1, -1)):
+            rx = ex = x0 + sx*pts[0]
+            ry = ey = y0 + sy*pts[1]
+            for i in range(2, n, 2):
+                x = x0 + sx*pts[i]
+                y = y0 + sy*pts[i+1]
+                if y == ey and ry == ey and (x - ex == 1 or ex - x == 1):
+                    ex = x                 # extend horizontal run
+                elif x == ex and rx == ex and (y - ey == 1 or ey - y == 1):
+                    ey = y                 # extend vertical run
+                elif x != ex or y != ey:
+                    self._run(rx, ry, ex, ey)
+                    rx = ex = x
+                    ry = ey = y
+            self._run(rx, ry, ex, ey)
+
     def draw_pixel(self, x, y, color):
         """Draw a single pixel.
 
@@ -558,48 +828,9 @@ class Display(framebuf.FrameBuffer):
             x2, y2 (int): Ending coordinates of the line
             color (int): RGB565 color value.
         """
-        # Check for horizontal line
-        if y1 == y2:
-            if x1 > x2:
-                x1, x2 = x2, x1
-            self.draw_hline(x1, y1, x2 - x1 + 1, color)
-            return
-        # Check for vertical line
-        if x1 == x2:
-            if y1 > y2:
-                y1, y2 = y2, y1
-            self.draw_vline(x1, y1, y2 - y1 + 1, color)
-            return
-        
-        dx = x2 - x1
-        dy = y2 - y1
-        inx = 1 if dx > 0 else -1
-        iny = 1 if dy > 0 else -1
-
-        dx = abs(dx)
-        dy = abs(dy)
-        if (dx >= dy):
-            dy <<= 1
-            e = dy - dx
-            dx <<= 1
-            while (x1 != x2):
-                self.draw_pixel(x1, y1, color)
-                if (e >= 0):
-                    y1 += iny
-                    e -= dx
-                e += dy
-                x1 += inx
-        else:
-            dx <<= 1
-            e = dx - dy
-            dy <<= 1
-            while (y1 != y2):
-                self.draw_pixel(x1, y1, color)
-                if (e >= 0):
-                    x1 += inx
-                    e -= dy
-                e += dx
-                y1 += iny
+        self.start_batch(color)
+        self._line_runs(x1, y1, x2, y2)
+        self.end_batch()
         
     def draw_lines(self, coords, color):
         """Draw multiple lines.
@@ -608,13 +839,16 @@ class Display(framebuf.FrameBuffer):
             coords ([[int, int],...]): Line coordinate X, Y pairs
             color (int): RGB565 color value.
         """
+        # all segments are sent as a single batch
+        self.start_batch(color)
         # Starting point
         x1, y1 = coords[0]
         # Iterate through coordinates
         for i in range(1, len(coords)):
             x2, y2 = coords[i]
-            self.draw_line(x1, y1, x2, y2, color)
+            self._line_runs(x1, y1, x2, y2)
             x1, y1 = x2, y2
+        self.end_batch()
 
     def lines(self, coords, color):
         # Starting point
@@ -691,10 +925,7 @@ class Display(framebuf.FrameBuffer):
         dy = -r - r
         x = 0
         y = r
-        self.draw_pixel(x0, y0 + r, color)
-        self.draw_pixel(x0, y0 - r, color)
-        self.draw_pixel(x0 + r, y0, color)
-        self.draw_pixel(x0 - r, y0, color)
+        octant = [0, r]
         while x < y:
             if f >= 0:
                 y -= 1
@@ -703,14 +934,16 @@ class Display(framebuf.FrameBuffer):
             x += 1
             dx += 2
             f += dx
-            self.draw_pixel(x0 + x, y0 + y, color)
-            self.draw_pixel(x0 - x, y0 + y, color)
-            self.draw_pixel(x0 + x, y0 - y, color)
-            self.draw_pixel(x0 - x, y0 - y, color)
-            self.draw_pixel(x0 + y, y0 + x, color)
-            self.draw_pixel(x0 - y, y0 + x, color)
-            self.draw_pixel(x0 + y, y0 - x, color)
-            self.draw_pixel(x0 - y, y0 - x, color)
+            octant.append(x)
+            octant.append(y)
+        # the second octant of the quadrant is the first one mirrored at x == y
+        pts = octant[:]
+        for i in range(len(octant) - 2, -1, -2):
+            pts.append(octant[i+1])
+            pts.append(octant[i])
+        self.start_batch(color)
+        self._quadrant_runs(x0, y0, pts)
+        self.end_batch()
 
     def circle(self, x0, y0, r, color):
         """Draw a circle.
@@ -770,11 +1003,8 @@ class Display(framebuf.FrameBuffer):
         y = b
         px = 0
         py = twoa2 * y
-        # Plot initial points
-        self.draw_pixel(x0 + x, y0 + y, color)
-        self.draw_pixel(x0 - x, y0 + y, color)
-        self.draw_pixel(x0 + x, y0 - y, color)
-        self.draw_pixel(x0 - x, y0 - y, color)
+        # Initial point
+        pts = [x, y]
         # Region 1
         p = round(b2 - (a2 * b) + (0.25 * a2))
         while px < py:
@@ -786,10 +1016,8 @@ class Display(framebuf.FrameBuffer):
                 y -= 1
                 py -= twoa2
                 p += b2 + px - py
-            self.draw_pixel(x0 + x, y0 + y, color)
-            self.draw_pixel(x0 - x, y0 + y, color)
-            self.draw_pixel(x0 + x, y0 - y, color)
-            self.draw_pixel(x0 - x, y0 - y, color)
+            pts.append(x)
+            pts.append(y)
         # Region 2
         p = round(b2 * (x + 0.5) * (x + 0.5) +
                   a2 * (y - 1) * (y - 1) - a2 * b2)
@@ -802,10 +1030,11 @@ class Display(framebuf.FrameBuffer):
                 x += 1
                 px += twob2
                 p += a2 - py + px
-            self.draw_pixel(x0 + x, y0 + y, color)
-            self.draw_pixel(x0 - x, y0 + y, color)
-            self.draw_pixel(x0 + x, y0 - y, color)
-            self.draw_pixel(x0 - x, y0 - y, color)
+            pts.append(x)
+            pts.append(y)
+        self.start_batch(color)
+        self._quadrant_runs(x0, y0, pts)
+        self.end_batch()
  
     def draw_filledCircle(self, x0, y0, r, color):
         """Draw a filled circle.
@@ -1082,6 +1311,24 @@ class Display(framebuf.FrameBuffer):
             self.draw_hline(x[0], y, x[1] - x[0] + 2, color)
 
     def _getletter(self,letter,font,color,background,landscape):
+        '''
+        returns the rendered letter from the glyph cache as a tuple
+        (buffer, width, height, framebuffer). The letter is only rendered
+        if it is not found in the cache.
+        '''
+        key = (font, letter, color, background, landscape)
+        glyph = self.glyph_cache.get(key)
+        if glyph is None:
+            buf, width, height = self._renderletter(letter,font,color,background,landscape)
+            if width and height:
+                fbuf = framebuf.FrameBuffer(buf, width, height, framebuf.RGB565)
+            else:
+                fbuf = None
+            glyph = (buf, width, height, fbuf)
+            self.glyph_cache.put(key, glyph)
+        return glyph
+
+    def _renderletter(self,letter,font,color,background,landscape):
         '''
         gets a letter from the font and fills the letter array with the pixel colors
         returns the filled letter array ready to be printed as well as width and height
@@ -1211,7 +1458,7 @@ class Display(framebuf.FrameBuffer):
     def draw_letter(self, x, y, letter, font, color, background=0,
                     landscape=False):
 
-        letter, width,height = self._getletter(letter,font,color,background,landscape)      
+        letter, width, height, _ = self._getletter(letter,font,color,background,landscape)
         #print("draw_letter: width: {:d} height: {:d}".format(width,height))
 
         if landscape:
@@ -1221,19 +1468,14 @@ class Display(framebuf.FrameBuffer):
             
     def letter(self, x, y, letter, color, font=sysfont, background=0,
                     landscape=False):
-        letter, width,height = self._getletter(letter,font,color,background,landscape)      
-        #print("draw_letter: width: {:d} height: {:d}".format(width,height))
+        _, width, height, fbuf = self._getletter(letter,font,color,background,landscape)
+        if fbuf is None:
+            return
         # copy to frame buffer
         if landscape:
-            print("width: {:d}, height: {:.d}".format(width,height))
-            for i in range(width):
-                print("buf[{:03d} .. {:03d}] from letter[{:03d} .. {:03d}]".format(2*((y+i)*self.width+x),2*((y+i)*self.width+x+width),2*i*width,2*(i*width+width)))
-                self.buffer[2*((y-height+i)*self.width+x): 2*((y-height+i)*self.width+x+width)] = letter[2*i*width:2*(i*width+width)]                          
-        else:
-            print("width: {:d}, height: {:.d}".format(width,height))
-            for i in range(height):
-                print("buf[{:03d} .. {:03d}] from letter[{:03d} .. {:03d}]".format(2*((y+i)*self.width+x),2*((y+i)*self.width+x+width),2*i*width,2*(i*width+width)))
-                self.buffer[2*((y+i)*self.width+x): 2*((y+i)*self.width+x+width)] = letter[2*i*width:2*(i*width+width)]
+            y -= height
+        super().blit(fbuf, x, y)
+        self._touch(x, y, width, height)
                
     def draw_text(self, x, y, text, font, color,  background=0,
                   landscape=False, spacing=1, nowrap = False):
@@ -1252,8 +1494,8 @@ class Display(framebuf.FrameBuffer):
         for letter in text:
             
             # Get letter array and letter dimensions
-            glyph, w, h = self._getletter(letter, font, color, background,
-                                    landscape)
+            glyph, w, h, _ = self._getletter(letter, font, color, background,
+                                             landscape)
             # Stop on error
             if w == 0 or h == 0:
                 print('Invalid width {0} or height {1}'.format(w, h))
@@ -1313,20 +1555,17 @@ class Display(framebuf.FrameBuffer):
         """
         for letter in text:
             # Get letter array and letter dimensions
-            glyph, w, h = self._getletter(letter, font, color, background,
-                                    landscape)
+            _, w, h, glyph = self._getletter(letter, font, color, background,
+                                             landscape)
             # Stop on error
             if w == 0 or h == 0:
                 print('Invalid width {0} or height {1}'.format(w, h))
                 return
             # write the letter to the framebuffer
-                    # copy to frame buffer
                     
             if landscape:
-                #print("width: {:d}, height: {:.d}".format(w,h))
-                for i in range(h):
-                    #print("buf[{:03d} .. {:03d}] from letter[{:03d} .. {:03d}]".format(2*((y-h+i)*self.width+x),2*((y-h+i)*self.width+x+w),2*i*w,2*(i*w+w)))
-                    self.buffer[2*((y-h+i)*self.width+x): 2*((y-h+i)*self.width+x+w)] = glyph[2*i*w:2*(i*w+w)]      
+                super().blit(glyph, x, y-h)
+                self._touch(x, y-h, w, h)
                 # Fill in spacing
                 if spacing:
                     self.fill_rect(x, y - h - spacing, w, spacing, background)
@@ -1344,10 +1583,8 @@ class Display(framebuf.FrameBuffer):
                             break                
             else:
                 # portrait mode
-                # print("width: {:d}, height: {:.d}".format(w,h))
-                for i in range(h):
-                    #print("buf[{:03d} .. {:03d}] from letter[{:03d} .. {:03d}]".format(2*((y+i)*self.width+x),2*((y+i)*self.width+x+w),2*i*w,2*(i*w+w)))
-                    self.buffer[2*((y+i)*self.width+x): 2*((y+i)*self.width+x+w)] = glyph[2*i*w:2*(i*w+w)]
+                super().blit(glyph, x, y)
+                self._touch(x, y, w, h)
                 # Fill in spacing
                 if spacing:
                     self.fill_rect(x + w, y, spacing, h, background)
@@ -1364,22 +1601,164 @@ class Display(framebuf.FrameBuffer):
                             break
 
 
-    #def show(self):
-    #    buf = bytearray(2*self.width)
-    #    for i in range(self.height):
-    #        for j in range(self.width):
-    #            buf[2*j] = self.buffer[2*i*self.width+2*j+1]
-    #            buf[2*j+1] = self.buffer[2*i*self.width+2*j]         # swap the color bytes
-    #        self._setwindowloc(0,i,self.width,i) # the ith line
-    #        self.write_data(buf)
-    #    return
+    # frame buffer drawing methods
+    # The methods inherited from framebuf only modify the frame buffer. They are
+    # overridden here in order to record the area they touch such that show()
+    # only needs to transfer the modified parts to the display
+
+    def _touch(self, x, y, w, h):
+        '''Mark the frame buffer area x,y,w,h as modified.'''
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width) - 1
+        y1 = min(y + h, self.height) - 1
+        if x1 < x0 or y1 < y0:
+            return
+        dirty = self._dirty
+        for r in dirty:
+            # overlapping or adjacent areas are merged into a single rectangle
+            if x0 <= r[2] + 1 and r[0] <= x1 + 1 and y0 <= r[3] + 1 and r[1] <= y1 + 1:
+                if x0 < r[0]:
+                    r[0] = x0
+                if y0 < r[1]:
+                    r[1] = y0
+                if x1 > r[2]:
+                    r[2] = x1
+                if y1 > r[3]:
+                    r[3] = y1
+                return
+        dirty.append([x0, y0, x1, y1])
+        if len(dirty) > self.MAX_DIRTY:
+            self._merge_dirty()
+
+    def _merge_dirty(self):
+        '''Merge the two dirty rectangles whose bounding box adds the least area.'''
+        dirty = self._dirty
+        best = None
+        for i in range(len(dirty) - 1):
+            a = dirty[i]
+            area_a = (a[2] - a[0] + 1) * (a[3] - a[1] + 1)
+            for j in range(i + 1, len(dirty)):
+                b = dirty[j]
+                waste = ((max(a[2], b[2]) - min(a[0], b[0]) + 1) *
+                         (max(a[3], b[3]) - min(a[1], b[1]) + 1) - area_a -
+                         (b[2] - b[0] + 1) * (b[3] - b[1] + 1))
+                if best is None or waste < best:
+                    best = waste
+                    bi, bj = i, j
+        a = dirty[bi]
+        b = dirty.pop(bj)
+        a[0] = min(a[0], b[0])
+        a[1] = min(a[1], b[1])
+        a[2] = max(a[2], b[2])
+        a[3] = max(a[3], b[3])
+
+    def invalidate(self):
+        '''Mark the whole frame buffer as modified. The next show() transfers all of it.'''
+        self._dirty = [[0, 0, self.width - 1, self.height - 1]]
+
+    def fill(self, color):
+        super().fill(color)
+        self.invalidate()
+
+    def pixel(self, x, y, color=None):
+        if color is None:
+            return super().pixel(x, y)
+        super().pixel(x, y, color)
+        self._touch(x, y, 1, 1)
+
+    def hline(self, x, y, w, color):
+        super().hline(x, y, w, color)
+        self._touch(x, y, w, 1)
+
+    def vline(self, x, y, h, color):
+        super().vline(x, y, h, color)
+        self._touch(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, color):
+        super().line(x1, y1, x2, y2, color)
+        self._touch(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def rect(self, x, y, w, h, color):
+        super().rect(x, y, w, h, color)
+        self._touch(x, y, w, h)
+
+    def fill_rect(self, x, y, w, h, color):
+        super().fill_rect(x, y, w, h, color)
+        self._touch(x, y, w, h)
+
+    def scroll(self, xstep, ystep):
+        super().scroll(xstep, ystep)
+        self.invalidate()
+
+    def scroll_rect(self, x, y, w, h, xstep, ystep):
+        '''Scroll the area x,y,w,h of the frame buffer by xstep,ystep.
+        Pixels outside the area are not changed.'''
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        w = min(x + w, self.width) - x0
+        h = min(y + h, self.height) - y0
+        if w <= 0 or h <= 0 or abs(xstep) >= w or abs(ystep) >= h:
+            return
+        # The rows are moved one by one: a FrameBuffer on a slice starting at
+        # x0 would be too short for an area reaching the last row.
+        buf = memoryview(self.buffer)
+        stride = 2*self.width
+        n = 2*(w - abs(xstep))
+        dst = 2*(x0 + max(xstep, 0))
+        src = 2*(x0 - min(xstep, 0))
+        if ystep > 0:
+            rows = range(y0 + h - 1, y0 + ystep - 1, -1)
+        else:
+            rows = range(y0, y0 + h + ystep)
+        for row in rows:
+            d = row*stride + dst
+            s = (row - ystep)*stride + src
+            buf[d:d + n] = buf[s:s + n]
+        self._touch(x0, y0, w, h)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None, w=None, h=None):
+        '''Draw another frame buffer of size w,h. Only this area is marked
+        modified. A FrameBuffer does not know its size: if w or h is not given
+        the area up to the bottom right corner is marked modified.'''
+        if palette is None:
+            super().blit(fbuf, x, y, key)
+        else:
+            super().blit(fbuf, x, y, key, palette)
+        if w is None:
+            w = getattr(fbuf, 'width', self.width - x)
+        if h is None:
+            h = getattr(fbuf, 'height', self.height - y)
+        self._touch(x, y, w, h)
+
+    def blit_rect(self, fbuf, x, y, w, h, key=-1, palette=None):
+        '''Draw a frame buffer of known size w,h, same as blit() with w and h.'''
+        self.blit(fbuf, x, y, key, palette, w, h)
 
     def show(self):
-        row=bytearray(2*self.width)
-        for i in range(self.height):
-            self._setwindowloc(0,i,self.width,i) # the ith line
-            self.write_data(self.buffer[2*i*self.width : 2*i*self.width+2*self.width])
-        return
+        '''Transfer the modified areas of the frame buffer to the display.
+        Each rectangle needs a single window setup and is written in one
+        chip select cycle, rows are sent straight from the frame buffer.'''
+        if not self._dirty:
+            return
+        buf = memoryview(self.buffer)
+        stride = 2*self.width
+        for x0, y0, x1, y1 in self._dirty:
+            self._setwindowloc(x0, y0, x1, y1)
+            self.dc(1)
+            self.cs(0)
+            if x0 == 0 and x1 == self.width - 1:
+                # full width rectangles are contiguous in the frame buffer
+                self.spi.write(buf[y0*stride : (y1+1)*stride])
+            else:
+                start = y0*stride + 2*x0
+                end = start + 2*(x1 - x0 + 1)
+                for i in range(y1 - y0 + 1):
+                    self.spi.write(buf[start:end])
+                    start += stride
+                    end += stride
+            self.cs(1)
+        self._dirty = []
     
 
 if sys.platform == 'esp8266':
@@ -200,9 +200,24 @@ def seq():
         refresh(st7735)
         utime.sleep_ms(100)
 
+def seq_scroll():
+    print('Scrolling time sequence - 1000 samples, decimated to the graph width.')
+    refresh(st7735, True)  # Clear any prior image
+    g = CartesianGraph(wri, 2, 2, xorigin = 10, fgcolor=WHITE,
+                       gridcolor=LIGHTGREEN, bdcolor=False)
+    tsy = TSequence(g, YELLOW, 1000, scroll=True)
+    tsr = TSequence(g, RED, 1000, scroll=True)
+    for t in range(2000):
+        tsy.add(0.9*math.sin(t/50))
+        tsr.add(0.4*math.cos(t/50))
+        if not t % 10:
+            refresh(st7735)
+
 gc.collect()  # Precaution before instantiating framebuf
 seq()
 utime.sleep(5)
+seq_scroll()
+utime.sleep(5)
 liss()
 utime.sleep(5)
 rt_rect()
@@ -152,13 +152,30 @@ class PolarCurve(Curve): # Points are complex
         self.lastpoint = self.newpoint  # Scaled but not clipped
 
 
+# Time sequence. By default every add() replots all stored samples.
+# scroll=True: the graph area is scrolled left and only the newest segment is
+# drawn. Needs a device providing scroll_rect() (e.g. ST7735). All sequences
+# sharing a graph in this mode must have the same size and be added in step.
+# Several samples falling on the same pixel column are drawn as a vertical
+# min/max bar, so a sample costs O(1) whatever the size.
+# decimate=True: when replotting, samples sharing a pixel column are reduced to
+# their min/max so the number of draws is O(graph width) instead of O(size).
 class TSequence(Curve):
-    def __init__(self, graph, color, size, yorigin=0, yexc=1):
+    def __init__(self, graph, color, size, yorigin=0, yexc=1, scroll=False, decimate=False):
         super().__init__(graph, color, origin=(0, yorigin), excursion=(1, yexc))
         self.data = array('f', (0 for _ in range(size)))
         self.cur = 0
         self.size = size
         self.count = 0
+        self.decimate = decimate
+        self.scrolling = scroll
+        if scroll:
+            if not hasattr(graph.device, 'scroll_rect'):
+                raise ValueError('Scroll mode needs a device with scroll_rect().')
+            self.ticks = graph.ticks  # Samples added in scroll mode
+            self.lasty = None  # Pixel row of newest sample
+            self.ymin = 0  # Extent of the newest pixel column
+            self.ymax = 0
 
     def add(self, v):
         p = self.cur
@@ -168,6 +185,12 @@ class TSequence(Curve):
         self.cur %= size
         if self.count < size:
             self.count += 1
+        if self.scrolling:
+            self._scroll_add(v)
+            return
+        if self.decimate and self.count > self.graph.x_axis_len:
+            self._plot_decimated(p)
+            return
         x = 0
         dx = 1/size
         for _ in range(self.count):
@@ -177,6 +200,52 @@ class TSequence(Curve):
             p %= size
         self.point()
 
+    def _scroll_add(self, v):
+        graph = self.graph
+        dev = graph.device
+        y = graph.ypixel(self._scale(0, v)[1])
+        self.ticks += 1
+        shift = graph.scroll_to(self.ticks, self.size)
+        x = graph.xe
+        if self.lasty is None:
+            dev.pixel(x, y, self.color)
+            self.ymin = self.ymax = y
+        elif shift:  # New pixel column
+            dev.line(x - shift, self.lasty, x, y, self.color)
+            self.ymin = self.ymax = y
+        else:  # Same pixel column: extend the min/max bar
+            self.ymin = min(self.ymin, y)
+            self.ymax = max(self.ymax, y)
+            dev.vline(x, self.ymin, self.ymax - self.ymin + 1, self.color)
+        self.lasty = y
+
+    def _plot_decimated(self, p):
+        graph = self.graph
+        dev = graph.device
+        color = self.color
+        size = self.size
+        xo = graph.xpixel(0)
+        dx = graph.x_axis_len / size
+        col = None
+        for n in range(self.count):
+            y = graph.ypixel(self._scale(0, self.data[p])[1])
+            x = round(xo - n * dx)
+            if x < graph.x0:  # Older samples are off the graph
+                break
+            if x != col:
+                if col is not None:
+                    dev.vline(col, ymin, ymax - ymin + 1, color)
+                    dev.line(col, lasty, x, y, color)
+                col = x
+                ymin = ymax = y
+            else:
+                ymin = min(ymin, y)
+                ymax = max(ymax, y)
+            lasty = y
+            p -= 1
+            p %= size
+        dev.vline(col, ymin, ymax - ymin + 1, color)
+
 
 class Graph(DObject):
     def __init__(self, writer, row, col, height, width, fgcolor, bgcolor, bdcolor, gridcolor):
@@ -205,10 +274,17 @@ class CartesianGraph(Graph):
         self.yp_origin = self.y0 + (ydivs - yorigin) * height / ydivs
         self.xorigin = xorigin
         self.yorigin = yorigin
+        # Scrolling TSequence support: the data area ends left of the y axis
+        self.xe = min(round(self.xp_origin), self.x1) - 1  # Column of newest sample
+        self.ticks = 0  # Samples scrolled in
+        self._xacc = 0  # Fraction of a pixel not yet scrolled
+        self._xshift = 0  # Pixels scrolled by the latest sample
+        self._xphase = 0  # Pixels scrolled modulo graph width (moves the x grid)
         self.show()
 
     def show(self):
         super().show()  # Clear working area
+        self._xphase = 0
         ssd = self.device
         x0 = self.x0
         x1 = self.x1
@@ -236,6 +312,52 @@ class CartesianGraph(Graph):
         ye = round(self.yp_origin - end[1] * self.y_axis_len)
         self.device.line(xs, ys, xe, ye, color)
 
+    # Pixel coordinates of scaled (-1 .. 0 .. +1) values, rows clipped to the graph
+    def xpixel(self, x):
+        return round(self.xp_origin + x * self.x_axis_len)
+
+    def ypixel(self, y):
+        return max(self.y0, min(self.y1, round(self.yp_origin - y * self.y_axis_len)))
+
+    # Called by scrolling TSequence instances. The first sequence adding sample
+    # number ticks scrolls the data area, the others draw into it.
+    # Returns the number of pixels scrolled for that sample.
+    def scroll_to(self, ticks, size):
+        if ticks > self.ticks:
+            self._xacc += (ticks - self.ticks) * self.x_axis_len / size
+            self.ticks = ticks
+            self._xshift = int(self._xacc)
+            self._xacc -= self._xshift
+            if self._xshift:
+                self._scroll(self._xshift)
+        return self._xshift
+
+    # Scroll the data area left by n pixels and repaint the uncovered strip
+    def _scroll(self, n):
+        dev = self.device
+        xs = self.x0 + 1  # Left border and y axis are not scrolled
+        xe = self.xe
+        ys = self.y0 + 1
+        h = self.y1 - self.y0 - 1
+        n = min(n, xe - xs + 1)
+        if n <= 0:
+            return
+        dev.scroll_rect(xs, ys, xe - xs + 1, h, -n, 0)
+        x = xe - n + 1
+        dev.fill_rect(x, ys, n, h, self.bgcolor)
+        if self.ydivs > 0:
+            dy = self.height / (self.ydivs)
+            for line in range(1, self.ydivs):
+                color = self.fgcolor if line == self.yorigin else self.gridcolor
+                dev.hline(x, round(self.y1 - dy * line), n, color)
+        if self.xdivs > 0:  # x grid lines move with the data
+            self._xphase = (self._xphase + n) % self.width
+            dx = self.width / self.xdivs
+            for line in range(int((x - self.x0 + self._xphase) / dx), int((xe - self.x0 + self._xphase) / dx) + 1):
+                xpos = round(self.x0 + dx * line - self._xphase)
+                if x <= xpos <= xe:
+                    dev.vline(xpos, ys, h, self.gridcolor)
+
 class PolarGraph(Graph):
     def __init__(self, writer, row, col, *, height=90, fgcolor=None, bgcolor=None, bdcolor=None,
                  gridcolor=None, adivs=3, rdivs=4):
@@ -32,7 +32,16 @@
 # Using CWriter's slow rendering: _printchar 9.5ms typ, 13.5ms max.
 # Using Writer's fast rendering: _printchar 115μs min 480μs typ 950μs max.
 
+# With glyph caching (the default) the FrameBuffer of each glyph is built once
+# per font and reused by all writers, character widths are kept in an array.
+# Printing a string then does not allocate. Inversion and colour rendering
+# use a blit palette where the firmware supports it, so CWriter blits too
+# unless the display is upside down. alloc_test() reports the heap use,
+# cache_test() compares the cached with the original rendering.
+
 import framebuf
+import gc
+from array import array
 
 class DisplayState():
     def __init__(self):
@@ -40,6 +49,113 @@ class DisplayState():
         self.text_col = 0
         self.usd = False
 
+# Check if FrameBuffer.blit() accepts a palette (MicroPython >= 1.20)
+def _has_palette():
+    fb = framebuf.FrameBuffer(bytearray(2), 1, 1, framebuf.RGB565)
+    palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+    try:
+        fb.blit(fb, 0, 0, -1, palette)
+    except TypeError:
+        return False
+    return True
+
+_PALETTE = _has_palette()
+
+# Glyphs of a font rendered into FrameBuffers, shared by all writers using the font
+class GlyphSet():
+    sets = {}  # Index (font, map), value is the GlyphSet
+
+    @classmethod
+    def get(cls, font, fmap):
+        key = (font, fmap)
+        if key not in cls.sets:
+            cls.sets[key] = cls(font, fmap)
+        return cls.sets[key]
+
+    def __init__(self, font, fmap):
+        self.font = font
+        self.map = fmap
+        self.min_ch = font.min_ch()
+        nchars = font.max_ch() - self.min_ch + 1
+        self.widths = array('B', (font.get_ch(chr(self.min_ch + n))[2] for n in range(nchars)))
+        self.glyphs = {}  # Index char, value (FrameBuffer, glyph buffer, height, width)
+        self.inverted = {}  # Inverted FrameBuffers if blit has no palette
+
+    def charlen(self, char):
+        n = ord(char) - self.min_ch
+        if 0 <= n < len(self.widths):
+            return self.widths[n]
+        return self.font.get_ch(char)[2]  # Font's default character
+
+    def glyph(self, char):
+        g = self.glyphs.get(char)
+        if g is None:
+            data, char_height, char_width = self.font.get_ch(char)
+            buf = bytearray(data)
+            fbc = framebuf.FrameBuffer(buf, char_width, char_height, self.map)
+            g = (fbc, buf, char_height, char_width)
+            self.glyphs[char] = g
+        return g
+
+    def inverse(self, char):  # Only used if blit has no palette
+        fbc = self.inverted.get(char)
+        if fbc is None:
+            _, buf, char_height, char_width = self.glyph(char)
+            buf = bytearray(buf)
+            for i, v in enumerate(buf):
+                buf[i] = 0xFF & ~ v
+            fbc = framebuf.FrameBuffer(buf, char_width, char_height, self.map)
+            self.inverted[char] = fbc
+        return fbc
+
+# Print each string and report the heap allocated while printing it (gc.mem_alloc()
+# delta). Intended to check that label and meter updates do not churn the heap.
+def alloc_test(writer, strings, invert=False, verbose=True):
+    deltas = []
+    for string in strings:
+        gc.collect()
+        start = gc.mem_alloc()
+        writer.printstring(string, invert)
+        delta = gc.mem_alloc() - start
+        deltas.append(delta)
+        if verbose:
+            print('{!r}: {} bytes allocated'.format(string, delta))
+    return deltas
+
+# Frame buffer in memory standing in for a display
+class _TestDevice(framebuf.FrameBuffer):
+    def __init__(self, width, height, fmap):
+        self.width = width
+        self.height = height
+        if fmap == framebuf.RGB565:
+            self.buffer = bytearray(2 * width * height)
+        else:
+            self.buffer = bytearray((width + 7) // 8 * height)
+        super().__init__(self.buffer, width, height, fmap)
+
+# Check that the cached glyphs are rendered exactly like the original code:
+# the strings are printed with and without cache into two frame buffers, by
+# Writer on a monochrome and CWriter on a colour buffer, normal and inverted.
+def cache_test(font, strings, fgcolor=0xffff, bgcolor=0, width=128, height=64, verbose=True):
+    ok = True
+    for cls, fmap in ((Writer, framebuf.MONO_HLSB), (CWriter, framebuf.RGB565)):
+        for invert in (False, True):
+            buffers = []
+            for cache in (True, False):
+                device = _TestDevice(width, height, fmap)
+                writer = cls(device, font, verbose=False, cache=cache)
+                if cls is CWriter:
+                    writer.setcolor(fgcolor, bgcolor)
+                Writer.set_textpos(device, 0, 0)
+                for string in strings:
+                    writer.printstring(string, invert)
+                buffers.append(device.buffer)
+            same = buffers[0] == buffers[1]
+            if verbose:
+                print('{} invert={}: {}'.format(cls.__name__, invert, 'same pixels' if same else 'DIFFERENT'))
+            ok = ok and same
+    return ok
+
 def _get_id(device):
     if not isinstance(device, framebuf.FrameBuffer):
         raise ValueError('Device must be derived from FrameBuffer.')
@@ -66,7 +182,7 @@ class Writer():
             s.text_col = device.width -1 - col if s.usd else col
         return s.text_row,  s.text_col
 
-    def __init__(self, device, font, verbose=True):
+    def __init__(self, device, font, verbose=True, cache=True):
         self.devid = _get_id(device)
         self.device = device
         if self.devid not in Writer.state:
@@ -94,8 +210,15 @@ class Writer():
         self.tab = 4
 
         self.glyph = None  # Current char
+        self.glyph_fb = None  # FrameBuffer of current char (cached glyphs only)
         self.char_height = 0
         self.char_width = 0
+        # Glyph cache, None for the original rendering
+        self.glyphset = GlyphSet.get(font, self.map) if cache else None
+        # blit palette, index 0: glyph background, 1: glyph foreground
+        self.palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565) if _PALETTE else None
+        # Devices tracking modified areas (ST7735) are told the glyph size
+        self._blit_rect = getattr(device, 'blit_rect', None)
 
     def _getstate(self):
         return Writer.state[self.devid]
@@ -136,6 +259,10 @@ class Writer():
 
     def printstring(self, string, invert=False):
         # word wrapping. Assumes words separated by single space.
+        if '\n' not in string:  # Avoid allocating by split()
+            if string:
+                self._printline(string, invert)
+            return
         while True:
             lines = string.split('\n', 1)
             s = lines[0]
@@ -174,6 +301,8 @@ class Writer():
     def _charlen(self, char):
         if char == '\n':
             char_width = 0
+        elif self.glyphset is not None:
+            char_width = self.glyphset.charlen(char)
         else:
             _, _, char_width = self.font.get_ch(char)
         return char_width
@@ -196,7 +325,10 @@ class Writer():
         if char == '\n':
             self._newline()
             return
-        glyph, char_height, char_width = self.font.get_ch(char)
+        if self.glyphset is not None:
+            self.glyph_fb, glyph, char_height, char_width = self.glyphset.glyph(char)
+        else:
+            glyph, char_height, char_width = self.font.get_ch(char)
         s = self._getstate()
         if self.usd:
             if s.text_row - char_height < 0:
@@ -229,15 +361,35 @@ class Writer():
         self._get_char(char, recurse)
         if self.glyph is None:
             return  # All done
-        buf = bytearray(self.glyph)
-        if invert:
-            for i, v in enumerate(buf):
-                buf[i] = 0xFF & ~ v
-        fbc = framebuf.FrameBuffer(buf, self.char_width, self.char_height, self.map)
-        self.device.blit(fbc, s.text_col, s.text_row)
+        if self.glyphset is not None:
+            palette = None
+            fbc = self.glyph_fb
+            if invert:
+                if self.palette is not None:
+                    palette = self.palette
+                    palette.pixel(0, 0, 1)
+                    palette.pixel(1, 0, 0)
+                else:
+                    fbc = self.glyphset.inverse(char)
+            self._blit(fbc, s.text_col, s.text_row, palette)
+        else:
+            buf = bytearray(self.glyph)
+            if invert:
+                for i, v in enumerate(buf):
+                    buf[i] = 0xFF & ~ v
+            fbc = framebuf.FrameBuffer(buf, self.char_width, self.char_height, self.map)
+            self._blit(fbc, s.text_col, s.text_row, None)
         s.text_col += self.char_width
         self.cpos += 1
 
+    def _blit(self, fbc, col, row, palette):
+        if self._blit_rect is not None:
+            self._blit_rect(fbc, col, row, self.char_width, self.char_height, -1, palette)
+        elif palette is None:
+            self.device.blit(fbc, col, row)
+        else:
+            self.device.blit(fbc, col, row, -1, palette)
+
     def tabsize(self, value=None):
         if value is not None:
             self.tab = value
@@ -256,8 +408,8 @@ class CWriter(Writer):
             Writer.state[devid] = DisplayState()
         Writer.state[devid].usd = value
 
-    def __init__(self, device, font, fgcolor=None, bgcolor=None, verbose=True):
-        super().__init__(device, font, verbose)
+    def __init__(self, device, font, fgcolor=None, bgcolor=None, verbose=True, cache=True):
+        super().__init__(device, font, verbose, cache)
         if bgcolor is not None:  # Assume monochrome.
             self.bgcolor = bgcolor
         if fgcolor is not None:
@@ -284,12 +436,21 @@ class CWriter(Writer):
         char_height = self.char_height
         char_width = self.char_width
         # print("glyph width: {:d}, height: {:d}".format(char_width,char_height))
-        div, mod = divmod(char_width, 8)
-        gbytes = div + 1 if mod else div  # No. of bytes per row of glyph
-        device = self.device
         fgcolor = self.bgcolor if invert else self.fgcolor
         bgcolor = self.fgcolor if invert else self.bgcolor
         usd = self.usd
+        if self.glyph_fb is not None and self.palette is not None and not usd:
+            # Fast rendering: blit the cached glyph mapping its bits to the colors
+            palette = self.palette
+            palette.pixel(0, 0, bgcolor)
+            palette.pixel(1, 0, fgcolor)
+            self._blit(self.glyph_fb, s.text_col, s.text_row, palette)
+            s.text_col += char_width
+            self.cpos += 1
+            return
+        div, mod = divmod(char_width, 8)
+        gbytes = div + 1 if mod else div  # No. of bytes per row of glyph
+        device = self.device
         drow = s.text_row  # Destination row
         wcol = s.text_col  # Destination column of character start
         for srow in range(char_height):  # Source row
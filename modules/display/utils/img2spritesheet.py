@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Utility to combine images into a RGB565 sprite sheet.
+
+The sprite sheet is read by the SpriteSheet class of the ST7735 driver.
+Each frame can be drawn directly, the driver seeks to its offset in the
+file using the index stored in the header.
+"""
+
+from PIL import Image
+from struct import pack
+from os import path
+import sys
+
+from img2rgb565 import error, write_bin
+
+MAGIC = b'SPSH'
+HEADER_SIZE = 8
+INDEX_ENTRY_SIZE = 8
+
+
+def split_strip(img, frame_height):
+    """Split a vertical strip of frames into single images."""
+    w, h = img.size
+    if h % frame_height:
+        error('Image height {0} is not a multiple of {1}'.format(h, frame_height))
+    return [img.crop((0, y, w, y + frame_height))
+            for y in range(0, h, frame_height)]
+
+
+def write_sheet(out_path, frames):
+    """Save the frames as sprite sheet with an index header."""
+    offset = HEADER_SIZE + INDEX_ENTRY_SIZE * len(frames)
+    with open(out_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(pack('<HH', len(frames), 0))
+        for frame in frames:
+            w, h = frame.size
+            f.write(pack('<IHH', offset, w, h))
+            offset += w * h * 2
+        for frame in frames:
+            write_bin(f, list(frame.getdata()))
+
+
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) < 3:
+        error('Usage: ./img2spritesheet.py out.sheet frame1.png [frame2.png ...]\n'
+              '   or: ./img2spritesheet.py out.sheet strip.png frame_height')
+    out_path = args[1]
+    in_paths = args[2:]
+    frame_height = None
+    if len(in_paths) == 2 and in_paths[1].isdigit():
+        frame_height = int(in_paths[1])
+        in_paths = in_paths[:1]
+    for in_path in in_paths:
+        if not path.exists(in_path):
+            error('File Not Found: ' + in_path)
+
+    frames = [Image.open(p).convert('RGB') for p in in_paths]
+    if frame_height:
+        frames = split_strip(frames[0], frame_height)
+    write_sheet(out_path, frames)
+    print('Saved {0} frames: {1}'.format(len(frames), out_path))
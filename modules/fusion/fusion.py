@@ -0,0 +1,314 @@
+# fusion.py: attitude estimation from accelerometer, gyroscope and optionally
+# magnetometer samples
+# The orientation is kept as a quaternion and updated either with a
+# complementary filter (gyro integration with a proportional correction
+# towards the measured gravity and magnetic field, Mahony) or with the
+# Madgwick gradient descent filter.
+# The raw samples are consumed in batches, in the frame layout produced by
+# the MPU6050 FIFO: ax,ay,az,gx,gy,gz (or ax,ay,az,temp,gx,gy,gz), see
+# MPU6050.startFIFOStream() and fifoStream(). The magnetometer is much
+# slower: its latest value is passed with setMag() and used for all frames.
+# It must be mounted with its axes aligned to the ones of the IMU.
+# The state lives in preallocated float arrays, no lists or tuples are
+# created per sample, and the filter loops are compiled with the native
+# code emitter. Remove the @micropython.native decorators on ports built
+# without it. Yaw, pitch and roll are only computed at the output rate.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+import micropython
+from array import array
+from math import sqrt,atan2,asin,pi
+
+COMPLEMENTARY = 0
+MADGWICK      = 1
+
+RAD_TO_DEG = 180 / pi
+
+@micropython.native
+def complementaryBatch(q,samples,start,frames,stride,gyroScale,dt,kp,mag):
+    q0 = q[0]
+    q1 = q[1]
+    q2 = q[2]
+    q3 = q[3]
+    useMag = mag[0] != 0.0
+    mx = mag[1]
+    my = mag[2]
+    mz = mag[3]
+    halfDt = 0.5 * dt
+    index = start * stride
+    for _ in range(frames):
+        ax = float(samples[index])
+        ay = float(samples[index+1])
+        az = float(samples[index+2])
+        gx = samples[index+stride-3] * gyroScale
+        gy = samples[index+stride-2] * gyroScale
+        gz = samples[index+stride-1] * gyroScale
+        index += stride
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            # estimated direction of gravity
+            vx = q1 * q3 - q0 * q2
+            vy = q0 * q1 + q2 * q3
+            vz = q0 * q0 - 0.5 + q3 * q3
+            # error: cross product between measured and estimated direction
+            ex = ay * vz - az * vy
+            ey = az * vx - ax * vz
+            ez = ax * vy - ay * vx
+            if useMag:
+                # reference direction of the earth magnetic field
+                hx = 2.0 * (mx * (0.5 - q2 * q2 - q3 * q3) + my * (q1 * q2 - q0 * q3) + mz * (q1 * q3 + q0 * q2))
+                hy = 2.0 * (mx * (q1 * q2 + q0 * q3) + my * (0.5 - q1 * q1 - q3 * q3) + mz * (q2 * q3 - q0 * q1))
+                bx = sqrt(hx * hx + hy * hy)
+                bz = 2.0 * (mx * (q1 * q3 - q0 * q2) + my * (q2 * q3 + q0 * q1) + mz * (0.5 - q1 * q1 - q2 * q2))
+                # estimated direction of the magnetic field
+                wx = bx * (0.5 - q2 * q2 - q3 * q3) + bz * (q1 * q3 - q0 * q2)
+                wy = bx * (q1 * q2 - q0 * q3) + bz * (q0 * q1 + q2 * q3)
+                wz = bx * (q0 * q2 + q1 * q3) + bz * (0.5 - q1 * q1 - q2 * q2)
+                ex += my * wz - mz * wy
+                ey += mz * wx - mx * wz
+                ez += mx * wy - my * wx
+            gx += kp * ex
+            gy += kp * ey
+            gz += kp * ez
+        # integrate the rate of change of the quaternion
+        gx *= halfDt
+        gy *= halfDt
+        gz *= halfDt
+        qa = q0
+        qb = q1
+        qc = q2
+        q0 += -qb * gx - qc * gy - q3 * gz
+        q1 += qa * gx + qc * gz - q3 * gy
+        q2 += qa * gy - qb * gz + q3 * gx
+        q3 += qa * gz + qb * gy - qc * gx
+        norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0 /= norm
+        q1 /= norm
+        q2 /= norm
+        q3 /= norm
+    q[0] = q0
+    q[1] = q1
+    q[2] = q2
+    q[3] = q3
+
+@micropython.native
+def madgwickBatch(q,samples,start,frames,stride,gyroScale,dt,beta,mag):
+    q0 = q[0]
+    q1 = q[1]
+    q2 = q[2]
+    q3 = q[3]
+    useMag = mag[0] != 0.0
+    mx = mag[1]
+    my = mag[2]
+    mz = mag[3]
+    index = start * stride
+    for _ in range(frames):
+        ax = float(samples[index])
+        ay = float(samples[index+1])
+        az = float(samples[index+2])
+        gx = samples[index+stride-3] * gyroScale
+        gy = samples[index+stride-2] * gyroScale
+        gz = samples[index+stride-1] * gyroScale
+        index += stride
+        # rate of change of the quaternion from the gyroscope
+        qDot1 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qDot2 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qDot3 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qDot4 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+        norm = sqrt(ax * ax + ay * ay + az * az)
+        if norm > 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            if useMag:
+                _2q0mx = 2.0 * q0 * mx
+                _2q0my = 2.0 * q0 * my
+                _2q0mz = 2.0 * q0 * mz
+                _2q1mx = 2.0 * q1 * mx
+                _2q0 = 2.0 * q0
+                _2q1 = 2.0 * q1
+                _2q2 = 2.0 * q2
+                _2q3 = 2.0 * q3
+                _2q0q2 = 2.0 * q0 * q2
+                _2q2q3 = 2.0 * q2 * q3
+                q0q0 = q0 * q0
+                q0q1 = q0 * q1
+                q0q2 = q0 * q2
+                q0q3 = q0 * q3
+                q1q1 = q1 * q1
+                q1q2 = q1 * q2
+                q1q3 = q1 * q3
+                q2q2 = q2 * q2
+                q2q3 = q2 * q3
+                q3q3 = q3 * q3
+                # reference direction of the earth magnetic field
+                hx = mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3 - mx * q2q2 - mx * q3q3
+                hy = _2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2 + _2q2 * mz * q3 - my * q3q3
+                _2bx = sqrt(hx * hx + hy * hy)
+                _2bz = -_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3 - mz * q2q2 + mz * q3q3
+                _4bx = 2.0 * _2bx
+                _4bz = 2.0 * _2bz
+                # gradient descent corrective step
+                s0 = (-_2q2 * (2.0 * q1q3 - _2q0q2 - ax) + _2q1 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - _2bz * q2 * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (-_2bx * q3 + _2bz * q1) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + _2bx * q2 * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s1 = (_2q3 * (2.0 * q1q3 - _2q0q2 - ax) + _2q0 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - 4.0 * q1 * (1 - 2.0 * q1q1 - 2.0 * q2q2 - az)
+                      + _2bz * q3 * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (_2bx * q2 + _2bz * q0) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + (_2bx * q3 - _4bz * q1) * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s2 = (-_2q0 * (2.0 * q1q3 - _2q0q2 - ax) + _2q3 * (2.0 * q0q1 + _2q2q3 - ay)
+                      - 4.0 * q2 * (1 - 2.0 * q1q1 - 2.0 * q2q2 - az)
+                      + (-_4bx * q2 - _2bz * q0) * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (_2bx * q1 + _2bz * q3) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + (_2bx * q0 - _4bz * q2) * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+                s3 = (_2q1 * (2.0 * q1q3 - _2q0q2 - ax) + _2q2 * (2.0 * q0q1 + _2q2q3 - ay)
+                      + (-_4bx * q3 + _2bz * q1) * (_2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx)
+                      + (-_2bx * q0 + _2bz * q2) * (_2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my)
+                      + _2bx * q1 * (_2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz))
+            else:
+                _2q0 = 2.0 * q0
+                _2q1 = 2.0 * q1
+                _2q2 = 2.0 * q2
+                _2q3 = 2.0 * q3
+                _4q0 = 4.0 * q0
+                _4q1 = 4.0 * q1
+                _4q2 = 4.0 * q2
+                _8q1 = 8.0 * q1
+                _8q2 = 8.0 * q2
+                q0q0 = q0 * q0
+                q1q1 = q1 * q1
+                q2q2 = q2 * q2
+                q3q3 = q3 * q3
+                # gradient descent corrective step
+                s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+                s1 = _4q1 * q3q3 - _2q3 * ax + 4.0 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az
+                s2 = 4.0 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az
+                s3 = 4.0 * q1q1 * q3 - _2q1 * ax + 4.0 * q2q2 * q3 - _2q2 * ay
+            norm = sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm > 0.0:
+                qDot1 -= beta * s0 / norm
+                qDot2 -= beta * s1 / norm
+                qDot3 -= beta * s2 / norm
+                qDot4 -= beta * s3 / norm
+        q0 += qDot1 * dt
+        q1 += qDot2 * dt
+        q2 += qDot3 * dt
+        q3 += qDot4 * dt
+        norm = sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0 /= norm
+        q1 /= norm
+        q2 /= norm
+        q3 /= norm
+    q[0] = q0
+    q[1] = q1
+    q[2] = q2
+    q[3] = q3
+
+class Fusion:
+    def __init__(self,rate=200,outputRate=10,mode=MADGWICK,beta=0.1,kp=2.0,gyroLSB=131.0,stride=6):
+        # rate: sample rate of the IMU in Hz
+        # outputRate: rate at which yaw, pitch and roll are computed
+        # mode: COMPLEMENTARY or MADGWICK
+        # beta: Madgwick filter gain, kp: complementary filter gain
+        # gyroLSB: gyroscope LSBs per deg/s, 131 at +-250 deg/s, 65.5, 32.8, 16.4
+        # stride: values per frame, 6 or 7 if the temperature is in the FIFO
+        if mode != COMPLEMENTARY and mode != MADGWICK:
+            raise ValueError("mode must be COMPLEMENTARY or MADGWICK")
+        self.mode = mode
+        self.beta = beta
+        self.kp = kp
+        self.stride = stride
+        self.gyroScale = pi / 180 / gyroLSB    # raw gyro values to rad/s
+        self.q = array('f',[1.0,0.0,0.0,0.0])
+        self.ypr = array('f',[0.0,0.0,0.0])
+        self.mag = array('f',[0.0,0.0,0.0,0.0])  # valid flag, normalized mx,my,mz
+        self.one = array('h',[0] * stride)      # single sample for updateMotion6
+        self.setRate(rate,outputRate)
+
+    def setRate(self,rate,outputRate=None):
+        self.rate = rate
+        self.dt = 1.0 / rate
+        if outputRate is not None:
+            self.outputRate = outputRate
+        self.decimation = max(1,rate // self.outputRate)
+        self.pending = 0                # samples since the last output
+
+    def setMode(self,mode):
+        self.mode = mode
+
+    def setBeta(self,beta):
+        self.beta = beta
+
+    def setKp(self,kp):
+        self.kp = kp
+
+    def reset(self):
+        self.q[0] = 1.0
+        self.q[1] = self.q[2] = self.q[3] = 0.0
+        self.pending = 0
+
+    def setMag(self,mx,my,mz):
+        # latest magnetometer reading, any unit, axes aligned with the IMU
+        norm = sqrt(mx * mx + my * my + mz * mz)
+        if norm == 0:
+            return
+        mag = self.mag
+        mag[1] = mx / norm
+        mag[2] = my / norm
+        mag[3] = mz / norm
+        mag[0] = 1.0
+
+    def clearMag(self):
+        self.mag[0] = 0.0
+
+    def update(self,samples,frames,start=0):
+        # run the filter over frames raw samples starting at frame start
+        # returns True when new yaw, pitch and roll values are available
+        if self.mode == MADGWICK:
+            madgwickBatch(self.q,samples,start,frames,self.stride,self.gyroScale,self.dt,self.beta,self.mag)
+        else:
+            complementaryBatch(self.q,samples,start,frames,self.stride,self.gyroScale,self.dt,self.kp,self.mag)
+        self.pending += frames
+        if self.pending < self.decimation:
+            return False
+        self.pending %= self.decimation
+        self.computeYawPitchRoll()
+        return True
+
+    def updateMotion6(self,ax,ay,az,gx,gy,gz):
+        # single sample, e.g. from MPU6050.getMotion6()
+        one = self.one
+        one[0] = ax
+        one[1] = ay
+        one[2] = az
+        one[self.stride-3] = gx
+        one[self.stride-2] = gy
+        one[self.stride-1] = gz
+        return self.update(one,1)
+
+    def computeYawPitchRoll(self):
+        q0,q1,q2,q3 = self.q
+        ypr = self.ypr
+        ypr[0] = atan2(2.0 * (q0 * q3 + q1 * q2),1.0 - 2.0 * (q2 * q2 + q3 * q3))
+        sinPitch = 2.0 * (q0 * q2 - q3 * q1)
+        if sinPitch > 1.0:
+            sinPitch = 1.0
+        elif sinPitch < -1.0:
+            sinPitch = -1.0
+        ypr[1] = asin(sinPitch)
+        ypr[2] = atan2(2.0 * (q0 * q1 + q2 * q3),1.0 - 2.0 * (q1 * q1 + q2 * q2))
+
+    def getQuaternion(self):
+        return tuple(self.q)
+
+    def getYawPitchRoll(self):
+        # in degrees, as computed at the last output
+        ypr = self.ypr
+        return (ypr[0] * RAD_TO_DEG,ypr[1] * RAD_TO_DEG,ypr[2] * RAD_TO_DEG)
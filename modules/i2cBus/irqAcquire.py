@@ -0,0 +1,111 @@
+# irqAcquire.py: interrupt driven acquisition shared by the I2C sensor drivers
+# (ADXL345, HMC5883, QMC5883)
+# ScheduledIrq connects the data ready or FIFO interrupt line of a device to
+# a handler doing the I2C transfer. The interrupt handler cannot access the
+# bus, it only schedules the transfer. When the schedule queue is full the
+# request is remembered and poll(), called by the consumer, does the
+# transfer later. Devices holding their interrupt line asserted until the
+# data are read (ADXL345 INT1, QMC5883 DRDY) never produce another edge after
+# a lost request: poll() therefore also runs the handler while the line is
+# still at its active level.
+# MovingAverage keeps the last samples of a 3 axis sensor in a ring with the
+# running sums over the ring, such that the average is available at any
+# time without summing up the ring.
+# Copy this file to the device together with the driver using it.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+from machine import Pin
+from micropython import schedule
+from array import array
+
+class ScheduledIrq:
+    def __init__(self,pin,handler,trigger=Pin.IRQ_RISING,active=None):
+        # pin: the Pin object connected to the interrupt line
+        # handler: called with a single argument from the scheduler
+        # trigger: the edge signalling new data
+        # active: level of the line while data are waiting to be read,
+        #         None for lines sending pulses
+        self.pin = pin
+        self.handler = handler
+        self.trigger = trigger
+        self.active = active
+        self.pending = False            # a transfer is queued or running
+        self.missed = False             # the schedule queue was full
+        self.missedCount = 0
+        self.runRef = self.run          # bound method allocated once, used from the ISR
+        pin.irq(trigger=trigger,handler=self.irqHandler)
+
+    def irqHandler(self,pin):
+        # interrupt context: defer the I2C transfer to the scheduler
+        if self.pending:                # the transfer queued or running reads the new data
+            return
+        try:
+            schedule(self.runRef,None)
+            self.pending = True
+        except RuntimeError:
+            self.missed = True
+            self.missedCount += 1
+
+    def run(self,arg=None):
+        # no second transfer is scheduled while the handler accesses the bus
+        self.pending = True
+        self.missed = False
+        try:
+            self.handler(arg)
+        finally:
+            self.pending = False
+
+    def poll(self):
+        # recover from a transfer the scheduler could not take
+        # returns True if the handler was run
+        if self.pending:
+            return False
+        if self.missed or (self.active is not None and self.pin.value() == self.active):
+            self.run()
+            return True
+        return False
+
+    def deinit(self):
+        self.pin.irq(trigger=self.trigger,handler=None)
+        self.pending = self.missed = False
+
+class MovingAverage:
+    def __init__(self,size):
+        # size: number of (x,y,z) samples averaged
+        if size < 1:
+            raise ValueError("the moving average needs at least 1 sample")
+        self.size = size
+        self.ring = array('h',[0] * (3 * size))
+        self.index = 0
+        self.sums = [0,0,0]
+        self.filled = 0                 # number of valid samples in the ring
+        self.samples = 0                # samples added since the creation
+
+    def add(self,x,y,z):
+        ring = self.ring
+        sums = self.sums
+        i = self.index
+        # replace the oldest sample in the running sums
+        sums[0] += x - ring[i]
+        sums[1] += y - ring[i+1]
+        sums[2] += z - ring[i+2]
+        ring[i] = x
+        ring[i+1] = y
+        ring[i+2] = z
+        i += 3
+        if i == len(ring):
+            i = 0
+        self.index = i
+        if self.filled < self.size:
+            self.filled += 1
+        self.samples += 1
+
+    def average(self):
+        # (x,y,z) averaged over the valid samples, None if there are none
+        n = self.filled
+        if not n:
+            return None
+        sums = self.sums
+        return (sums[0]/n,sums[1]/n,sums[2]/n)
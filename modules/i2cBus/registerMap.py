@@ -0,0 +1,107 @@
+# registerMap.py: register access layer shared by the I2C sensor drivers
+# (ADXL345, HMC5883, MPU6050)
+# It keeps a write-through shadow copy of the configuration registers of a
+# device. Bit field reads of these registers are served from memory and bit
+# field writes no longer need a read-modify-write cycle on the bus.
+# Registers not declared as configuration registers (status, data, FIFO,
+# registers with self clearing bits) are volatile: they are never cached and
+# always read from the device.
+# Contiguous register blocks are read in a single burst into buffers
+# preallocated by the caller.
+# Copy this file to the device together with the driver using it.
+# Copyright U. Raich
+# Released under the MIT license
+# This program is part of the IoT course at the University of Cape Coast, Ghana
+
+class RegisterMap:
+    def __init__(self,i2c,address,cached=(),debug=False):
+        # i2c: the I2C bus object
+        # address: the I2C address of the device
+        # cached: addresses of the configuration registers to be shadowed
+        self.i2c = i2c
+        self.address = address
+        self.debug = debug
+        self.shadow = bytearray(256)   # register contents
+        self.cached = bytearray(256)   # 1 for configuration registers
+        self.valid = bytearray(256)    # 1 if shadow holds the register contents
+        for register in cached:
+            self.cached[register] = 1
+        self.buf = bytearray(1)
+        # number of bus transactions, for statistics
+        self.reads = 0
+        self.writes = 0
+
+    def readReg(self,register):
+        if self.valid[register]:
+            return self.shadow[register]
+        self.i2c.readfrom_mem_into(self.address,register,self.buf)
+        self.reads += 1
+        value = self.buf[0]
+        if self.cached[register]:
+            self.shadow[register] = value
+            self.valid[register] = 1
+        if self.debug:
+            print("readReg: read 0x{:02x} from register 0x{:02x}".format(value,register))
+        return value
+
+    def writeReg(self,register,value):
+        value &= 0xff
+        self.buf[0] = value
+        self.i2c.writeto_mem(self.address,register,self.buf)
+        self.writes += 1
+        if self.cached[register]:
+            self.shadow[register] = value
+            self.valid[register] = 1
+        if self.debug:
+            print("writeReg: wrote 0x{:02x} to register 0x{:02x}".format(value,register))
+
+    # bit fields are given by the position of their left most bit and their size
+
+    def readBits(self,register,bit_position,no_of_bits):
+        shift = bit_position - no_of_bits + 1
+        return (self.readReg(register) >> shift) & ((1 << no_of_bits) - 1)
+
+    def writeBits(self,register,bit_position,no_of_bits,value):
+        shift = bit_position - no_of_bits + 1
+        mask = ((1 << no_of_bits) - 1) << shift
+        old = self.readReg(register)
+        new = (old & ~mask) | ((value << shift) & mask)
+        if new == old and self.cached[register]:
+            return                      # nothing changes, save the bus transfer
+        self.writeReg(register,new)
+
+    def readBit(self,register,bit_position):
+        return (self.readReg(register) >> bit_position) & 1
+
+    def writeBit(self,register,bit_position,value):
+        self.writeBits(register,bit_position,1,1 if value else 0)
+
+    def readBlock(self,register,buf):
+        # burst read of len(buf) registers starting at register into buf
+        self.i2c.readfrom_mem_into(self.address,register,buf)
+        self.reads += 1
+
+    def writeBlock(self,register,buf):
+        # burst write of buf to the registers starting at register
+        self.i2c.writeto_mem(self.address,register,buf)
+        self.writes += 1
+        for i in range(len(buf)):
+            if self.cached[register + i]:
+                self.shadow[register + i] = buf[i]
+                self.valid[register + i] = 1
+
+    def refresh(self,register,count):
+        # read a contiguous block of configuration registers into the shadow
+        # with a single burst
+        self.readBlock(register,memoryview(self.shadow)[register:register + count])
+        for i in range(register,register + count):
+            self.valid[i] = self.cached[i]
+
+    def invalidate(self,register=None,count=1):
+        # forget the shadowed contents of registers, all registers if register is None
+        # Call this after a reset or when the device changes a register by itself
+        if register is None:
+            register = 0
+            count = 256
+        for i in range(register,register + count):
+            self.valid[i] = 0
@@ -0,0 +1,535 @@
+#
+# Small asynchronous ftp server for ESP8266, ESP32 and Pyboard D
+# based on uasyncio. Derived from uftpd.py
+#
+# Unlike uftpd, which serves one command at a time from socket callbacks,
+# each session runs as its own task. File transfers are chunked and yield
+# to the scheduler after every chunk, so a large upload neither blocks the
+# REPL nor the other sessions. Every passive mode transfer gets its own data
+# port from a pool, so several transfers may run at the same time.
+#
+# Start the server from your asyncio application with:
+#
+# import uasyncio as asyncio
+# import uaftpd
+# asyncio.create_task(uaftpd.serve([port = 21][, verbose = level]))
+#
+# or, if nothing else is running:
+#
+# uaftpd.run([port = 21][, verbose = level])
+#
+# port is the port number (default 21)
+# verbose controls the level of printed activity messages, values 0, 1, 2
+# uaftpd.stats() prints the throughput and latency counters of the sessions.
+#
+# Copyright (c) 2016 Christopher Popp (initial ftp server framework)
+# Copyright (c) 2016 Paul Sokolovsky (background execution control structure)
+# Copyright (c) 2016 Robert Hammelrath (putting the pieces together and a
+# few extensions)
+# Distributed under MIT License
+#
+import uasyncio as asyncio
+import network
+import uos
+import gc
+from time import localtime, ticks_ms, ticks_diff
+
+# constant definitions
+_CHUNK_SIZE = const(1024)
+_COMMAND_TIMEOUT = const(300)
+_DATA_TIMEOUT = const(10)
+_DATA_PORT = const(13333)
+_DATA_PORTS = const(8)  # size of the passive mode data port pool
+
+# Global variables
+server = None
+sessions = []
+verbose_l = 0
+free_ports = []
+# Interfaces: (IP-Address (string), IP-Address (integer), Netmask (integer))
+AP_addr = ("0.0.0.0", 0, 0xffffff00)
+STA_addr = ("0.0.0.0", 0, 0xffffff00)
+
+_month_name = ("", "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+# passive mode data connection on a port taken from the pool
+class DataPort:
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.used = False  # the connection was handed to a transfer
+        self.connected = asyncio.Event()
+        self.server = None
+
+    async def listen(self):
+        self.server = await asyncio.start_server(self.accept, "0.0.0.0",
+                                                 self.port, backlog=1)
+
+    async def accept(self, reader, writer):
+        if self.writer is not None:  # only one connection per transfer
+            writer.close()
+            return
+        self.reader = reader
+        self.writer = writer
+        self.connected.set()
+
+    async def connection(self):
+        await asyncio.wait_for(self.connected.wait(), _DATA_TIMEOUT)
+        self.used = True
+        return self.reader, self.writer
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if self.writer is not None and not self.used:
+            # accepted, but the transfer was aborted before using it
+            self.writer.close()
+        self.reader = self.writer = None
+        free_ports.append(self.port)
+
+
+class FTP_session:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.remote_addr = writer.get_extra_info('peername')[0]
+        self.cwd = '/'
+        self.fromname = None
+        self.act_data_addr = self.remote_addr
+        self.DATA_PORT = 20
+        self.active = True
+        self.dataport = None
+        # transfer buffer, allocated once per session
+        self.buf = memoryview(bytearray(_CHUNK_SIZE))
+        # counters
+        self.commands = 0
+        self.command_ms = 0  # total time spent serving commands
+        self.max_command_ms = 0
+        self.transfers = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.transfer_ms = 0
+        log_msg(1, "FTP Command connection from:", self.remote_addr)
+        # check which interface was used by comparing the caller's ip
+        # adress with the ip adresses of STA and AP; consider netmask;
+        # select IP address for passive mode
+        if ((AP_addr[1] & AP_addr[2]) ==
+           (num_ip(self.remote_addr) & AP_addr[2])):
+            self.pasv_data_addr = AP_addr[0]
+        elif ((STA_addr[1] & STA_addr[2]) ==
+              (num_ip(self.remote_addr) & STA_addr[2])):
+            self.pasv_data_addr = STA_addr[0]
+        else:
+            self.pasv_data_addr = "0.0.0.0"  # Ivalid value
+
+    async def send(self, msg):
+        self.writer.write(msg)
+        await self.writer.drain()
+
+    async def send_list_data(self, path, data_client, full):
+        try:
+            names = uos.listdir(path)
+            pattern = None
+        except:  # path may be a file name or pattern
+            path, pattern = self.split_path(path)
+            try:
+                names = uos.listdir(path)
+            except:
+                return
+        for fname in names:
+            if pattern is None or self.fncmp(fname, pattern):
+                data_client.write(self.make_description(path, fname, full))
+                await data_client.drain()
+
+    def make_description(self, path, fname, full):
+        if full:
+            stat = uos.stat(self.get_absolute_path(path, fname))
+            file_permissions = ("drwxr-xr-x"
+                                if (stat[0] & 0o170000 == 0o040000)
+                                else "-rw-r--r--")
+            file_size = stat[6]
+            tm = localtime(stat[7])
+            if tm[0] != localtime()[0]:
+                description = "{} 1 owner group {:>10} {} {:2} {:>5} {}\r\n".\
+                    format(file_permissions, file_size,
+                           _month_name[tm[1]], tm[2], tm[0], fname)
+            else:
+                description = "{} 1 owner group {:>10} {} {:2} {:02}:{:02} {}\r\n".\
+                    format(file_permissions, file_size,
+                           _month_name[tm[1]], tm[2], tm[3], tm[4], fname)
+        else:
+            description = fname + "\r\n"
+        return description
+
+    async def send_file_data(self, path, data_client):
+        buf = self.buf
+        start = ticks_ms()
+        with open(path, "rb") as file:
+            n = file.readinto(buf)
+            while n:
+                data_client.write(buf[:n])
+                await data_client.drain()  # yields to the other tasks
+                self.bytes_sent += n
+                n = file.readinto(buf)
+        self.transfer_ms += ticks_diff(ticks_ms(), start)
+        self.transfers += 1
+
+    async def save_file_data(self, path, data_reader, mode):
+        buf = self.buf
+        start = ticks_ms()
+        with open(path, mode) as file:
+            n = await data_reader.readinto(buf)
+            while n:
+                file.write(buf[:n])
+                self.bytes_received += n
+                n = await data_reader.readinto(buf)
+        self.transfer_ms += ticks_diff(ticks_ms(), start)
+        self.transfers += 1
+
+    def get_absolute_path(self, cwd, payload):
+        # Just a few special cases "..", "." and ""
+        # If payload start's with /, set cwd to /
+        # and consider the remainder a relative path
+        if payload.startswith('/'):
+            cwd = "/"
+        for token in payload.split("/"):
+            if token == '..':
+                cwd = self.split_path(cwd)[0]
+            elif token != '.' and token != '':
+                if cwd == '/':
+                    cwd += token
+                else:
+                    cwd = cwd + '/' + token
+        return cwd
+
+    def split_path(self, path):  # instead of path.rpartition('/')
+        tail = path.split('/')[-1]
+        head = path[:-(len(tail) + 1)]
+        return ('/' if head == '' else head, tail)
+
+    # compare fname against pattern. Pattern may contain
+    # the wildcards ? and *.
+    def fncmp(self, fname, pattern):
+        pi = 0
+        si = 0
+        while pi < len(pattern) and si < len(fname):
+            if (fname[si] == pattern[pi]) or (pattern[pi] == '?'):
+                si += 1
+                pi += 1
+            else:
+                if pattern[pi] == '*':  # recurse
+                    if pi == len(pattern.rstrip("*?")):  # only wildcards left
+                        return True
+                    while si < len(fname):
+                        if self.fncmp(fname[si:], pattern[pi + 1:]):
+                            return True
+                        else:
+                            si += 1
+                    return False
+                else:
+                    return False
+        if pi == len(pattern.rstrip("*")) and si == len(fname):
+            return True
+        else:
+            return False
+
+    async def open_dataclient(self):
+        if self.active:  # active mode
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.act_data_addr, self.DATA_PORT),
+                _DATA_TIMEOUT)
+            log_msg(1, "FTP Data connection with:", self.act_data_addr)
+        else:  # passive mode
+            if self.dataport is None:
+                raise OSError("no PASV")
+            reader, writer = await self.dataport.connection()
+            log_msg(1, "FTP Data connection on port:", self.dataport.port)
+        return reader, writer
+
+    def close_dataport(self):
+        if self.dataport is not None:
+            self.dataport.close()
+            self.dataport = None
+
+    async def close_dataclient(self, writer):
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+        self.close_dataport()
+
+    async def serve(self):
+        await self.send("220 Hello, this is the ESP32.\r\n")
+        try:
+            while True:
+                line = await asyncio.wait_for(self.reader.readline(),
+                                              _COMMAND_TIMEOUT)
+                data = line.decode("utf-8").rstrip("\r\n")
+                if len(data) <= 0:
+                    log_msg(1, "*** No data, assume QUIT")
+                    break
+                start = ticks_ms()
+                quit = await self.exec_ftp_command(data)
+                elapsed = ticks_diff(ticks_ms(), start)
+                self.commands += 1
+                self.command_ms += elapsed
+                self.max_command_ms = max(self.max_command_ms, elapsed)
+                if quit:
+                    break
+        except Exception as err:
+            log_msg(1, "Session {} ended: {}".format(self.remote_addr, err))
+        self.close()
+
+    def close(self):
+        self.close_dataport()
+        self.writer.close()
+        if self in sessions:
+            sessions.remove(self)
+
+    async def exec_ftp_command(self, data):
+        send = self.send
+        gc.collect()
+        command = data.split()[0].upper()
+        payload = data[len(command):].lstrip()  # partition is missing
+        path = self.get_absolute_path(self.cwd, payload)
+        log_msg(1, "Command={}, Payload={}".format(command, payload))
+
+        try:
+            if command == "USER":
+                await send("230 Logged in.\r\n")
+            elif command == "PASS":
+                await send("230 Logged in.\r\n")
+            elif command == "SYST":
+                await send("215 UNIX Type: L8\r\n")
+            elif command in ("TYPE", "NOOP", "ABOR"):  # just accept & ignore
+                await send('200 OK\r\n')
+            elif command == "QUIT":
+                await send('221 Bye.\r\n')
+                return True
+            elif command == "PWD" or command == "XPWD":
+                await send('257 "{}"\r\n'.format(self.cwd))
+            elif command == "CWD" or command == "XCWD":
+                try:
+                    if (uos.stat(path)[0] & 0o170000) == 0o040000:
+                        self.cwd = path
+                        await send('250 OK\r\n')
+                    else:
+                        await send('550 Fail\r\n')
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "PASV":
+                self.close_dataport()
+                if not free_ports:
+                    await send('425 No data port available.\r\n')
+                    return False
+                dataport = DataPort(free_ports.pop())
+                try:
+                    await dataport.listen()
+                except:
+                    dataport.close()
+                    await send('425 Cannot open data port.\r\n')
+                    return False
+                self.dataport = dataport
+                self.active = False
+                await send('227 Entering Passive Mode ({},{},{}).\r\n'.format(
+                    self.pasv_data_addr.replace('.', ','),
+                    dataport.port >> 8, dataport.port % 256))
+            elif command == "PORT":
+                items = payload.split(",")
+                if len(items) >= 6:
+                    self.close_dataport()
+                    self.act_data_addr = '.'.join(items[:4])
+                    if self.act_data_addr == "127.0.1.1":
+                        # replace by command session addr
+                        self.act_data_addr = self.remote_addr
+                    self.DATA_PORT = int(items[4]) * 256 + int(items[5])
+                    await send('200 OK\r\n')
+                    self.active = True
+                else:
+                    await send('504 Fail\r\n')
+            elif command in ("LIST", "NLST", "RETR", "STOR", "APPE"):
+                await self.transfer(command, payload, path)
+            elif command == "SIZE":
+                try:
+                    await send('213 {}\r\n'.format(uos.stat(path)[6]))
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "MDTM":
+                try:
+                    tm = localtime(uos.stat(path)[8])
+                    await send('213 {:04d}{:02d}{:02d}{:02d}{:02d}{:02d}\r\n'.format(*tm[0:6]))
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "STAT":
+                if payload == "":
+                    await send("211-Connected to ({})\r\n"
+                               "    Data address ({})\r\n"
+                               "    TYPE: Binary STRU: File MODE: Stream\r\n"
+                               "    Session timeout {}\r\n"
+                               "211 Client count is {}\r\n".format(
+                                self.remote_addr, self.pasv_data_addr,
+                                _COMMAND_TIMEOUT, len(sessions)))
+                else:
+                    await send("213-Directory listing:\r\n")
+                    await self.send_list_data(path, self.writer, True)
+                    await send("213 Done.\r\n")
+            elif command == "DELE":
+                try:
+                    uos.remove(path)
+                    await send('250 OK\r\n')
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "RNFR":
+                try:
+                    # just test if the name exists, exception if not
+                    uos.stat(path)
+                    self.fromname = path
+                    await send("350 Rename from\r\n")
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "RNTO":
+                try:
+                    uos.rename(self.fromname, path)
+                    await send('250 OK\r\n')
+                except:
+                    await send('550 Fail\r\n')
+                self.fromname = None
+            elif command == "CDUP" or command == "XCUP":
+                self.cwd = self.get_absolute_path(self.cwd, "..")
+                await send('250 OK\r\n')
+            elif command == "RMD" or command == "XRMD":
+                try:
+                    uos.rmdir(path)
+                    await send('250 OK\r\n')
+                except:
+                    await send('550 Fail\r\n')
+            elif command == "MKD" or command == "XMKD":
+                try:
+                    uos.mkdir(path)
+                    await send('250 OK\r\n')
+                except:
+                    await send('550 Fail\r\n')
+            else:
+                await send("502 Unsupported command.\r\n")
+        # handle unexpected errors
+        except Exception as err:
+            log_msg(1, "Exception in exec_ftp_command: {}".format(err))
+        return False
+
+    async def transfer(self, command, payload, path):
+        send = self.send
+        data_writer = None
+        try:
+            data_reader, data_writer = await self.open_dataclient()
+            if command == "LIST" or command == "NLST":
+                if payload.startswith("-"):
+                    option = payload.split()[0].lower()
+                    path = self.get_absolute_path(
+                            self.cwd, payload[len(option):].lstrip())
+                else:
+                    option = ""
+                await send("150 Directory listing:\r\n")
+                await self.send_list_data(path, data_writer,
+                                          command == "LIST" or 'l' in option)
+            elif command == "RETR":
+                await send("150 Opened data connection.\r\n")
+                await self.send_file_data(path, data_writer)
+            else:
+                await send("150 Opened data connection.\r\n")
+                await self.save_file_data(path, data_reader,
+                                          "wb" if command == "STOR" else "ab")
+            await self.close_dataclient(data_writer)
+            await send("226 Done.\r\n")
+        except Exception as err:
+            log_msg(1, "Transfer failed: {}".format(err))
+            try:
+                await self.close_dataclient(data_writer)
+            except:
+                self.close_dataport()
+            await send('550 Fail\r\n')
+
+    def stats(self):
+        kbps = 0
+        if self.transfer_ms:
+            kbps = (self.bytes_sent + self.bytes_received) / self.transfer_ms
+        return {"remote": self.remote_addr,
+                "commands": self.commands,
+                "avg_command_ms": self.command_ms // self.commands
+                if self.commands else 0,
+                "max_command_ms": self.max_command_ms,
+                "transfers": self.transfers,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "kbytes_per_s": kbps}
+
+
+def log_msg(level, *args):
+    if verbose_l >= level:
+        print(*args)
+
+
+def num_ip(ip):
+    items = ip.split(".")
+    return (int(items[0]) << 24 | int(items[1]) << 16 |
+            int(items[2]) << 8 | int(items[3]))
+
+
+async def accept_ftp_connect(reader, writer):
+    session = FTP_session(reader, writer)
+    sessions.append(session)
+    await session.serve()
+
+
+# print the counters of all open sessions and return them
+def stats():
+    result = [session.stats() for session in sessions]
+    for s in result:
+        print("{remote}: {commands} commands, avg {avg_command_ms} ms, "
+              "max {max_command_ms} ms, {transfers} transfers, "
+              "{bytes_sent} bytes sent, {bytes_received} bytes received, "
+              "{kbytes_per_s:.1f} kB/s".format(**s))
+    return result
+
+
+def stop():
+    global server
+    for session in sessions[:]:
+        session.close()
+    if server is not None:
+        server.close()
+        server = None
+
+
+# listen for ftp connections, runs until stop() is called
+async def serve(port=21, verbose=0, splash=True):
+    global server, verbose_l, free_ports
+    global AP_addr, STA_addr
+
+    stop()
+    verbose_l = verbose
+    free_ports = list(range(_DATA_PORT, _DATA_PORT + _DATA_PORTS))
+
+    for i in (network.AP_IF, network.STA_IF):
+        wlan = network.WLAN(i)
+        if wlan.active():
+            ifconfig = wlan.ifconfig()
+            # save IP address string and numerical values of IP adress and netmask
+            addr = (ifconfig[0], num_ip(ifconfig[0]), num_ip(ifconfig[1]))
+            if i == network.AP_IF:
+                AP_addr = addr
+            else:
+                STA_addr = addr
+            if splash:
+                print("FTP server started on {}:{}".format(ifconfig[0], port))
+
+    server = await asyncio.start_server(accept_ftp_connect, "0.0.0.0", port)
+    await server.wait_closed()
+
+
+def run(port=21, verbose=0, splash=True):
+    asyncio.run(serve(port, verbose, splash))
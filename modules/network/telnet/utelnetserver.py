@@ -8,69 +8,171 @@ import socket
 import uos
 import network
 import errno
+import select
 from uio import IOBase
 from wifi_connect import *
 
 listen_s = None
 client_s = None
 
+_RX_SIZE = const(256)
+_TX_SIZE = const(512)
+_TX_FLUSH = const(384)  # pending output sent without waiting for a line end
+_TX_TIMEOUT = const(2000)  # ms a client may stall its output before it is dropped
+
+# telnet protocol bytes
+_IAC = const(0xFF)
+_SB = const(0xFA)
+_SE = const(0xF0)
+_WILL = const(0xFB)  # WILL, WONT, DO and DONT carry an option byte
+
+# states of the IAC filter
+_DATA = const(0)
+_CMD = const(1)
+_OPT = const(2)
+_SUB = const(3)
+_SUB_IAC = const(4)
+
 # Provide necessary functions for dupterm and replace telnet control characters that come in.
+# Input is received in large reads into a buffer and stripped of telnet
+# commands in one pass, so the single byte reads of dupterm are served from
+# memory. Output is collected in a buffer and sent without waiting when a
+# line is complete, the buffer is nearly full or the REPL asks for input.
+# Only a full buffer waits on poll() for the socket, for a limited time:
+# a client not taking its output is disconnected.
 class TelnetWrapper(IOBase):
     def __init__(self, socket):
 
         self.socket = socket
-        self.discard_count = 0
-        
-    def readinto(self, b):
-        readbytes = 0
+        self.state = _DATA
+        self.rxbuf = bytearray(_RX_SIZE)
+        self.rxmv = memoryview(self.rxbuf)
+        self.rxhead = 0  # index of the first unread byte
+        self.rxfill = 0  # number of unread bytes
+        self.txbuf = bytearray(_TX_SIZE)
+        self.txmv = memoryview(self.txbuf)
+        self.txhead = 0  # index of the first unsent byte
+        self.txend = 0
+        self.poller = select.poll()
+        self.poller.register(socket, select.POLLOUT)
 
-        for i in range(len(b)):
-            try:
-                byte = 0
-                # discard telnet control characters and
-                # null bytes 
-                while(byte == 0):
-                    byte = self.socket.recv(1)[0]
-                    if byte == 0xFF:
-                        self.discard_count = 2
-                        byte = 0
-                    elif self.discard_count > 0:
-                        self.discard_count -= 1
-                        byte = 0
-                    
-                b[i] = byte
-                
-                readbytes += 1
-            except (IndexError, OSError) as e:
-                if type(e) == IndexError or len(e.args) > 0 and e.args[0] == errno.EAGAIN:
-                    if readbytes == 0:
-                        return None
-                    else:
-                        return readbytes
+    # strip telnet commands and null bytes from buf[start:end] in place,
+    # returning the number of bytes kept
+    def _filter(self, start, end):
+        buf = self.rxbuf
+        state = self.state
+        w = start
+        for i in range(start, end):
+            c = buf[i]
+            if state == _DATA:
+                if c == _IAC:
+                    state = _CMD
+                elif c:
+                    buf[w] = c
+                    w += 1
+            elif state == _CMD:
+                if c == _IAC:  # escaped 0xFF
+                    buf[w] = c
+                    w += 1
+                    state = _DATA
+                elif c >= _WILL:
+                    state = _OPT
+                elif c == _SB:
+                    state = _SUB
                 else:
-                    raise
-        return readbytes
-    
-    def write(self, data):
-        import errno
-        # we need to write all the data but it's a non-blocking socket
-        # so loop until it's all written eating EAGAIN exceptions
-        while len(data) > 0:
+                    state = _DATA
+            elif state == _OPT:
+                state = _DATA
+            elif state == _SUB:
+                if c == _IAC:
+                    state = _SUB_IAC
+            else:  # _SUB_IAC
+                state = _DATA if c == _SE else _SUB
+        self.state = state
+        return w - start
+
+    def _receive(self):
+        # refill the empty receive buffer with one large read
+        self.rxhead = 0
+        while self.rxfill == 0:
             try:
-                written_bytes = self.socket.write(data)
-                data = data[written_bytes:]
+                n = self.socket.readinto(self.rxbuf)
             except OSError as e:
                 if len(e.args) > 0 and e.args[0] == errno.EAGAIN:
-                    # can't write yet, try again
-                    pass
+                    return
+                raise
+            if not n:  # no data or connection closed
+                return
+            self.rxfill = self._filter(0, n)
+
+    def readinto(self, b):
+        if self.txend:
+            self._send(0)  # the REPL waits for input: push pending output
+        if self.rxfill == 0:
+            self._receive()
+            if self.rxfill == 0:
+                return None
+        n = min(len(b), self.rxfill)
+        head = self.rxhead
+        if n == 1:  # the usual request of dupterm
+            b[0] = self.rxbuf[head]
+        else:
+            b[:n] = self.rxmv[head:head + n]
+        self.rxhead = head + n
+        self.rxfill -= n
+        return n
+
+    # detach the connection from the REPL, pending output is lost
+    def _drop(self, reason):
+        self.txhead = self.txend = 0
+        uos.dupterm(None)
+        self.socket.close()
+        print(reason)
+
+    # send pending output. Wait up to timeout ms for the socket to accept
+    # it, returns False if output is still pending
+    def _send(self, timeout):
+        while self.txhead < self.txend:
+            try:
+                n = self.socket.write(self.txmv[self.txhead:self.txend])
+            except OSError as e:
                 if len(e.args) > 0 and e.args[0] == errno.ECONNRESET:
-                    uos.dupterm(None)
-                    print("Connection was reset\n")
-                    break
-                else:
+                    self._drop("Connection was reset\n")
+                    return True
+                if len(e.args) == 0 or e.args[0] != errno.EAGAIN:
                     # something else...propagate the exception
                     raise
-    
+                n = None
+            if n:
+                self.txhead += n
+            elif timeout == 0 or not self.poller.poll(timeout):
+                return False
+        self.txhead = self.txend = 0
+        return True
+
+    def write(self, data):
+        mv = memoryview(data)
+        while len(mv) > 0:
+            if self.txend == _TX_SIZE:
+                # buffer full, wait for the socket
+                if not self._send(_TX_TIMEOUT):
+                    self._drop("\ntelnet client does not take its output, connection closed")
+                    return len(data)
+                continue
+            n = min(_TX_SIZE - self.txend, len(mv))
+            self.txmv[self.txend:self.txend + n] = mv[:n]
+            self.txend += n
+            mv = mv[n:]
+        # the echo of single characters is collected and sent by the next
+        # read, complete lines and large amounts are sent at once
+        if self.txend >= _TX_FLUSH or (len(data) and data[len(data) - 1] == 10):
+            self._send(0)
+        return len(data)
+
+    def flush(self):
+        if not self._send(_TX_TIMEOUT):
+            self._drop("\ntelnet client does not take its output, connection closed")
+
     def close(self):
         self.socket.close()
 
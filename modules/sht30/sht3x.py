@@ -18,8 +18,22 @@ else:
     pinScl      =  22  # SCL on esp32 
     pinSda      =  21  # SDA ON ESP32
 
+def _crcTable(polynomial):
+    # CRC-8 of every possible byte value, used for table driven CRC calculation
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = (crc << 1) ^ polynomial
+            else:
+                crc <<= 1
+        table[i] = crc & 0xff
+    return bytes(table)
+
 class SHT3X:
     POLYNOMIAL  = 0x131 # P(x) = x^8 + x^5 + x^4 + 1 = 100110001
+    CRC_TABLE   = _crcTable(POLYNOMIAL)
     CMD_READ_SERIALNBR  = b'\x37\x80' # read serial number
     CMD_READ_STATUS     = b'\xF3\x2D' # read status register
     CMD_CLEAR_STATUS    = b'\x30\x41' # clear status register
@@ -120,6 +134,11 @@ class SHT3X:
         else:
             self.i2c = I2C(1,scl=Pin(scl_pin), sda=Pin(sda_pin))
         self.i2c_addr = i2c_address
+        # receive buffer reused for all reads, the views avoid slicing
+        self.rxBuf = bytearray(6)
+        rxView = memoryview(self.rxBuf)
+        self.rxViews = {3: rxView[:3], 6: rxView}
+        self.measCmds = {}
         time.sleep_ms(50)
         if not self.isPresent():
             raise SHT3XError(SHT3XError.BUS_ERROR)
@@ -130,23 +149,35 @@ class SHT3X:
         """
         return self.i2c_addr in self.i2c.scan()
         
-    def _calcCrc(self, data):
-        # calculates 8-Bit checksum with given polynomial
-        crc = 0xFF
-        
-        for b in data[0:2]:
-            crc ^= b;
-            for _ in range(8, 0, -1):
-                if crc & 0x80:
-                    crc = (crc << 1) ^ SHT3X.POLYNOMIAL;
-                else:
-                    crc <<= 1
-        return crc
+    def _calcCrc(self, data, offset=0):
+        # calculates 8-Bit checksum of the 2 bytes at offset with the CRC table
+        table = self.CRC_TABLE
+        return table[table[0xFF ^ data[offset]] ^ data[offset+1]]
     
     def _checkCrc(self,data):
         crc = self._calcCrc(data)
         crc_to_check = data[-1]       
         return crc_to_check == crc
+
+    def _validate(self, data, size):
+        # checks the CRC of each 3 byte word (2 data bytes and the CRC) in place
+        # and rejects all zero responses
+        table = self.CRC_TABLE
+        nonZero = 0
+        for i in range(0, size, 3):
+            if table[table[0xFF ^ data[i]] ^ data[i+1]] != data[i+2]:
+                raise SHT3XError(SHT3XError.CRC_ERROR)
+            nonZero |= data[i] | data[i+1] | data[i+2]
+        if not nonZero:
+            raise SHT3XError(SHT3XError.DATA_ERROR)
+
+    def _read(self, size):
+        # reads size bytes into the receive buffer and validates them
+        # returns a view into the receive buffer, which is overwritten by the next read
+        data = self.rxViews[size]
+        self.i2c.readfrom_into(self.i2c_addr, data)
+        self._validate(data, size)
+        return data
     
     def _sendCmdPoll(self, cmd_request, response_size=6, timeout=100):
         """
@@ -166,23 +197,19 @@ class SHT3X:
                 raise SHT3XError(SHT3XError.BUS_ERROR)
             raise exception
         to=timeout
+        data = self.rxViews[response_size]
         while True:
             try:
                 time.sleep_ms(1)
-                data = self.i2c.readfrom(self.i2c_addr, 6)
-                if data != None:
-                    break
+                self.i2c.readfrom_into(self.i2c_addr, data)
+                break
             except OSError as exception:
                 to -= 1
                 if to == 0:
                     raise SHT3XError(SHT3XError.TIMEOUT)
                 # print(exception)
                 
-        for i in range(response_size//3):
-            if not self._checkCrc(data[i*3:(i+1)*3]): # pos 2 and 5 are CRC
-                raise SHT3XError(SHT3XError.CRC_ERROR)
-        if data == bytearray(response_size):
-            raise SHT3XError(SHT3XError.DATA_ERROR)       
+        self._validate(data, response_size)   # pos 2 and 5 are CRC
         return data
     
     def _sendCmd(self, cmd_request, response_size=6, delay_ms=100):
@@ -197,13 +224,7 @@ class SHT3X:
                 time.sleep_ms(delay_ms)
                 return
             time.sleep_ms(delay_ms)
-            data = self.i2c.readfrom(self.i2c_addr, response_size)
-            for i in range(response_size//3):
-                if not self._checkCrc(data[i*3:(i+1)*3]): # pos 2 and 5 are CRC
-                    raise SHT3XError(SHT3XError.CRC_ERROR)
-            if data == bytearray(response_size):
-                raise SHT3XError(SHT3XError.DATA_ERROR)
-            return data
+            return self._read(response_size)   # pos 2 and 5 are CRC
         except OSError as exception:
             if exception.args[0] == errno.ENODEV:
                 raise SHT3XError(SHT3XError.BUS_ERROR)
@@ -225,7 +246,7 @@ class SHT3X:
         """
         data = self._sendCmd(self.CMD_READ_STATUS, 3, delay_ms=20); 
         if raw:
-            return data
+            return bytearray(data)
         status = data[0] << 8 | data[1]
         return status
     
@@ -314,10 +335,37 @@ class SHT3X:
         self._sendCmd(self.CMD_BREAK, None,delay_ms=2);   
         return
     
+    def fetch(self, result=None):
+        """
+        Read out the last measurement in periodic mode without waiting.
+        Returns None if no new measurement is available (the sensor does not
+        acknowledge the read), else [T,RH] or the result list/array filled in.
+        """
+        try:
+            self.i2c.writeto(self.i2c_addr, self.CMD_FETCH_DATA)
+        except OSError as exception:
+            if exception.args[0] == errno.ENODEV:
+                raise SHT3XError(SHT3XError.BUS_ERROR)
+            raise exception
+        data = self.rxBuf
+        try:
+            self.i2c.readfrom_into(self.i2c_addr, data)
+        except OSError:
+            return None         # no data yet
+        self._validate(data, 6)
+        if result is None:
+            result = [0.0,0.0]
+        result[0] = self._calcTemperatureCelsius(data[0] << 8 | data[1])
+        result[1] = self._calcHumidity(data[3] << 8 | data[4])
+        return result
+
     def measPeriodic(self,mps=0.5, repeatability=None, raw=False, noOfMeas=50,callback=None):
+        """
+        Blocking periodic measurement: returns the list of noOfMeas results.
+        Use SHT3XPeriodic from sht3xPeriodic.py for a non blocking version
+        """
         self.stopPeriodicMeas()
         delay = 1/mps
-        print("Interval: ",delay)
         self.startPeriodicMeas(mps, repeatability)
         result=[]
         for i in range(noOfMeas):
@@ -326,30 +374,23 @@ class SHT3X:
                 # print("Fetching data, cmd= ",hex(self.CMD_FETCH_DATA[0]),hex(self.CMD_FETCH_DATA[1]))
                 self.i2c.writeto(self.i2c_addr,self.CMD_FETCH_DATA)
                 # print("after fetch cmd")
-                data = self.i2c.readfrom(self.i2c_addr, 6)
+                data = self._read(6)   # pos 2 and 5 are CRC
             except OSError as exception:
                 if exception.args[0] == errno.ENODEV:
                     raise SHT3XError(SHT3XError.BUS_ERROR)
                 raise exception
 
-            # checksum 
-            for i in range(2):
-                if not self._checkCrc(data[i*3:(i+1)*3]): # pos 2 and 5 are CRC
-                    raise SHT3XError(SHT3XError.CRC_ERROR)
-            if data == bytearray(6):
-                raise SHT3XError(SHT3XError.DATA_ERROR)
+            if raw:
+                value = bytearray(data)
+            else:
+                rawTemp=data[0] << 8 | data[1]
+                tempC = self._calcTemperatureCelsius(rawTemp)
+                rawHumi=data[3] << 8 | data[4]
+                humi = self._calcHumidity(rawHumi)
+                value = [tempC,humi]
+            result.append(value)
             if callback:
-                if raw:
-                    callback(data)
-                    result.append(data)
-                else:
-                    rawTemp=data[0] << 8 | data[1]
-                    tempC = self._calcTemperatureCelsius(rawTemp)
-                    rawHumi=data[3] << 8 | data[4]
-                    humi = self._calcHumidity(rawHumi)
-                    callback([tempC,humi])
-                    # result.append([tempC,humi])
-                    # print("Temperatur: ",tempC, "°C, Humidity: ",humi, "%")
+                callback(value)
                     
             if noOfMeas == 0:
                 break
@@ -357,10 +398,30 @@ class SHT3X:
         self.stopPeriodicMeas()
         return result
             
-    def getTempAndHumi(self, clockStretching=None, repeatability=None, raw=False, timeout=100):
+    def _measCmd(self, clockStretching, repeatability):
+        # single shot measurement commands are built once and cached
+        code = clockStretching << 2 | repeatability
+        measCmd = self.measCmds.get(code)
+        if measCmd:
+            return measCmd
+        measCmd = bytearray(self.CMD_MEAS)
+        measCmd[0] |= clockStretching << 3
+        measCmd[1] |= repeatability << 3
+        # print("Cmd: ",hex(measCmd[0]),hex(measCmd[1]))
+        key = measCmd[0]<<8 | measCmd[1]
+        measCmd[1] |= self.crc3[key]
+        # print("key: ",key)
+        # print("final cmd: ",hex(measCmd[0]),hex(measCmd[1]))
+        measCmd = bytes(measCmd)
+        self.measCmds[code] = measCmd
+        return measCmd
+
+    def getTempAndHumi(self, clockStretching=None, repeatability=None, raw=False, timeout=100, result=None):
         """
         If raw==True returns a bytearray(6) with sensor direct measurement otherwise
         It gets the temperature (T) and humidity (RH) measurement and returns them.
+        If result (a list or array of 2 elements) is given, the values are stored
+        in it and no new list is created.
         
         The units are Celsius and percent
         Default repeatability is LOW and clock stretchin is on by default
@@ -370,15 +431,7 @@ class SHT3X:
             clockStretching = self.CLOCK_STRETCH
         if repeatability == None:
             repeatability = self.REP_S_LOW
-        measCmd = bytearray(self.CMD_MEAS)
-        measCmd[0] |= clockStretching << 3
-        measCmd[1] |= repeatability << 3
-        # print("Cmd: ",hex(measCmd[0]),hex(measCmd[1]))
-        key = int(hex(measCmd[0]<<8 | measCmd[1]))
-        # print("Type of key: ",type(key))
-        measCmd[1] |= self.crc3[key]
-        # print("key: ",key)
-        # print("final cmd: ",hex(measCmd[0]),hex(measCmd[1]))
+        measCmd = self._measCmd(clockStretching, repeatability)
         
         if clockStretching:
             delay = self.measDuration[repeatability]
@@ -387,12 +440,12 @@ class SHT3X:
         else:
             data = self._sendCmdPoll(measCmd,6,timeout)
         if raw:
-            return data
-        rawTemp=data[0] << 8 | data[1]
-        tempC = self._calcTemperatureCelsius(rawTemp)
-        rawHumi=data[3] << 8 | data[4]
-        humi = self._calcHumidity(rawHumi)
-        return [tempC,humi]
+            return bytearray(data)
+        if result is None:
+            result = [0.0,0.0]
+        result[0] = self._calcTemperatureCelsius(data[0] << 8 | data[1])
+        result[1] = self._calcHumidity(data[3] << 8 | data[4])
+        return result
         
     def _calcTemperatureCelsius(self,rawTemp):
         tempC = -45.0 + 175.0*rawTemp/65536.0
@@ -443,7 +496,7 @@ class SHT3X:
         # print("readAlert command: ",hex(readAlertCmd[0]),hex(readAlertCmd[1]))
         data=self._sendCmd(readAlertCmd,response_size=3)        
         if raw:
-            return data
+            return bytearray(data)
         tmp = data[0] << 8 | data[1]
         # print("Returned raw data: ",hex(data[0]),",",hex(data[1]),", checksum: ",hex(data[2])) 
         # print("Returned alert high set: ",hex(tmp))
@@ -0,0 +1,90 @@
+# sht3xPeriodic.py: non blocking periodic measurements with the SHT3X
+# The sensor is put into its periodic acquisition mode (up to 10
+# measurements per second) and a uasyncio task fetches the results on a
+# timer. The measurements are kept in a fixed size ring of
+# (ticks_ms, temperature, humidity) records. Consumers read the latest
+# record, iterate over the ring or await the next measurement, without ever
+# waiting for a conversion on the I2C bus. The task handling is inherited
+# from AsyncSensor (asyncSensor.py), the results are the records.
+# Copyright (c) U. Raich
+# The program was written for the course on the Internet of Things
+# at the University of Cape Coast, Ghana
+# It is released under GPL
+
+import uasyncio as asyncio
+from array import array
+from time import ticks_ms
+from sht3x import SHT3X,SHT3XError
+from asyncSensor import AsyncSensor
+
+class SHT3XPeriodic(AsyncSensor):
+    def __init__(self, sht3x, mps=1.0, repeatability=None, size=64):
+        """
+        sht3x: the SHT3X sensor object
+        mps: measurements per second, one of 0.5, 1, 2, 4, 10
+        size: number of records kept in the ring
+        """
+        if mps not in SHT3X.mpsCode:
+            raise ValueError("mps must be one of 0.5, 1, 2, 4, 10")
+        super().__init__()
+        self.sensor = sht3x
+        self.mps = mps
+        self.repeatability = repeatability
+        self.interval = int(1000 / mps)
+        self.size = size
+        self.ticks = array('l', [0] * size)
+        self.temp = array('f', [0.0] * size)
+        self.humi = array('f', [0.0] * size)
+        self.errors = 0             # CRC or data errors
+        self.value = [0.0, 0.0]
+
+    def _begin(self):
+        # a new periodic mode is only accepted after the break command
+        self.sensor.stopPeriodicMeas()
+        self.sensor.startPeriodicMeas(self.mps, self.repeatability)
+
+    def _end(self):
+        self.sensor.stopPeriodicMeas()
+
+    async def _run(self):
+        await asyncio.sleep_ms(self.interval)
+        while True:
+            try:
+                value = self.sensor.fetch(self.value)
+            except SHT3XError:
+                self.errors += 1
+                value = None
+            if value is None:
+                # no new data yet, try again a little later
+                await asyncio.sleep_ms(self.interval // 10 + 1)
+                continue
+            index = self.count % self.size
+            self.ticks[index] = ticks_ms()
+            self.temp[index] = value[0]
+            self.humi[index] = value[1]
+            self._publish()
+            await asyncio.sleep_ms(self.interval)
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def record(self, i):
+        """
+        record number i in the ring, 0 is the oldest, -1 the latest
+        returns (ticks_ms, temperature, humidity)
+        """
+        n = len(self)
+        if i < 0:
+            i += n
+        if i < 0 or i >= n:
+            raise IndexError("no such record")
+        index = (self.count - n + i) % self.size
+        return (self.ticks[index], self.temp[index], self.humi[index])
+
+    def _current(self):
+        return self.record(-1)
+
+    def __iter__(self):
+        # oldest record first
+        for i in range(len(self)):
+            yield self.record(i)